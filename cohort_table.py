@@ -15,7 +15,9 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # =============================================================================
 """Encapsulate the population data per cohort and time step"""
+from typing import Dict, Optional
 
+import numpy as np
 import pandas as pd
 
 from utils.transitions_utils import (
@@ -26,75 +28,268 @@ from utils.transitions_utils import (
 class CohortTable:
     """Store population counts for one cohort of people that enter one category in the same year"""
 
-    def __init__(self, starting_time_step: int) -> None:
-        self.cohort_df = pd.DataFrame(
-            {starting_time_step - 1: 0.0}, index=[starting_time_step - 1]
+    def __init__(
+        self, starting_time_step: int, max_time_steps: Optional[int] = None
+    ) -> None:
+        """
+        `starting_time_step` the first time step the cohort table will record
+        `max_time_steps` the number of time steps the table is expected to hold, used to preallocate the
+            (cohort x time step) storage. The storage doubles in size if the table grows past it.
+        """
+        capacity = max(max_time_steps or 0, 0) + 1
+
+        # population counts, rows are cohorts and columns are time steps. Only the top-left
+        # `num_cohorts` x `num_time_steps` block is valid, the rest is preallocated space
+        self._populations = np.zeros((capacity, capacity), dtype=np.float64)
+        self._start_time_steps = np.zeros(capacity, dtype=np.int64)
+        self._time_steps = np.zeros(capacity, dtype=np.int64)
+        self._num_cohorts = 0
+        self._num_time_steps = 0
+
+        # positional lookups for the cohort start time steps and the recorded time steps
+        self._cohort_rows: Dict[int, int] = {}
+        self._time_step_columns: Dict[int, int] = {}
+
+        self._append_time_step(starting_time_step - 1)
+        self._append_row(starting_time_step - 1)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "CohortTable":
+        """Rebuild a CohortTable from the arrays returned by `to_arrays()`"""
+        cohort_table = cls(0)
+        cohort_table.ingest_cross_simulation_cohorts(
+            pd.DataFrame(
+                arrays["populations"],
+                index=arrays["start_time_steps"],
+                columns=arrays["time_steps"],
+            )
+        )
+        return cohort_table
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Return copies of the cohort start time steps, the recorded time steps, and the cohort populations"""
+        return {
+            "start_time_steps": self.get_start_time_steps(),
+            "time_steps": self.get_time_steps(),
+            "populations": self._populations[
+                : self._num_cohorts, : self._num_time_steps
+            ].copy(),
+        }
+
+    @property
+    def cohort_df(self) -> pd.DataFrame:
+        """Return the cohort table as a DataFrame indexed by start_time_step with one column per time step"""
+        return pd.DataFrame(
+            self._populations[: self._num_cohorts, : self._num_time_steps].copy(),
+            index=pd.Index(
+                self._start_time_steps[: self._num_cohorts], name="start_time_step"
+            ),
+            columns=pd.Index(
+                self._time_steps[: self._num_time_steps], name="simulation_time_step"
+            ),
         )
-        self.cohort_df.index.name = "start_time_step"
-        self.cohort_df.columns.name = "simulation_time_step"
 
     def get_latest_population(self) -> pd.Series:
-        return self.cohort_df.iloc[:, -1]
+        if self._num_time_steps == 0:
+            return pd.Series(dtype=float)
+        return pd.Series(
+            self._populations[: self._num_cohorts, self._num_time_steps - 1].copy(),
+            index=pd.Index(
+                self._start_time_steps[: self._num_cohorts], name="start_time_step"
+            ),
+            name=self._time_steps[self._num_time_steps - 1],
+        )
 
     def get_per_time_step_population(self) -> pd.Series:
-        return self.cohort_df.sum(axis=0)
+        return pd.Series(
+            self._populations[: self._num_cohorts, : self._num_time_steps].sum(axis=0),
+            index=pd.Index(
+                self._time_steps[: self._num_time_steps], name="simulation_time_step"
+            ),
+        )
+
+    def get_start_time_steps(self) -> np.ndarray:
+        """Return the start time step of every cohort, in row order"""
+        return self._start_time_steps[: self._num_cohorts].copy()
+
+    def get_time_steps(self) -> np.ndarray:
+        """Return the recorded time steps, in column order"""
+        return self._time_steps[: self._num_time_steps].copy()
+
+    def get_latest_population_array(self) -> np.ndarray:
+        """Return the latest population of every cohort, in the same order as `get_start_time_steps()`"""
+        return self._populations[: self._num_cohorts, self._num_time_steps - 1].copy()
 
     def append_time_step_end_count(
         self, cohort_sizes: pd.Series, projection_time_step: int
     ) -> None:
         """Append the cohort sizes for the end of the projection time_step"""
-        latest_population = self.get_latest_population()
-        for time_step in latest_population.index:
-            if time_step not in cohort_sizes:
-                cohort_sizes.loc[time_step] = 0
-                cohort_sizes.sort_index(inplace=True)
+        start_time_steps = self._start_time_steps[: self._num_cohorts]
+        if cohort_sizes.index.equals(pd.Index(start_time_steps)):
+            new_population = cohort_sizes.to_numpy(dtype=np.float64)
+        else:
+            # align the cohort sizes to the cohort rows, cohorts without a size are set to 0
+            unknown_cohorts = cohort_sizes.index.difference(start_time_steps)
+            if len(unknown_cohorts) > 0:
+                raise ValueError(
+                    f"Cannot append cohort sizes for cohorts that are not in the table: {list(unknown_cohorts)}"
+                )
+            new_population = cohort_sizes.reindex(
+                start_time_steps, fill_value=0
+            ).to_numpy(dtype=np.float64)
+
+        self.append_time_step_end_count_array(new_population, projection_time_step)
 
-        if (round(cohort_sizes, SIG_FIGS) > round(latest_population, SIG_FIGS)).any():
+    def append_time_step_end_count_array(
+        self, cohort_sizes: np.ndarray, projection_time_step: int
+    ) -> None:
+        """Append the cohort sizes for the end of the projection time_step, ordered like `get_start_time_steps()`"""
+        if len(cohort_sizes) != self._num_cohorts:
+            raise ValueError(
+                f"Expected {self._num_cohorts} cohort sizes, received {len(cohort_sizes)}"
+            )
+
+        start_time_steps = self._start_time_steps[: self._num_cohorts]
+        latest_population = self._populations[
+            : self._num_cohorts, self._num_time_steps - 1
+        ]
+        too_large = np.round(cohort_sizes, SIG_FIGS) > np.round(
+            latest_population, SIG_FIGS
+        )
+        if too_large.any():
             raise ValueError(
                 "Cannot append cohort data that is larger than the latest population\n"
-                f"Latest population: {latest_population[cohort_sizes > latest_population]}\n"
-                f"Attempting to append: {cohort_sizes[cohort_sizes > latest_population]}"
+                f"Latest population: {dict(zip(start_time_steps[too_large], latest_population[too_large]))}\n"
+                f"Attempting to append: {dict(zip(start_time_steps[too_large], cohort_sizes[too_large]))}"
             )
 
-        if projection_time_step in self.cohort_df.columns:
+        if projection_time_step in self._time_step_columns:
             raise ValueError(f"Cannot overwrite cohort for time {projection_time_step}")
 
-        self.cohort_df.loc[:, projection_time_step] = cohort_sizes
+        column = self._append_time_step(projection_time_step)
+        self._populations[: self._num_cohorts, column] = cohort_sizes
 
     def append_cohort(self, cohort_size: float, projection_time_step: int) -> None:
         """Add a new cohort to the bottom of the cohort table"""
-        if projection_time_step not in self.cohort_df.columns:
+        if projection_time_step not in self._time_step_columns:
             raise ValueError(
                 f"Cannot append cohort with start time {projection_time_step} outside of CohortTable timeline "
-                f"{self.cohort_df.columns}"
+                f"{self._time_steps[: self._num_time_steps]}"
             )
-        if projection_time_step in self.cohort_df.index:
+        if projection_time_step in self._cohort_rows:
             raise ValueError(f"Cannot overwrite cohort for time {projection_time_step}")
-        self.cohort_df = pd.concat(
-            [
-                self.cohort_df,
-                pd.DataFrame(
-                    {projection_time_step: [cohort_size]}, index=[projection_time_step]
-                ),
-            ]
-        ).fillna(0)
+        row = self._append_row(projection_time_step)
+        self._populations[
+            row, self._time_step_columns[projection_time_step]
+        ] = cohort_size
 
     def scale_cohort_size(self, scalar: float) -> None:
         if scalar < 0:
             raise ValueError(f"Cannot scale cohort by a negative factor: {scalar}")
-        self.cohort_df *= scalar
+        self._populations[: self._num_cohorts, : self._num_time_steps] *= scalar
+
+    def get_cohort_timeline(self, cohort_start_year: int) -> pd.Series:
+        return pd.Series(
+            self._populations[
+                self._cohort_rows[cohort_start_year], : self._num_time_steps
+            ].copy(),
+            index=pd.Index(
+                self._time_steps[: self._num_time_steps], name="simulation_time_step"
+            ),
+            name=cohort_start_year,
+        )
+
+    def pop_cohort_populations(self, start_time_steps: np.ndarray) -> np.ndarray:
+        """
+        Remove the populations of the cohorts starting at `start_time_steps` over every time step and return them.
+        The emptied cohorts stay in the table.
+        """
+        rows = [
+            self._cohort_rows[start_time_step] for start_time_step in start_time_steps
+        ]
+        cohort_populations = self._populations[rows, : self._num_time_steps].copy()
+        self._populations[rows, : self._num_time_steps] = 0.0
+        return cohort_populations
 
-    def get_cohort_timeline(self, cohort_start_year: int) -> pd.DataFrame:
-        return self.cohort_df.loc[cohort_start_year]
+    def add_cohort_populations(
+        self, start_time_steps: np.ndarray, cohort_populations: np.ndarray
+    ) -> None:
+        """Add `cohort_populations` (cohort x time step) to the cohorts starting at `start_time_steps`"""
+        rows = [
+            self._cohort_rows[start_time_step] for start_time_step in start_time_steps
+        ]
+        self._populations[rows, : self._num_time_steps] += cohort_populations
 
     def pop_cohorts(self) -> pd.DataFrame:
         """pop cohort_df for cross-simulation flow"""
         cohort_df = self.cohort_df
-        self.cohort_df = pd.DataFrame()
+        self._num_cohorts = 0
+        self._num_time_steps = 0
+        self._cohort_rows = {}
+        self._time_step_columns = {}
         return cohort_df
 
     def ingest_cross_simulation_cohorts(
         self, cross_simulation_flows: pd.DataFrame
     ) -> None:
         """ingest new cohort_df from cross-simulation flow"""
-        self.cohort_df = cross_simulation_flows
+        self._num_cohorts = 0
+        self._num_time_steps = 0
+        self._cohort_rows = {}
+        self._time_step_columns = {}
+        self._ensure_capacity(*cross_simulation_flows.shape)
+
+        for time_step in cross_simulation_flows.columns:
+            self._append_time_step(int(time_step))
+        for start_time_step in cross_simulation_flows.index:
+            self._append_row(int(start_time_step))
+
+        self._populations[
+            : self._num_cohorts, : self._num_time_steps
+        ] = cross_simulation_flows.to_numpy(dtype=np.float64)
+
+    def _append_time_step(self, time_step: int) -> int:
+        """Reserve the next column for `time_step` and return its position"""
+        self._ensure_capacity(self._num_cohorts, self._num_time_steps + 1)
+        column = self._num_time_steps
+        self._time_steps[column] = time_step
+        self._time_step_columns[time_step] = column
+        self._num_time_steps += 1
+        return column
+
+    def _append_row(self, start_time_step: int) -> int:
+        """Reserve the next (zeroed) row for the cohort starting at `start_time_step` and return its position"""
+        self._ensure_capacity(self._num_cohorts + 1, self._num_time_steps)
+        row = self._num_cohorts
+        self._populations[row, : self._num_time_steps] = 0.0
+        self._start_time_steps[row] = start_time_step
+        self._cohort_rows[start_time_step] = row
+        self._num_cohorts += 1
+        return row
+
+    def _ensure_capacity(self, num_cohorts: int, num_time_steps: int) -> None:
+        """Double the preallocated storage along any axis that is too small to hold the requested size"""
+        row_capacity, column_capacity = self._populations.shape
+        if num_cohorts <= row_capacity and num_time_steps <= column_capacity:
+            return
+
+        while row_capacity < num_cohorts:
+            row_capacity *= 2
+        while column_capacity < num_time_steps:
+            column_capacity *= 2
+
+        populations = np.zeros((row_capacity, column_capacity), dtype=np.float64)
+        populations[: self._num_cohorts, : self._num_time_steps] = self._populations[
+            : self._num_cohorts, : self._num_time_steps
+        ]
+        self._populations = populations
+
+        start_time_steps = np.zeros(row_capacity, dtype=np.int64)
+        start_time_steps[: self._num_cohorts] = self._start_time_steps[
+            : self._num_cohorts
+        ]
+        self._start_time_steps = start_time_steps
+
+        time_steps = np.zeros(column_capacity, dtype=np.int64)
+        time_steps[: self._num_time_steps] = self._time_steps[: self._num_time_steps]
+        self._time_steps = time_steps
@@ -17,8 +17,10 @@
 """FullCompartment-specific table containing probabilities of transition to other FullCompartments"""
 
 import copy
-from typing import Dict, List
+from bisect import bisect_right
+from typing import Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 
 from spark_policy import SparkPolicy
@@ -39,6 +41,17 @@ class CompartmentTransitions:
 
         self.transition_tables: Dict[int, TransitionTable] = {}
 
+        # Dense per time step transition matrices keyed by (policy time step, time steps since the policy).
+        # Time steps since the policy are clamped to the stationary offset of the policy table, past which
+        # the collapsed table never changes again
+        self._transition_matrix_cache: Dict[
+            Tuple[int, int], Tuple[np.ndarray, List[str]]
+        ] = {}
+        self._stationary_offsets: Dict[int, int] = {}
+        self._policy_time_steps: List[int] = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     @staticmethod
     def _check_inputs_valid(historical_outflows: pd.DataFrame) -> None:
         """Check historical data passed to CompartmentTransitions is valid."""
@@ -122,15 +135,97 @@ class CompartmentTransitions:
         for _, transition_table in self.transition_tables.items():
             transition_table.normalize_transitions()
 
+        # once the time since the policy exceeds the longest table, only the policy table is used
+        self._policy_time_steps = sorted(self.transition_tables)
+        self._stationary_offsets = {
+            ts: max(
+                int(np.ceil(table.index.max()))
+                for table in transition_table.tables.values()
+            )
+            for ts, transition_table in self.transition_tables.items()
+        }
+        self._transition_matrix_cache = {}
+
+    def get_stationary_time_step(self) -> int:
+        """Return the first time step from which every time step uses the same transition table"""
+        latest_policy_time_step = max(self.transition_tables)
+        return latest_policy_time_step + self._stationary_offsets.get(
+            latest_policy_time_step, 0
+        )
+
+    def get_max_duration(self) -> int:
+        """Return the longest compartment duration of any transition table"""
+        return max(self._stationary_offsets.values(), default=0)
+
     def get_per_time_step_transition_table(
         self, current_time_step: int
     ) -> pd.DataFrame:
         """function used by SparkCompartment to determine which of the state transition tables to pull from"""
 
-        # take transitions from the most recent table whose policy time_step has already passed
-        policy_time_step = max(
-            ts for ts in self.transition_tables if ts <= current_time_step
-        )
+        policy_time_step = self._get_policy_time_step(current_time_step)
         return self.transition_tables[policy_time_step].get_per_time_step_table(
             current_time_step
         )
+
+    def _get_policy_time_step(self, current_time_step: int) -> int:
+        """Return the time step of the most recent table whose policy time_step has already passed"""
+        if len(self._policy_time_steps) != len(self.transition_tables):
+            self._policy_time_steps = sorted(self.transition_tables)
+
+        policy_index = bisect_right(self._policy_time_steps, current_time_step) - 1
+        if policy_index < 0:
+            raise ValueError(
+                f"No transition table available for time step {current_time_step}"
+            )
+        return self._policy_time_steps[policy_index]
+
+    def get_per_time_step_transition_matrix(
+        self, current_time_step: int
+    ) -> Tuple[np.ndarray, List[str]]:
+        """
+        Return the per time step transition table as a dense (compartment_duration x outflow) array and the
+            outflow names for its columns.
+        Row `i` holds the transition probabilities for cohorts that have spent `i + 1` time steps in the
+            compartment and the last column is always the `remaining` probability.
+        The arrays are cached and shared between calls, so they are read-only.
+        """
+        policy_time_step = self._get_policy_time_step(current_time_step)
+        time_steps_since_policy = current_time_step - policy_time_step
+        stationary_offset = self._stationary_offsets.get(policy_time_step)
+        if stationary_offset is not None:
+            time_steps_since_policy = min(time_steps_since_policy, stationary_offset)
+
+        cache_key = (policy_time_step, time_steps_since_policy)
+        cached_transitions = self._transition_matrix_cache.get(cache_key)
+        if cached_transitions is not None:
+            self.cache_hits += 1
+            return cached_transitions
+        self.cache_misses += 1
+
+        per_time_step_transitions = self.get_per_time_step_transition_table(
+            current_time_step
+        )
+        outflows = [
+            outflow
+            for outflow in per_time_step_transitions.columns
+            if outflow != "remaining"
+        ]
+
+        # durations missing from the table do not transition anyone and do not keep anyone in the compartment
+        max_duration = int(per_time_step_transitions.index.max())
+        if len(per_time_step_transitions) != max_duration or (
+            per_time_step_transitions.index[0] != 1
+        ):
+            per_time_step_transitions = per_time_step_transitions.reindex(
+                range(1, max_duration + 1), fill_value=0.0
+            )
+
+        transition_matrix = np.ascontiguousarray(
+            per_time_step_transitions[outflows + ["remaining"]].to_numpy(
+                dtype=np.float64
+            )
+        )
+        transition_matrix.flags.writeable = False
+
+        self._transition_matrix_cache[cache_key] = (transition_matrix, outflows)
+        return transition_matrix, outflows
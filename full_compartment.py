@@ -16,7 +16,7 @@
 # =============================================================================
 """SparkCompartment that tracks cohorts internally to determine population size and outflows"""
 
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -24,7 +24,7 @@ import warnings
 
 from cohort_table import CohortTable
 from compartment_transitions import CompartmentTransitions
-from spark_compartment import SparkCompartment
+from spark_compartment import SparkCompartment, extrapolate_trend
 from utils.transitions_utils import SIG_FIGS
 
 # Filter performance warnings
@@ -34,18 +34,29 @@ warnings.filterwarnings("ignore", category=pd.errors.PerformanceWarning)
 class FullCompartment(SparkCompartment):
     """Complex Spark Compartment that tracks cohorts over time and sends groups to other compartments over time"""
 
+    SNAPSHOT_ATTRIBUTES = SparkCompartment.SNAPSHOT_ATTRIBUTES + (
+        "cohorts",
+        "incoming_cohorts",
+        "end_time_step_populations",
+    )
+
     def __init__(
         self,
         outflow_data: pd.DataFrame,
         compartment_transitions: CompartmentTransitions,
         starting_time_step: int,
         tag: str,
+        max_time_steps: Optional[int] = None,
     ) -> None:
+        """
+        `max_time_steps` the number of time steps the compartment is expected to be simulated for, used to
+            preallocate the cohort table
+        """
 
         super().__init__(outflow_data, starting_time_step, tag)
 
         # store all population cohorts with their population counts per time-step
-        self.cohorts: CohortTable = CohortTable(starting_time_step)
+        self.cohorts: CohortTable = CohortTable(starting_time_step, max_time_steps)
 
         # separate incoming cohorts that should be processed after .step_forward()
         self.incoming_cohorts: float = 0
@@ -68,61 +79,82 @@ class FullCompartment(SparkCompartment):
     def _generate_outflow_dict(self) -> Dict[str, float]:
         """step forward all cohorts one time step and generate outflow dict"""
 
-        per_time_step_transitions = (
-            self.compartment_transitions.get_per_time_step_transition_table(
-                self.current_time_step
-            )
+        (
+            transition_matrix,
+            outflows,
+        ) = self.compartment_transitions.get_per_time_step_transition_matrix(
+            self.current_time_step
         )
 
-        latest_time_step_pop = self.cohorts.get_latest_population()
-
-        # convert index from starting year to years in compartment
-        latest_time_step_pop.index = self.current_time_step - latest_time_step_pop.index
+        # convert cohort start time steps to time spent in the compartment
+        time_in_compartment = (
+            self.current_time_step - self.cohorts.get_start_time_steps()
+        )
 
         # no cohort should start in cohort after current_ts
-        if any(latest_time_step_pop.index < 0):
+        if (time_in_compartment < 0).any():
             raise ValueError(
                 "Cohort cannot start after current time step\n"
                 f"Current time step: {self.current_time_step}\n"
-                f"Cohort start times: {self.current_time_step - latest_time_step_pop.index}"
+                f"Cohort start times: {self.current_time_step - time_in_compartment}"
             )
 
+        end_population, outflow_counts = self.step_cohorts(
+            self.cohorts.get_latest_population_array(),
+            time_in_compartment,
+            transition_matrix,
+        )
+
+        self.cohorts.append_time_step_end_count_array(
+            end_population, self.current_time_step
+        )
+
+        return dict(zip(outflows, outflow_counts))
+
+    @staticmethod
+    def step_cohorts(
+        latest_population: np.ndarray,
+        time_in_compartment: np.ndarray,
+        transition_matrix: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Apply one time step of transitions to a set of cohorts
+        `latest_population` population of each cohort at the end of the previous time step
+        `time_in_compartment` number of time steps each cohort has spent in the compartment
+        `transition_matrix` (compartment_duration x outflow) transition probabilities where the last column is the
+            `remaining` probability, as returned by CompartmentTransitions.get_per_time_step_transition_matrix()
+        Returns the population of each cohort that remains in the compartment and the total outflow per outflow
+            column of the transition matrix (excluding `remaining`)
+        """
+        max_duration = len(transition_matrix)
+
         # Handle long/life-sentences separately from shorter sentences, assume the people on longer
         # sentences will never outflow from the compartment during the simulation and only compute
         # the outflows for the people on (relatively) shorter sentences
-        latest_time_step_pop_short = latest_time_step_pop[
-            latest_time_step_pop.index <= len(per_time_step_transitions)
-        ]
-        latest_time_step_pop_long = latest_time_step_pop[
-            latest_time_step_pop.index > len(per_time_step_transitions)
-        ]
-        if not np.isclose(latest_time_step_pop_long.fillna(0), 0, SIG_FIGS).all():
+        long_cohorts = time_in_compartment > max_duration
+        if not np.isclose(latest_population[long_cohorts], 0, SIG_FIGS).all():
             raise ValueError(
-                f"cohorts not empty after max sentence: {latest_time_step_pop_long}"
+                f"cohorts not empty after max sentence: {latest_population[long_cohorts]}"
             )
-
-        # broadcast latest cohort populations onto transition table
-        latest_time_step_pop_short = per_time_step_transitions.mul(
-            latest_time_step_pop_short, axis=0
-        ).dropna(how="all")
-
-        latest_time_step_pop = pd.concat(
-            [latest_time_step_pop_long, latest_time_step_pop_short.remaining]
+        short_cohorts = (time_in_compartment >= 1) & ~long_cohorts
+
+        # collect the population by time in compartment and broadcast it onto the transition table
+        duration_rows = time_in_compartment[short_cohorts] - 1
+        population_per_duration = np.bincount(
+            duration_rows,
+            weights=latest_population[short_cohorts],
+            minlength=max_duration,
         )
+        outflow_counts = (
+            transition_matrix[:, :-1] * population_per_duration[:, np.newaxis]
+        ).sum(axis=0)
 
-        # convert index back to starting year from years in compartment
-        latest_time_step_pop.index = self.current_time_step - latest_time_step_pop.index
+        # cohorts that have not spent a full time step in the compartment have no transition table row
+        end_population = latest_population.copy()
+        end_population[short_cohorts] *= transition_matrix[duration_rows, -1]
+        end_population[time_in_compartment < 1] = 0
 
-        self.cohorts.append_time_step_end_count(
-            latest_time_step_pop.sort_index(), self.current_time_step
-        )
-
-        outflow_dict = {
-            outflow: latest_time_step_pop_short.sum(axis=0)[outflow]
-            for outflow in latest_time_step_pop_short.columns
-            if outflow != "remaining"
-        }
-        return outflow_dict
+        return end_population, outflow_counts
 
     def ingest_incoming_cohort(self, influx: Dict[str, float]) -> None:
         """Ingest the population coming from one compartment into another by the end of the `current_time_step`
@@ -211,6 +243,59 @@ class FullCompartment(SparkCompartment):
     def scale_cohorts(self, scale_factor: float) -> None:
         self.cohorts.scale_cohort_size(scale_factor)
 
+    def get_stationary_time_step(self) -> int:
+        stationary_time_step = self.compartment_transitions.get_stationary_time_step()
+        if not self.historical_outflows.empty:
+            # the historical outflows replace the modeled outflows up to the latest time step with data
+            stationary_time_step = max(
+                stationary_time_step, max(self.historical_outflows.columns) + 1
+            )
+        return stationary_time_step
+
+    def extend_steady_state(self, num_time_steps: int) -> None:
+        """
+        Skip `num_time_steps` time steps, extrapolating the population and outflows of the latest time steps to each
+            of them
+        """
+        self.end_time_step_populations = pd.concat(
+            [
+                self.end_time_step_populations,
+                pd.Series(
+                    extrapolate_trend(
+                        self.end_time_step_populations.iloc[-3:].to_numpy(dtype=float)[
+                            np.newaxis
+                        ],
+                        num_time_steps,
+                    )[0],
+                    index=range(
+                        self.current_time_step, self.current_time_step + num_time_steps
+                    ),
+                ),
+            ]
+        )
+        super().extend_steady_state(num_time_steps)
+
+    def get_duration_populations(self, num_durations: int) -> np.ndarray:
+        """
+        Return the current population per number of time steps spent in the compartment, from 0 up to
+            `num_durations - 1` time steps with every longer stay counted in the last one
+        """
+        time_in_compartment = np.minimum(
+            self.current_time_step - self.cohorts.get_start_time_steps(),
+            num_durations - 1,
+        )
+        return np.bincount(
+            time_in_compartment,
+            weights=self.cohorts.get_latest_population_array(),
+            minlength=num_durations,
+        )
+
+    def get_latest_outflows(self) -> np.ndarray:
+        """Return the outflows of the latest time step stepped forward, ordered like the outflows index"""
+        if len(self.outflows.columns) == 0:
+            return np.zeros(0)
+        return self.outflows[max(self.outflows.columns)].to_numpy(dtype=float)
+
     def get_per_time_step_population(self) -> pd.Series:
         """Return the per_time_step projected population as a pd.Series of counts per EOTS"""
         return self.end_time_step_populations
@@ -0,0 +1,69 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Declare how cross flow functions move cohorts between simulation groups"""
+import dataclasses
+from enum import Enum, auto
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+CrossFlowFunction = Callable[[pd.DataFrame, int], pd.DataFrame]
+
+
+class CrossFlowKind(Enum):
+    # cohorts never change simulation group, the cross flow is skipped
+    IDENTITY = auto()
+    # whole cohorts move from one simulation group to another as described by a SimulationGroupRemap
+    GROUP_REMAP = auto()
+    # any other change to the cohorts DataFrame, the cross flow runs on the full DataFrame
+    ARBITRARY = auto()
+
+
+@dataclasses.dataclass(frozen=True)
+class SimulationGroupRemap:
+    """Cross flow that moves whole cohorts between simulation groups without changing their populations"""
+
+    # simulation group that the cohorts of each simulation group move to
+    simulation_group_mapping: Dict[str, str]
+    # (cohort start time steps, current time step) -> boolean mask of the cohorts that move this time step
+    transitioning_cohorts: Callable[[np.ndarray, int], np.ndarray]
+
+
+def cross_flow_kind(
+    kind: CrossFlowKind, simulation_group_remap: Optional[SimulationGroupRemap] = None
+) -> Callable[[CrossFlowFunction], CrossFlowFunction]:
+    """
+    Decorator declaring the CrossFlowKind of a cross flow function so PopulationSimulation can skip or shortcut it
+    `simulation_group_remap` required for CrossFlowKind.GROUP_REMAP, the cohort moves the function applies
+    """
+    if (kind == CrossFlowKind.GROUP_REMAP) != (simulation_group_remap is not None):
+        raise ValueError(
+            f"A simulation_group_remap must be given for, and only for, {CrossFlowKind.GROUP_REMAP}"
+        )
+
+    def declare_kind(cross_flow_function: CrossFlowFunction) -> CrossFlowFunction:
+        setattr(cross_flow_function, "cross_flow_kind", kind)
+        setattr(cross_flow_function, "simulation_group_remap", simulation_group_remap)
+        return cross_flow_function
+
+    return declare_kind
+
+
+def get_cross_flow_kind(cross_flow_function: CrossFlowFunction) -> CrossFlowKind:
+    """Return the declared CrossFlowKind of a cross flow function, undeclared functions are ARBITRARY"""
+    return getattr(cross_flow_function, "cross_flow_kind", CrossFlowKind.ARBITRARY)
@@ -0,0 +1,256 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Initialize the cohorts of a PopulationSimulation at its start time step without stepping through a warm-up"""
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from full_compartment import FullCompartment
+from population_simulation.population_simulation import PopulationSimulation
+from shell_compartment import ShellCompartment
+from spark_compartment import SparkCompartment
+
+
+class EquilibriumInitializer:
+    """
+    Compute the cohorts every FullCompartment holds at the start time step directly, instead of simulating the
+    warm-up time steps.
+
+    The cohort started at each warm-up time step is the admissions of that time step plus the outflows of the
+    earlier cohorts into the compartment, and holds that inflow times the fraction of a cohort still in the
+    compartment at its age. Both fractions come from the transition tables of the end of the warm-up, so the
+    cohorts equal those of the warm-up simulation when the transitions do not change during it, and converge to
+    the equilibrium of the transitions and admissions over a long warm-up. Historical outflows, cross flows, and
+    scaling during the warm-up are not replayed, the compartment populations are scaled to the population data of
+    the start time step instead.
+    """
+
+    @classmethod
+    def initialize(
+        cls,
+        population_simulation: PopulationSimulation,
+        first_relevant_time_step: int,
+        start_time_step: int,
+    ) -> None:
+        """
+        Load the equilibrium cohorts into `population_simulation`, which is left at `start_time_step` as if it had
+            been stepped forward from `first_relevant_time_step`
+        """
+        population_simulation.restore_snapshot(
+            cls.get_snapshot(
+                population_simulation, first_relevant_time_step, start_time_step
+            )
+        )
+
+    @classmethod
+    def get_snapshot(
+        cls,
+        population_simulation: PopulationSimulation,
+        first_relevant_time_step: int,
+        start_time_step: int,
+    ) -> Dict[str, Any]:
+        """
+        Return a snapshot of `population_simulation` at `start_time_step` holding the equilibrium cohorts, to be
+            restored with PopulationSimulation.restore_snapshot()
+        """
+        warm_up_time_steps = start_time_step - first_relevant_time_step
+        if warm_up_time_steps <= 0:
+            raise ValueError(
+                f"First relevant time step {first_relevant_time_step} must be before the start time step "
+                f"{start_time_step}"
+            )
+        # the cohorts are recorded at the end of the time step before the start time step
+        latest_time_step = start_time_step - 1
+
+        equilibrium_populations = {
+            simulation_tag: cls._get_equilibrium_populations(
+                list(simulation_obj.simulation_compartments.values()),
+                first_relevant_time_step,
+                start_time_step,
+            )
+            for simulation_tag, simulation_obj in population_simulation.sub_simulations.items()
+        }
+        cls._scale_to_population_data(
+            equilibrium_populations,
+            population_simulation.population_data,
+            start_time_step,
+        )
+
+        snapshot = population_simulation.get_snapshot()
+        snapshot["current_time_step"] = start_time_step
+        for simulation_tag, simulation_snapshot in snapshot["sub_simulations"].items():
+            for compartment_tag, compartment_snapshot in simulation_snapshot[
+                "simulation_compartments"
+            ].items():
+                compartment_snapshot["current_time_step"] = start_time_step
+                if compartment_tag not in equilibrium_populations[simulation_tag]:
+                    continue
+                cohort_populations = equilibrium_populations[simulation_tag][
+                    compartment_tag
+                ]
+                # the oldest cohort first, like the cohorts of a simulated compartment
+                cohort_populations = cohort_populations[::-1]
+                compartment_snapshot["cohorts"] = compartment_snapshot[
+                    "cohorts"
+                ].from_arrays(
+                    {
+                        "start_time_steps": latest_time_step
+                        - np.arange(len(cohort_populations))[::-1],
+                        "time_steps": np.array([latest_time_step]),
+                        "populations": cohort_populations[:, np.newaxis],
+                    }
+                )
+                compartment_snapshot["incoming_cohorts"] = 0.0
+                compartment_snapshot["end_time_step_populations"] = pd.Series(
+                    {latest_time_step: cohort_populations.sum()}, dtype=float
+                )
+        return snapshot
+
+    @classmethod
+    def _get_equilibrium_populations(
+        cls,
+        compartments: List[SparkCompartment],
+        first_relevant_time_step: int,
+        start_time_step: int,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Return the population of each cohort age in each FullCompartment of one sub simulation, the newest cohort
+            first
+        """
+        warm_up_time_steps = start_time_step - first_relevant_time_step
+        full_compartments = [
+            compartment
+            for compartment in compartments
+            if isinstance(compartment, FullCompartment)
+        ]
+        compartment_indices = {
+            compartment.tag: index
+            for index, compartment in enumerate(full_compartments)
+        }
+
+        # fraction of a cohort still in the compartment by age, and the fraction moving to each FullCompartment
+        # when the cohort is stepped at each age after the first
+        survival = {}
+        transfer_kernels = []
+        for compartment in full_compartments:
+            (
+                transition_matrix,
+                outflows,
+            ) = compartment.compartment_transitions.get_per_time_step_transition_matrix(
+                start_time_step - 1
+            )
+            compartment_survival = np.concatenate(
+                [[1.0], np.cumprod(transition_matrix[:, -1])]
+            )
+            survival[compartment.tag] = compartment_survival[:warm_up_time_steps]
+            transfer_kernel = np.zeros((len(transition_matrix), len(full_compartments)))
+            for outflow_index, outflow in enumerate(outflows):
+                if outflow in compartment_indices:
+                    transfer_kernel[:, compartment_indices[outflow]] = (
+                        compartment_survival[:-1] * transition_matrix[:, outflow_index]
+                    )
+            transfer_kernels.append(transfer_kernel)
+
+        # admissions per time step of the warm-up, from the historical data or its backcast
+        admissions = np.zeros((warm_up_time_steps, len(full_compartments)))
+        for compartment in compartments:
+            if not isinstance(compartment, ShellCompartment):
+                continue
+            for time_step_index in range(warm_up_time_steps):
+                for (
+                    admission_to,
+                    admission_count,
+                ) in compartment.get_time_step_admissions(
+                    first_relevant_time_step + time_step_index
+                ).items():
+                    if admission_to in compartment_indices:
+                        admissions[
+                            time_step_index, compartment_indices[admission_to]
+                        ] += admission_count
+
+        # the new cohort of each time step is the admissions plus the outflows of the earlier cohorts of every
+        # compartment, which are the earlier new cohorts weighted by the transfer kernels
+        inflows = np.zeros((warm_up_time_steps, len(full_compartments)))
+        for time_step_index in range(warm_up_time_steps):
+            inflows[time_step_index] = admissions[time_step_index]
+            for index, transfer_kernel in enumerate(transfer_kernels):
+                num_ages = min(time_step_index, len(transfer_kernel))
+                # cohorts one time step old and older, the newest first like the kernel ages
+                earlier_inflows = inflows[time_step_index - 1 :: -1, index][:num_ages]
+                inflows[time_step_index] += earlier_inflows @ transfer_kernel[:num_ages]
+
+        return {
+            compartment.tag: inflows[::-1, index][: len(survival[compartment.tag])]
+            * survival[compartment.tag]
+            for index, compartment in enumerate(full_compartments)
+        }
+
+    @staticmethod
+    def _scale_to_population_data(
+        equilibrium_populations: Dict[str, Dict[str, np.ndarray]],
+        population_data: pd.DataFrame,
+        start_time_step: int,
+    ) -> None:
+        """
+        Scale the cohorts of each compartment, per sub simulation if the population data is disaggregated, to the
+            latest population data up to `start_time_step`
+        """
+        population_data = population_data[population_data.time_step <= start_time_step]
+        disaggregated_population_data = (
+            "simulation_group" in population_data.columns
+            and population_data["simulation_group"].notnull().all()
+        )
+        for compartment, compartment_data in population_data.groupby("compartment"):
+            compartment_data = compartment_data[
+                compartment_data.time_step == compartment_data.time_step.max()
+            ]
+            if disaggregated_population_data:
+                scaled_groups = [
+                    (
+                        [simulation_tag],
+                        compartment_data[
+                            compartment_data.simulation_group == simulation_tag
+                        ].compartment_population.sum(),
+                    )
+                    for simulation_tag in equilibrium_populations
+                    if simulation_tag in set(compartment_data.simulation_group)
+                ]
+            else:
+                scaled_groups = [
+                    (
+                        list(equilibrium_populations),
+                        compartment_data.compartment_population.sum(),
+                    )
+                ]
+
+            for simulation_tags, population in scaled_groups:
+                simulation_tags = [
+                    simulation_tag
+                    for simulation_tag in simulation_tags
+                    if compartment in equilibrium_populations[simulation_tag]
+                ]
+                equilibrium_population = sum(
+                    equilibrium_populations[simulation_tag][compartment].sum()
+                    for simulation_tag in simulation_tags
+                )
+                if equilibrium_population == 0:
+                    continue
+                for simulation_tag in simulation_tags:
+                    equilibrium_populations[simulation_tag][compartment] *= (
+                        population / equilibrium_population
+                    )
@@ -0,0 +1,458 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Monte Carlo replicates of a population projection, used to estimate the uncertainty of the projection"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from full_compartment import FullCompartment
+from population_simulation.cross_flow import CrossFlowKind, get_cross_flow_kind
+from population_simulation.population_simulation import PopulationSimulation
+from shell_compartment import ShellCompartment
+
+# log-scale standard deviation of the per replicate multiplier on the probability of leaving each compartment
+DEFAULT_TRANSITION_UNCERTAINTY = 0.05
+# quantiles of the replicate populations reported as `compartment_population_min` and `compartment_population_max`
+DEFAULT_PROJECTION_INTERVAL = (0.05, 0.95)
+
+
+class MonteCarloProjection:
+    """
+    Project many replicates of a PopulationSimulation from its current time step to estimate the uncertainty of its
+    population projection.
+
+    Each replicate follows its own admissions paths, drawn from the forecast distributions of the ARIMA admissions
+    models, and scales the probability of leaving each compartment by its own lognormal multiplier. The latest cohort
+    populations of every replicate, sub group, and FullCompartment are stored in one
+    (replicate x sub group x compartment x cohort) array so all replicates are stepped together, and only the interval
+    quantiles of the compartment populations are kept from each time step.
+    """
+
+    def __init__(
+        self,
+        population_simulation: PopulationSimulation,
+        num_replicates: int,
+        transition_uncertainty: float = DEFAULT_TRANSITION_UNCERTAINTY,
+        projection_interval: Tuple[float, float] = DEFAULT_PROJECTION_INTERVAL,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        `population_simulation` the simulation to project. The state of its current time step is copied, so the
+            simulation can keep stepping forward on its own
+        `num_replicates` number of replicates to project
+        `transition_uncertainty` log-scale standard deviation of the multipliers on the probability of leaving each
+            compartment, 0 to only draw the admissions
+        `projection_interval` lower and upper quantiles of the replicate populations to report
+        `seed` seed of the random draws, for reproducible intervals
+        """
+        if num_replicates < 1:
+            raise ValueError(
+                f"Monte Carlo projection needs at least one replicate: {num_replicates}"
+            )
+        if transition_uncertainty < 0:
+            raise ValueError(
+                f"Transition uncertainty cannot be negative: {transition_uncertainty}"
+            )
+        if not 0 <= projection_interval[0] <= projection_interval[1] <= 1:
+            raise ValueError(
+                f"Projection interval must be two increasing quantiles between 0 and 1: {projection_interval}"
+            )
+        if (
+            get_cross_flow_kind(population_simulation.cross_flow_function)
+            != CrossFlowKind.IDENTITY
+        ):
+            raise ValueError(
+                "Monte Carlo projections only support cross flow functions declared as "
+                f"{CrossFlowKind.IDENTITY}"
+            )
+
+        self.num_replicates = num_replicates
+        self.transition_uncertainty = transition_uncertainty
+        self.projection_interval = projection_interval
+        self.rng = np.random.default_rng(seed)
+        self.current_time_step = population_simulation.current_time_step
+        self.population_data = population_simulation.population_data
+        self.should_scale_populations = population_simulation.should_scale_populations
+
+        self.simulation_groups = list(population_simulation.sub_simulations)
+        self._full_compartments: List[List[FullCompartment]] = []
+        self._shell_compartments: List[List[ShellCompartment]] = []
+        for sub_simulation in population_simulation.sub_simulations.values():
+            compartments = list(sub_simulation.simulation_compartments.values())
+            for compartment in compartments:
+                if not isinstance(compartment, (FullCompartment, ShellCompartment)):
+                    raise ValueError(
+                        f"Cannot project compartment {compartment.tag} of type {type(compartment).__name__} "
+                        "with Monte Carlo replicates"
+                    )
+            self._full_compartments.append(
+                [c for c in compartments if isinstance(c, FullCompartment)]
+            )
+            self._shell_compartments.append(
+                [c for c in compartments if isinstance(c, ShellCompartment)]
+            )
+
+        # the shells keep stepping with the simulation, so the time step their admissions are drawn from is kept
+        self._shell_time_steps = [
+            [shell.current_time_step for shell in shell_compartments]
+            for shell_compartments in self._shell_compartments
+        ]
+
+        self.compartment_tags = [c.tag for c in self._full_compartments[0]]
+        for simulation_group, full_compartments in zip(
+            self.simulation_groups, self._full_compartments
+        ):
+            group_tags = [c.tag for c in full_compartments]
+            if group_tags != self.compartment_tags:
+                raise ValueError(
+                    f"Simulation group {simulation_group} does not share the FullCompartments of "
+                    f"{self.simulation_groups[0]}: {group_tags} != {self.compartment_tags}"
+                )
+        self._compartment_indices = {
+            tag: index for index, tag in enumerate(self.compartment_tags)
+        }
+
+        # latest populations of every cohort, aligned on the union of the cohort start time steps
+        self._start_time_steps = np.unique(
+            np.concatenate(
+                [
+                    compartment.cohorts.get_start_time_steps()
+                    for full_compartments in self._full_compartments
+                    for compartment in full_compartments
+                ]
+            )
+        )
+        self._cohort_populations = np.zeros(
+            (
+                len(self.simulation_groups),
+                len(self.compartment_tags),
+                len(self._start_time_steps),
+            )
+        )
+        for group_index, full_compartments in enumerate(self._full_compartments):
+            for compartment_index, compartment in enumerate(full_compartments):
+                rows = np.searchsorted(
+                    self._start_time_steps, compartment.cohorts.get_start_time_steps()
+                )
+                self._cohort_populations[
+                    group_index, compartment_index, rows
+                ] = compartment.cohorts.get_latest_population_array()
+        self._incoming_cohorts = np.array(
+            [
+                [compartment.incoming_cohorts for compartment in full_compartments]
+                for full_compartments in self._full_compartments
+            ],
+            dtype=np.float64,
+        )
+
+        # historical outflows per sub group and FullCompartment, routed to the FullCompartments they flow into
+        self._historical_inflows: List[List[Dict[int, np.ndarray]]] = [
+            [
+                {
+                    time_step: compartment.historical_outflows[time_step].to_numpy(
+                        dtype=np.float64
+                    )
+                    @ self._get_inflow_routing(compartment.historical_outflows.index)
+                    for time_step in compartment.historical_outflows.columns
+                }
+                for compartment in full_compartments
+            ]
+            for full_compartments in self._full_compartments
+        ]
+
+        # transfer operators keyed by the ids of the transition matrices they were built from
+        self._transfer_operator_cache: Dict[
+            Tuple[int, ...],
+            Tuple[Tuple[np.ndarray, ...], Tuple[np.ndarray, np.ndarray, np.ndarray]],
+        ] = {}
+
+    def project(self, num_time_steps: int) -> pd.DataFrame:
+        """
+        Project every replicate `num_time_steps` time steps forward and return the `compartment_population_min` and
+            `compartment_population_max` quantiles of the replicate populations per time step, simulation group,
+            and compartment
+        """
+        num_groups = len(self.simulation_groups)
+        num_compartments = len(self.compartment_tags)
+        first_time_step = self.current_time_step
+        num_initial_cohorts = len(self._start_time_steps)
+
+        cohort_populations = np.zeros(
+            (
+                self.num_replicates,
+                num_groups,
+                num_compartments,
+                num_initial_cohorts + num_time_steps,
+            )
+        )
+        cohort_populations[..., :num_initial_cohorts] = self._cohort_populations
+        start_time_steps = np.concatenate(
+            [
+                self._start_time_steps,
+                np.arange(first_time_step, first_time_step + num_time_steps),
+            ]
+        )
+        incoming_cohorts = np.broadcast_to(
+            self._incoming_cohorts, (self.num_replicates, num_groups, num_compartments)
+        )
+        transition_multipliers = np.exp(
+            self.transition_uncertainty
+            * self.rng.standard_normal(
+                (self.num_replicates, num_groups, num_compartments)
+            )
+        )
+        admissions = self._sample_admissions(num_time_steps)
+
+        population_quantiles = np.zeros(
+            (num_time_steps, 2, num_groups, num_compartments)
+        )
+        for step in range(num_time_steps):
+            time_step = first_time_step + step
+            num_cohorts = num_initial_cohorts + step
+            populations = cohort_populations[..., :num_cohorts]
+
+            (
+                inflow_probabilities,
+                leave_probabilities,
+                remain_probabilities,
+            ) = self._get_transfer_operator(time_step)
+            duration_rows = np.clip(
+                time_step - start_time_steps[:num_cohorts],
+                0,
+                leave_probabilities.shape[2] - 1,
+            )
+            leave = leave_probabilities[:, :, duration_rows]
+            remain = remain_probabilities[:, :, duration_rows]
+
+            # scale the probability of leaving by the replicate multiplier, up to leaving with certainty, and keep
+            # the end of the transition tables where the whole cohort leaves
+            with np.errstate(divide="ignore"):
+                leave_multipliers = np.where(
+                    remain > 0,
+                    np.minimum(transition_multipliers[..., np.newaxis], 1 / leave),
+                    1.0,
+                )
+            compartment_inflows = np.einsum(
+                "rgck,gckd->rgcd",
+                populations * leave_multipliers,
+                inflow_probabilities[:, :, duration_rows],
+            )
+            populations *= remain + (1 - leave_multipliers) * leave
+            self._override_historical_inflows(compartment_inflows, time_step)
+
+            cohort_populations[..., num_cohorts] = (
+                incoming_cohorts + compartment_inflows.sum(axis=2) + admissions[:, step]
+            )
+            incoming_cohorts = np.zeros(incoming_cohorts.shape)
+
+            populations = cohort_populations[..., : num_cohorts + 1]
+            if self.should_scale_populations:
+                self._scale_populations(populations, time_step)
+
+            population_quantiles[step] = np.quantile(
+                populations.sum(axis=-1), self.projection_interval, axis=0
+            )
+
+        return pd.DataFrame(
+            {
+                "time_step": np.repeat(
+                    np.arange(first_time_step, first_time_step + num_time_steps),
+                    num_groups * num_compartments,
+                ),
+                "simulation_group": np.tile(
+                    np.repeat(self.simulation_groups, num_compartments),
+                    num_time_steps,
+                ),
+                "compartment": np.tile(
+                    self.compartment_tags, num_time_steps * num_groups
+                ),
+                "compartment_population_min": population_quantiles[:, 0].ravel(),
+                "compartment_population_max": population_quantiles[:, 1].ravel(),
+            }
+        )
+
+    def _get_inflow_routing(self, outflow_names: Iterable[str]) -> np.ndarray:
+        """Return the (outflow x FullCompartment) matrix sending each outflow to the FullCompartment it flows into"""
+        outflow_names = list(outflow_names)
+        routing = np.zeros((len(outflow_names), len(self.compartment_tags)))
+        for outflow_index, outflow_name in enumerate(outflow_names):
+            compartment_index = self._compartment_indices.get(outflow_name)
+            if compartment_index is not None:
+                routing[outflow_index, compartment_index] = 1.0
+        return routing
+
+    def _get_transfer_operator(
+        self, time_step: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return the (sub group x compartment x time in compartment x FullCompartment) probabilities of flowing into
+            each FullCompartment and the (sub group x compartment x time in compartment) probabilities of leaving
+            and of remaining in the compartment for the transitions of `time_step`.
+        Cohorts that have not spent a full time step in the compartment neither leave nor remain, and cohorts past
+            the end of the transition table remain, where they must already be empty.
+        """
+        transition_matrices = [
+            compartment.compartment_transitions.get_per_time_step_transition_matrix(
+                time_step
+            )
+            for full_compartments in self._full_compartments
+            for compartment in full_compartments
+        ]
+        cache_key = tuple(id(matrix) for matrix, _ in transition_matrices)
+        cached_operator = self._transfer_operator_cache.get(cache_key)
+        if cached_operator is not None and all(
+            cached_matrix is matrix
+            for cached_matrix, (matrix, _) in zip(
+                cached_operator[0], transition_matrices
+            )
+        ):
+            return cached_operator[1]
+
+        num_compartments = len(self.compartment_tags)
+        operator_shape = (
+            len(self.simulation_groups),
+            num_compartments,
+            max(len(matrix) for matrix, _ in transition_matrices) + 2,
+        )
+        inflow_probabilities = np.zeros((*operator_shape, num_compartments))
+        leave_probabilities = np.zeros(operator_shape)
+        remain_probabilities = np.zeros(operator_shape)
+        for index, (matrix, outflows) in enumerate(transition_matrices):
+            group_index, compartment_index = divmod(index, num_compartments)
+            max_duration = len(matrix)
+            inflow_probabilities[
+                group_index, compartment_index, 1 : max_duration + 1
+            ] = matrix[:, :-1] @ self._get_inflow_routing(outflows)
+            leave_probabilities[
+                group_index, compartment_index, 1 : max_duration + 1
+            ] = matrix[:, :-1].sum(axis=1)
+            remain_probabilities[
+                group_index, compartment_index, 1 : max_duration + 1
+            ] = matrix[:, -1]
+            remain_probabilities[
+                group_index, compartment_index, max_duration + 1 :
+            ] = 1.0
+
+        transfer_operator = (
+            inflow_probabilities,
+            leave_probabilities,
+            remain_probabilities,
+        )
+        self._transfer_operator_cache[cache_key] = (
+            tuple(matrix for matrix, _ in transition_matrices),
+            transfer_operator,
+        )
+        return transfer_operator
+
+    def _override_historical_inflows(
+        self, compartment_inflows: np.ndarray, time_step: int
+    ) -> None:
+        """
+        Replace the modeled inflows out of each FullCompartment with its historical outflows when available, and
+            with its earliest historical outflows before them, as FullCompartment.step_forward() does
+        """
+        for group_index, group_historical_inflows in enumerate(
+            self._historical_inflows
+        ):
+            for compartment_index, historical_inflows in enumerate(
+                group_historical_inflows
+            ):
+                if not historical_inflows:
+                    continue
+                first_historical_time_step = min(historical_inflows)
+                if time_step in historical_inflows:
+                    compartment_inflows[
+                        :, group_index, compartment_index
+                    ] = historical_inflows[time_step]
+                elif time_step < first_historical_time_step:
+                    compartment_inflows[
+                        :, group_index, compartment_index
+                    ] = historical_inflows[first_historical_time_step]
+
+    def _sample_admissions(self, num_time_steps: int) -> np.ndarray:
+        """Return the (replicate x time step x sub group x FullCompartment) admissions drawn from every ShellCompartment"""
+        admissions = np.zeros(
+            (
+                self.num_replicates,
+                num_time_steps,
+                len(self.simulation_groups),
+                len(self.compartment_tags),
+            )
+        )
+        for group_index, shell_compartments in enumerate(self._shell_compartments):
+            for shell, shell_time_step in zip(
+                shell_compartments, self._shell_time_steps[group_index]
+            ):
+                shell_admissions = shell.sample_time_step_admissions(
+                    shell_time_step,
+                    num_time_steps,
+                    self.num_replicates,
+                    self.rng,
+                )
+                for admission_to, admission_paths in shell_admissions.items():
+                    compartment_index = self._compartment_indices.get(admission_to)
+                    if compartment_index is not None:
+                        admissions[
+                            :, :, group_index, compartment_index
+                        ] += admission_paths
+        return admissions
+
+    def _scale_populations(self, populations: np.ndarray, time_step: int) -> None:
+        """
+        Scale the cohort populations of every replicate to match the population data of `time_step`, as
+            PopulationSimulation._scale_populations() does
+        """
+        time_step_data = self.population_data[
+            self.population_data.time_step == time_step
+        ]
+        if time_step_data.empty:
+            return
+
+        compartment_populations = populations.sum(axis=-1)
+        if (
+            "simulation_group" in self.population_data.columns
+            and self.population_data["simulation_group"].notnull().all()
+        ):
+            group_population_data = time_step_data.groupby(
+                ["compartment", "simulation_group"]
+            ).compartment_population.sum()
+            for (
+                compartment,
+                simulation_group,
+            ), population in group_population_data.items():
+                group_index = self.simulation_groups.index(simulation_group)
+                compartment_index = self._compartment_indices[compartment]
+                scale_factors = (
+                    population
+                    / compartment_populations[:, group_index, compartment_index]
+                )
+                populations[:, group_index, compartment_index] *= scale_factors[
+                    :, np.newaxis
+                ]
+        else:
+            population_data = time_step_data.groupby(
+                "compartment"
+            ).compartment_population.sum()
+            for compartment, population in population_data.items():
+                compartment_index = self._compartment_indices[compartment]
+                scale_factors = population / compartment_populations[
+                    :, :, compartment_index
+                ].sum(axis=1)
+                populations[:, :, compartment_index] *= scale_factors[
+                    :, np.newaxis, np.newaxis
+                ]
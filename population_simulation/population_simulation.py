@@ -17,12 +17,50 @@
 """Simulation object that models a given policy scenario"""
 # pylint: disable=unused-argument
 
+from copy import deepcopy
 from time import time
-from typing import Callable, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
+from population_simulation.cross_flow import (
+    CrossFlowKind,
+    SimulationGroupRemap,
+    cross_flow_kind,
+    get_cross_flow_kind,
+)
+from population_simulation.population_simulation_results import (
+    PopulationSimulationResults,
+)
+from sub_simulation.matrix_sub_simulation import (
+    MatrixSubSimulation,
+    MatrixSubSimulationBatch,
+)
 from sub_simulation.sub_simulation import SubSimulation
+from utils.results_builder import ResultsBuilder
+
+
+# consecutive time steps over which the cohorts and outflows must stop changing to detect a steady state
+STEADY_STATE_TIME_STEPS = 4
+
+# age group each recidiviz BQ "age" group moves to when a cohort ages 5 years
+RECIDIVIZ_AGE_GROUP_TRANSITIONS = {
+    "0-24": "25-29",
+    "25-29": "30-34",
+    "30-34": "35-39",
+    "35-39": "40+",
+    "40+": "40+",
+}
+
+
+def _get_age_transitioning_cohorts(
+    start_time_steps: np.ndarray, current_time_step: int
+) -> np.ndarray:
+    """Only change cohorts that are 5 years (60 monthly time steps) since their last change"""
+    return (start_time_steps != current_time_step) & (
+        (start_time_steps - current_time_step) % 60 == 0
+    )
 
 
 class PopulationSimulation:
@@ -40,8 +78,12 @@ class PopulationSimulation:
         ],
         should_scale_populations: bool,
         validation_transitions_data: Optional[pd.DataFrame] = None,
+        sub_simulation_batch: Optional[MatrixSubSimulationBatch] = None,
+        steady_state_tolerance: Optional[float] = None,
     ) -> None:
         self.sub_simulations = sub_simulations
+        # steps all the sub simulations at once when they share one MatrixSubSimulationBatch
+        self.sub_simulation_batch = sub_simulation_batch
         self.population_data = population_data
         self.projection_time_steps = projection_time_steps
         self.current_time_step = first_relevant_time_step
@@ -54,50 +96,247 @@ class PopulationSimulation:
         self.should_scale_populations = should_scale_populations
         self.validation_transition_data = validation_transitions_data or pd.DataFrame()
         self.population_projections = pd.DataFrame()
+        # tolerance below which `simulate_policies()` considers the compartment populations converged and
+        # extrapolates them to the end of the projection, see `step_forward()`. Always steps to the end if None
+        self.steady_state_tolerance = steady_state_tolerance
+        # first time step extrapolated from the steady state instead of simulated, None if every time step was
+        # simulated
+        self.steady_state_time_step: Optional[int] = None
 
     def get_population_projections(self) -> pd.DataFrame:
         return self.population_projections
 
-    def simulate_policies(self) -> pd.DataFrame:
-        """Run a population projection and return population counts by year, compartment, and sub-group."""
+    def add_population_intervals(self, population_intervals: pd.DataFrame) -> None:
+        """
+        Add the `compartment_population_min` and `compartment_population_max` columns of `population_intervals` to
+            the population projections, matched on time step, compartment, and simulation group. Time steps outside
+            of the intervals, like the warm-up, get the projected population as both bounds.
+        """
+        interval_keys = ["time_step", "compartment", "simulation_group"]
+        interval_bounds = population_intervals.set_index(interval_keys).reindex(
+            pd.MultiIndex.from_frame(self.population_projections[interval_keys])
+        )
+        for column in ["compartment_population_min", "compartment_population_max"]:
+            self.population_projections[column] = np.where(
+                interval_bounds[column].isnull(),
+                self.population_projections["compartment_population"],
+                interval_bounds[column],
+            )
+
+    def simulate_policies(self, num_time_steps: Optional[int] = None) -> pd.DataFrame:
+        """
+        Run a population projection and return population counts by year, compartment, and sub-group.
+        `num_time_steps` the number of time steps left to project, defaults to `projection_time_steps`
+        """
 
         start = time()
 
         # Run the sub simulations for each time_step
-        self.step_forward(self.projection_time_steps)
+        self.step_forward(
+            self.projection_time_steps if num_time_steps is None else num_time_steps,
+            self.steady_state_tolerance,
+        )
 
         #  Store the results in one Dataframe
-        for simulation_tag, simulation_obj in self.sub_simulations.items():
-            sub_population_projection = simulation_obj.get_population_projections()
-            sub_population_projection["simulation_group"] = simulation_tag
-            self.population_projections = pd.concat(
-                [self.population_projections, sub_population_projection]
-            )
+        results_builder = self._get_population_projections_builder()
+        self._add_population_projections(results_builder)
+        population_projections = results_builder.to_data_frame()
+        population_projections.index = population_projections.time_step.to_numpy()
+        self.population_projections = pd.concat(
+            [
+                self.population_projections,
+                population_projections[
+                    [
+                        "compartment",
+                        "compartment_population",
+                        "time_step",
+                        "simulation_group",
+                    ]
+                ],
+            ]
+        )
 
         print("simulation_time: ", time() - start)
 
         return self.population_projections
 
-    def step_forward(self, num_time_steps: int) -> None:
-        """Steps forward in the projection by some number of steps."""
-        for _ in range(num_time_steps):
-            for simulation_obj in self.sub_simulations.values():
-                simulation_obj.step_forward()
-            for simulation_obj in self.sub_simulations.values():
-                simulation_obj.create_new_cohort()
+    def step_forward(
+        self, num_time_steps: int, steady_state_tolerance: Optional[float] = None
+    ) -> None:
+        """
+        Steps forward in the projection by some number of steps.
+        `steady_state_tolerance` if set, stop stepping once the transitions and admissions no longer change, every
+            cohort simulated before that has had the longest compartment duration to transition, and both the
+            population of every compartment per time spent in it and the compartment outflows changed by less than
+            this fraction of themselves over each of the last time steps. The remaining time steps are then
+            extrapolated instead of simulated, see `SparkCompartment.extend_steady_state()`. The first
+            extrapolated time step is recorded as `steady_state_time_step`, and the simulation cannot be stepped
+            forward any further.
+        """
+        if self.steady_state_time_step is not None:
+            raise ValueError(
+                f"Cannot step forward a simulation extended from its steady state at time step "
+                f"{self.steady_state_time_step}"
+            )
+        first_check_time_step = None
+        if steady_state_tolerance is not None:
+            stationary_time_step = self._get_stationary_time_step(
+                self.current_time_step + num_time_steps, steady_state_tolerance
+            )
+            max_duration = self._get_max_duration()
+            if stationary_time_step is not None:
+                # cohorts admitted before the stationary time step keep reshaping the populations until they leave
+                first_check_time_step = stationary_time_step + max_duration
+        # cohort states after the latest time steps, oldest first
+        recent_states: List[List[np.ndarray]] = []
+
+        for step in range(num_time_steps):
+            if self.sub_simulation_batch is not None:
+                self.sub_simulation_batch.step_forward()
+                self.sub_simulation_batch.create_new_cohort()
+            else:
+                for simulation_obj in self.sub_simulations.values():
+                    simulation_obj.step_forward()
+                for simulation_obj in self.sub_simulations.values():
+                    simulation_obj.create_new_cohort()
 
             self._cross_flow()
 
             if self.should_scale_populations:
                 self._scale_populations()
 
-            for simulation_obj in self.sub_simulations.values():
-                simulation_obj.prepare_for_next_step()
+            if self.sub_simulation_batch is not None:
+                self.sub_simulation_batch.prepare_for_next_step()
+            else:
+                for simulation_obj in self.sub_simulations.values():
+                    simulation_obj.prepare_for_next_step()
 
             self.current_time_step += 1
 
+            if (
+                first_check_time_step is None
+                or self.current_time_step < first_check_time_step
+            ):
+                continue
+            recent_states = recent_states[1 - STEADY_STATE_TIME_STEPS :] + [
+                self._collect_cohort_state(max_duration + 1)
+            ]
+            if self._reached_steady_state(recent_states, steady_state_tolerance):
+                self._extend_steady_state(num_time_steps - step - 1)
+                return
+
+    @staticmethod
+    def _reached_steady_state(
+        recent_states: List[List[np.ndarray]], tolerance: float
+    ) -> bool:
+        """
+        Helper function for step_forward. Return True if, over each of the latest time steps, every array of the
+            cohort state changed by less than `tolerance` times its own total
+        """
+        if len(recent_states) < STEADY_STATE_TIME_STEPS:
+            return False
+        for previous_state, state in zip(recent_states[:-1], recent_states[1:]):
+            for previous_array, array in zip(previous_state, state):
+                if previous_array.shape != array.shape:
+                    return False
+                if (
+                    np.abs(array - previous_array).sum()
+                    > tolerance * np.abs(array).sum()
+                ):
+                    return False
+        return True
+
+    def _get_stationary_time_step(
+        self, end_time_step: int, tolerance: float
+    ) -> Optional[int]:
+        """
+        Helper function for step_forward. Return the first time step from which every time step up to
+            `end_time_step` is simulated the same way, or None if the simulation never reaches a steady state
+        """
+        if tolerance < 0:
+            raise ValueError(f"Steady state tolerance cannot be negative: {tolerance}")
+        # cohorts moved between sub simulations, like aging cohorts, keep changing the sub group populations
+        if get_cross_flow_kind(self.cross_flow_function) != CrossFlowKind.IDENTITY:
+            return None
+
+        stationary_time_steps = [
+            simulation_obj.get_stationary_time_step(
+                self.current_time_step, end_time_step, tolerance
+            )
+            for simulation_obj in self.sub_simulations.values()
+        ]
+        if self.should_scale_populations and not self.population_data.empty:
+            stationary_time_steps.append(self.population_data.time_step.max() + 1)
+        return max(stationary_time_steps)
+
+    def _get_max_duration(self) -> int:
+        """Helper function for step_forward. Return the longest compartment duration of any sub simulation"""
+        return max(
+            simulation_obj.get_max_duration()
+            for simulation_obj in self.sub_simulations.values()
+        )
+
+    def _collect_cohort_state(self, num_durations: int) -> List[np.ndarray]:
+        """Helper function for step_forward. Collect the cohort state of every sub simulation"""
+        if self.sub_simulation_batch is not None:
+            return self.sub_simulation_batch.get_cohort_state(num_durations)
+
+        cohort_state: List[np.ndarray] = []
+        for simulation_obj in self.sub_simulations.values():
+            cohort_state.extend(simulation_obj.get_cohort_state(num_durations))
+        return cohort_state
+
+    def _extend_steady_state(self, num_time_steps: int) -> None:
+        """Helper function for step_forward. Extrapolate the results of the latest time step for `num_time_steps`"""
+        for simulation_obj in self.sub_simulations.values():
+            simulation_obj.extend_steady_state(num_time_steps)
+        self.steady_state_time_step = self.current_time_step
+        self.current_time_step += num_time_steps
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the state of every sub simulation at the current time step"""
+        return {
+            "current_time_step": self.current_time_step,
+            "steady_state_time_step": self.steady_state_time_step,
+            "population_projections": self.population_projections.copy(),
+            "sub_simulations": {
+                simulation_tag: simulation_obj.get_snapshot()
+                for simulation_tag, simulation_obj in self.sub_simulations.items()
+            },
+        }
+
+    def restore_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Reset the simulation to the state returned by `get_snapshot()`, usually taken from another scenario built
+            from the same data. The transitions and admissions predictors of this simulation are kept, so stepping
+            forward from the restored time step applies this scenario's policies.
+        """
+        if set(snapshot["sub_simulations"]) != set(self.sub_simulations):
+            raise ValueError(
+                f"Snapshot sub simulations {list(snapshot['sub_simulations'])} do not match the simulation "
+                f"sub simulations {list(self.sub_simulations)}"
+            )
+        self.current_time_step = snapshot["current_time_step"]
+        self.steady_state_time_step = snapshot["steady_state_time_step"]
+        self.population_projections = deepcopy(snapshot["population_projections"])
+        for simulation_tag, simulation_obj in self.sub_simulations.items():
+            simulation_obj.restore_snapshot(snapshot["sub_simulations"][simulation_tag])
+
+        # the restored sub simulations left the batch, step them with a new one
+        if self.sub_simulation_batch is not None:
+            self.sub_simulation_batch = MatrixSubSimulationBatch(
+                {
+                    simulation_tag: simulation_obj
+                    for simulation_tag, simulation_obj in self.sub_simulations.items()
+                    if isinstance(simulation_obj, MatrixSubSimulation)
+                }
+            )
+
     def _collect_subsimulation_populations(self) -> pd.DataFrame:
         """Helper function for step_forward(). Collects subgroup populations for total population scaling."""
+        if self.sub_simulation_batch is not None:
+            return self.sub_simulation_batch.get_current_populations()
+
         populations_df = pd.DataFrame()
         for simulation_tag, simulation_obj in self.sub_simulations.items():
             sim_pops = simulation_obj.get_current_populations()
@@ -107,13 +346,24 @@ class PopulationSimulation:
 
     def _cross_flow(self) -> None:
         """Helper function for step_forward. Transfer cohorts between SubSimulations"""
-        cross_simulation_flows = pd.DataFrame()
-        for simulation_tag, simulation_obj in self.sub_simulations.items():
-            simulation_cohorts = simulation_obj.cross_flow()
-            simulation_cohorts["simulation_group"] = simulation_tag
-            cross_simulation_flows = pd.concat(
-                [cross_simulation_flows, simulation_cohorts], sort=True
-            )
+        kind = get_cross_flow_kind(self.cross_flow_function)
+        if kind == CrossFlowKind.IDENTITY:
+            return
+        if kind == CrossFlowKind.GROUP_REMAP and self._remap_simulation_groups(
+            getattr(self.cross_flow_function, "simulation_group_remap")
+        ):
+            return
+
+        if self.sub_simulation_batch is not None:
+            cross_simulation_flows = self.sub_simulation_batch.cross_flow()
+        else:
+            cross_simulation_flows = pd.DataFrame()
+            for simulation_tag, simulation_obj in self.sub_simulations.items():
+                simulation_cohorts = simulation_obj.cross_flow()
+                simulation_cohorts["simulation_group"] = simulation_tag
+                cross_simulation_flows = pd.concat(
+                    [cross_simulation_flows, simulation_cohorts], sort=True
+                )
 
         unassigned_cohorts = cross_simulation_flows[
             cross_simulation_flows.compartment.isnull()
@@ -139,12 +389,68 @@ class PopulationSimulation:
             .reset_index(["compartment", "simulation_group"])
         )
 
+        if self.sub_simulation_batch is not None:
+            self.sub_simulation_batch.ingest_cross_simulation_cohorts(
+                cross_simulation_flows
+            )
+            return
+
         for simulation_tag, simulation_obj in self.sub_simulations.items():
             sub_group_cohorts = cross_simulation_flows[
                 cross_simulation_flows.simulation_group == simulation_tag
             ].drop("simulation_group", axis=1)
             simulation_obj.ingest_cross_simulation_cohorts(sub_group_cohorts)
 
+    def _remap_simulation_groups(self, remap: SimulationGroupRemap) -> bool:
+        """
+        Helper function for _cross_flow. Move whole cohorts between SubSimulations in place.
+        Returns False if the remap cannot be applied in place, in which case nothing is moved.
+        """
+        simulation_group_mapping = remap.simulation_group_mapping
+        if any(
+            simulation_group_mapping.get(simulation_tag) not in self.sub_simulations
+            for simulation_tag in self.sub_simulations
+        ):
+            return False
+
+        if self.sub_simulation_batch is not None:
+            start_time_steps, _ = self.sub_simulation_batch.get_cohort_labels()
+            self.sub_simulation_batch.remap_simulation_groups(
+                simulation_group_mapping,
+                remap.transitioning_cohorts(start_time_steps, self.current_time_step),
+            )
+            return True
+
+        # the cohorts can only be moved in place if every SubSimulation tracks the same cohorts
+        cohort_labels = [
+            simulation_obj.get_cohort_labels()
+            for simulation_obj in self.sub_simulations.values()
+        ]
+        if any(
+            labels is None
+            or not np.array_equal(labels[0], cohort_labels[0][0])
+            or not np.array_equal(labels[1], cohort_labels[0][1])
+            for labels in cohort_labels
+        ):
+            return False
+
+        start_time_steps = cohort_labels[0][0]
+        start_time_steps = start_time_steps[
+            remap.transitioning_cohorts(start_time_steps, self.current_time_step)
+        ]
+        if len(start_time_steps) == 0:
+            return True
+
+        cohort_populations = {
+            simulation_tag: simulation_obj.pop_cohort_populations(start_time_steps)
+            for simulation_tag, simulation_obj in self.sub_simulations.items()
+        }
+        for simulation_tag, populations in cohort_populations.items():
+            self.sub_simulations[
+                simulation_group_mapping[simulation_tag]
+            ].add_cohort_populations(start_time_steps, populations)
+        return True
+
     def _scale_populations(self) -> None:
         """Helper function for step_forward. Scale populations in each compartment to match historical data."""
 
@@ -191,180 +497,144 @@ class PopulationSimulation:
 
     def get_outflows(self, collapse_compartments: bool = False) -> pd.DataFrame:
         """Return the projected outflows (transitions)"""
+        results_builder = self._get_outflows_builder()
+        self._add_outflows(results_builder)
+        outflows_df = results_builder.to_data_frame().set_index(
+            ["outflow_to", "time_step"]
+        )[["cohort_population", "compartment", "simulation_group"]]
+        if collapse_compartments:
+            return PopulationSimulationResults.collapse_outflows(outflows_df)
+        return outflows_df
+
+    def write_population_projections(self, parquet_path: str) -> None:
+        """
+        Stream the population projections of every time step simulated so far to a Parquet file, without
+        collecting them in one DataFrame. The simulation_group and compartment columns are dictionary encoded.
+        """
+        results_builder = self._get_population_projections_builder(parquet_path)
+        self._add_population_projections(results_builder)
+        results_builder.close()
+
+    def write_outflows(self, parquet_path: str) -> None:
+        """Stream the projected outflows to a Parquet file, without collecting them in one DataFrame"""
+        results_builder = self._get_outflows_builder(parquet_path)
+        self._add_outflows(results_builder)
+        results_builder.close()
+
+    def _get_population_projections_builder(
+        self, parquet_path: Optional[str] = None
+    ) -> ResultsBuilder:
+        return ResultsBuilder(
+            ["simulation_group", "compartment"],
+            "compartment_population",
+            capacity=sum(
+                simulation_obj.get_num_population_projection_rows()
+                for simulation_obj in self.sub_simulations.values()
+            ),
+            parquet_path=parquet_path,
+        )
+
+    def _add_population_projections(self, results_builder: ResultsBuilder) -> None:
+        for simulation_tag, simulation_obj in self.sub_simulations.items():
+            simulation_obj.add_population_projections(
+                results_builder, {"simulation_group": simulation_tag}
+            )
+
+    def _get_outflows_builder(
+        self, parquet_path: Optional[str] = None
+    ) -> ResultsBuilder:
+        return ResultsBuilder(
+            ["simulation_group", "compartment", "outflow_to"],
+            "cohort_population",
+            capacity=sum(
+                compartment.outflows.size
+                for simulation_obj in self.sub_simulations.values()
+                for compartment in simulation_obj.simulation_compartments.values()
+            ),
+            parquet_path=parquet_path,
+        )
 
-        # Generate the outflows df by looping through each sub-simulation & compartment
-        outflows_df = pd.DataFrame()
+    def _add_outflows(self, results_builder: ResultsBuilder) -> None:
+        """Add the outflows of every sub-simulation & compartment, skipping missing values"""
         for simulation_tag, simulation_obj in self.sub_simulations.items():
             for (
                 compartment_tag,
                 compartment,
             ) in simulation_obj.simulation_compartments.items():
-                # Copy the outflows df from the compartment and add the compartment and
-                # simulation group information
-                compartment_outflows = compartment.outflows.copy()
-                compartment_outflows.index.name = "outflow_to"
-                compartment_outflows.columns.name = "time_step"
-                compartment_outflows = pd.DataFrame(
-                    compartment_outflows.stack("time_step"),
-                    columns=["cohort_population"],
+                outflows = compartment.outflows.to_numpy(dtype=float)
+                is_recorded = ~np.isnan(outflows)
+                outflow_to_index, time_step_index = np.nonzero(is_recorded)
+                results_builder.add(
+                    compartment.outflows.columns.to_numpy()[time_step_index],
+                    outflows[is_recorded],
+                    {
+                        "simulation_group": simulation_tag,
+                        "compartment": compartment_tag,
+                        "outflow_to": compartment.outflows.index.to_numpy()[
+                            outflow_to_index
+                        ],
+                    },
                 )
-                compartment_outflows["compartment"] = compartment_tag
-
-                # Add a column for the `simulation_group` from the id dict
-                compartment_outflows["simulation_group"] = simulation_tag
-
-                # Append the outflows for this simulation group/compartment
-                outflows_df = pd.concat([outflows_df, compartment_outflows])
-        if collapse_compartments:
-            return (
-                outflows_df.reset_index()
-                .groupby(["compartment", "outflow_to", "time_step"])[
-                    ["cohort_population"]
-                ]
-                .sum()
-            )
-        return outflows_df
 
     def gen_arima_output_df(self) -> pd.DataFrame:
-        arima_output_df = pd.DataFrame()
-        for simulation_tag, sub_simulation in self.sub_simulations.items():
-            output_df_sub = pd.concat(
-                {simulation_tag: sub_simulation.gen_arima_output_df()},
-                names=["simulation_group"],
-            )
-            arima_output_df = pd.concat([arima_output_df,output_df_sub])
-        return arima_output_df
+        return pd.concat(
+            {
+                simulation_tag: sub_simulation.gen_arima_output_df()
+                for simulation_tag, sub_simulation in self.sub_simulations.items()
+            },
+            names=["simulation_group"],
+        )
 
     def gen_scale_factors_df(self) -> pd.DataFrame:
-        scale_factors_df = pd.DataFrame()
-        for simulation_tag, simulation_obj in self.sub_simulations.items():
-            subgroup_scale_factors = simulation_obj.get_scale_factors()
-            subgroup_scale_factors["simulation_group"] = simulation_tag
-            scale_factors_df = pd.concat([scale_factors_df, subgroup_scale_factors])
-        return scale_factors_df
+        subgroup_scale_factors = [
+            simulation_obj.get_scale_factors().assign(simulation_group=simulation_tag)
+            for simulation_tag, simulation_obj in self.sub_simulations.items()
+        ]
+        return pd.concat(subgroup_scale_factors)
+
+    def get_results(self) -> PopulationSimulationResults:
+        """Return the outputs of the simulation without its cohorts, transitions and predictors"""
+        return PopulationSimulationResults(
+            population_projections=self.population_projections,
+            population_data=self.population_data,
+            outflows=self.get_outflows(),
+        )
 
     def get_data_for_compartment_time_step(
         self, compartment: str, time_step: int
     ) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        simulation_population = self.population_projections[
-            (self.population_projections.compartment == compartment)
-            & (self.population_projections.time_step == time_step)
-        ]
-        historical_population = self.population_data[
-            (self.population_data.compartment == compartment)
-            & (self.population_data.time_step == time_step)
-        ]
-
-        return simulation_population, historical_population
+        return PopulationSimulationResults(
+            self.population_projections, self.population_data
+        ).get_data_for_compartment_time_step(compartment, time_step)
 
     def gen_population_error(self) -> pd.DataFrame:
         """Returns the error of the population projection."""
-        population_error = pd.DataFrame(
-            index=self.population_data.time_step.unique(),
-            columns=self.population_data.compartment.unique(),
-        )
-
-        min_projection_time_step = min(self.population_projections["time_step"])
-        for compartment in population_error.columns:
-            for time_step in population_error.index:
-                if time_step < min_projection_time_step:
-                    continue
-
-                (
-                    simulation_population,
-                    historical_population,
-                ) = self.get_data_for_compartment_time_step(compartment, time_step)
-                simulation_population = (
-                    simulation_population.compartment_population.sum()
-                )
-                historical_population = (
-                    historical_population.compartment_population.sum()
-                )
-
-                if simulation_population == 0:
-                    raise ValueError(
-                        f"Simulation population total for compartment {compartment} and time step {time_step} "
-                        "cannot be 0 for validation"
-                    )
-                if historical_population == 0:
-                    raise ValueError(
-                        f"Historical population data for compartment {compartment} and time step {time_step} "
-                        "cannot be 0 for validation"
-                    )
-
-                population_error.loc[time_step, compartment] = (
-                    simulation_population - historical_population
-                ) / historical_population
-
-        return population_error.sort_index()
+        return PopulationSimulationResults(
+            self.population_projections, self.population_data
+        ).gen_population_error()
 
     def gen_full_error(self) -> pd.DataFrame:
         """Compile error data from sub-simulations"""
-        min_projection_time_step = min(self.population_projections["time_step"])
-        population_error = pd.DataFrame(
-            index=pd.MultiIndex.from_product(
-                [
-                    self.population_data.compartment.unique(),
-                    range(
-                        min_projection_time_step,
-                        self.population_data.time_step.max() + 1,
-                    ),
-                ],
-                names=["compartment", "time_step"],
-            ),
-            columns=["simulation_population", "historical_population", "percent_error"],
+        return PopulationSimulationResults(
+            self.population_projections, self.population_data
+        ).gen_full_error()
+
+    def get_outflow_error_summary(
+        self, compartment: str, outflow_to: str, unit: str = "abs"
+    ) -> pd.Series:
+        """Return the mean absolute error of the `compartment` to `outflow_to` outflows per sub simulation"""
+        return pd.Series(
+            {
+                simulation_tag: simulation_obj.get_error(compartment, unit=unit)[
+                    outflow_to
+                ]
+                .abs()
+                .mean()
+                for simulation_tag, simulation_obj in self.sub_simulations.items()
+            },
+            dtype=float,
         )
 
-        for (compartment, time_step) in population_error.index:
-
-            (
-                simulation_population,
-                historical_population,
-            ) = self.get_data_for_compartment_time_step(compartment, time_step)
-            if simulation_population.empty:
-                simulation_population = None
-            else:
-                simulation_population = (
-                    simulation_population.compartment_population.sum()
-                )
-
-            if historical_population.empty:
-                historical_population = None
-            else:
-                historical_population = (
-                    historical_population.compartment_population.sum()
-                )
-
-            # Skip compartments that do not have any population data
-            if (simulation_population == 0) & (
-                (historical_population == 0) | (historical_population is None)
-            ):
-                continue
-
-            if simulation_population == 0:
-                raise ValueError(
-                    f"Simulation population total for compartment {compartment} and time step {time_step} "
-                    "cannot be 0 for validation"
-                )
-            if historical_population == 0:
-                raise ValueError(
-                    f"Historical population data for compartment {compartment} and time step {time_step} "
-                    "cannot be 0 for validation"
-                )
-
-            if simulation_population is not None and historical_population is not None:
-                population_error.loc[
-                    (compartment, time_step), "simulation_population"
-                ] = simulation_population
-                population_error.loc[
-                    (compartment, time_step), "historical_population"
-                ] = historical_population
-                population_error.loc[(compartment, time_step), "percent_error"] = (
-                    simulation_population - historical_population
-                ) / historical_population
-
-        return population_error.sort_index().dropna()
-
     def set_cross_flow_function(
         self, cross_flow_function: Callable[[pd.DataFrame, int], pd.DataFrame]
     ) -> None:
@@ -372,6 +642,7 @@ class PopulationSimulation:
         self.cross_flow_function = cross_flow_function
 
     @staticmethod
+    @cross_flow_kind(CrossFlowKind.IDENTITY)
     def update_attributes_identity(
         cross_simulation_flows: pd.DataFrame, current_time_step: int
     ) -> pd.DataFrame:
@@ -382,6 +653,12 @@ class PopulationSimulation:
         return cross_simulation_flows
 
     @staticmethod
+    @cross_flow_kind(
+        CrossFlowKind.GROUP_REMAP,
+        SimulationGroupRemap(
+            RECIDIVIZ_AGE_GROUP_TRANSITIONS, _get_age_transitioning_cohorts
+        ),
+    )
     def update_attributes_age_recidiviz_schema(
         cross_simulation_flows: pd.DataFrame, current_time_step: int
     ) -> pd.DataFrame:
@@ -390,25 +667,15 @@ class PopulationSimulation:
         recidiviz_schema: assumes use of 'age' disaggregation axis with values that match recidiviz BQ "age" column.
         Should only be used with a monthly time step
         """
-        ages = {
-            "0-24": "25-29",
-            "25-29": "30-34",
-            "30-34": "35-39",
-            "35-39": "40+",
-            "40+": "40+",
-        }
-
-        # Only change cohorts that are 5 years since their last change
-        transitioners_idx = [
-            ((i != current_time_step) & ((i - current_time_step) % 60 == 0))
-            for i in cross_simulation_flows.index
-        ]
+        transitioners_idx = _get_age_transitioning_cohorts(
+            np.asarray(cross_simulation_flows.index, dtype=np.int64), current_time_step
+        )
 
         new_cohorts = cross_simulation_flows.copy()
 
         new_cohorts.loc[transitioners_idx, "simulation_group"] = new_cohorts.loc[
             transitioners_idx, "simulation_group"
-        ].map(ages)
+        ].map(RECIDIVIZ_AGE_GROUP_TRANSITIONS)
 
         null_value_indices = new_cohorts[new_cohorts.simulation_group.isnull()].index
         if len(null_value_indices) > 0:
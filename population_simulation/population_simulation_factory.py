@@ -18,12 +18,23 @@
 import logging
 from functools import partial
 from time import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import pandas as pd
 
+from population_simulation.equilibrium_initializer import EquilibriumInitializer
 from population_simulation.population_simulation import PopulationSimulation
+from population_simulation.warm_start_cache import (
+    DEFAULT_WARM_START_CACHE_DIRECTORY,
+    WarmStartCache,
+)
+from predicted_admissions import ArimaFitBackend, ArimaFitScheduler
+from spark_compartment import SparkCompartment
 from spark_policy import SparkPolicy
+from sub_simulation.matrix_sub_simulation import (
+    MatrixSubSimulation,
+    MatrixSubSimulationBatch,
+)
 from sub_simulation.sub_simulation import SubSimulation
 from sub_simulation.sub_simulation_factory import SubSimulationFactory
 from super_simulation.initializer import (
@@ -31,6 +42,7 @@ from super_simulation.initializer import (
     UserInputs,
 )
 from transition_table import TransitionTable
+from utils.arima_fit_cache import ArimaFitCache
 
 
 class PopulationSimulationFactory:
@@ -43,6 +55,9 @@ class PopulationSimulationFactory:
         policy_list: List[SparkPolicy],
         first_relevant_time_step: int,
         data_inputs: SimulationInputData,
+        arima_fit_cache: Optional[ArimaFitCache] = None,
+        warm_up: bool = True,
+        shared_population_simulation: Optional[PopulationSimulation] = None,
     ) -> PopulationSimulation:
         """
         Initializes sub-simulations
@@ -51,6 +66,13 @@ class PopulationSimulationFactory:
         `first_relevant_time_step` should be the time-step to start initialization at
             initialization. Default is 2 to ensure long-sentence cohorts are well-populated.
         `data_inputs`: RawDataInputs
+        `arima_fit_cache`: optional on-disk cache of fitted ARIMA models to reuse across simulations
+        `warm_up`: if False, the simulation is returned at `first_relevant_time_step` without running up to the
+            start_time_step, to be warmed up with `warm_up_population_simulation()`, stepped forward, or restored
+            from a snapshot by the caller
+        `shared_population_simulation`: optional simulation built from the same inputs without any policies, whose
+            transition tables and fitted admissions predictors are reused for the compartments `policy_list` does
+            not change
         """
         start = time()
 
@@ -64,6 +86,10 @@ class PopulationSimulationFactory:
             data_inputs.transitions_data.simulation_group.dropna().unique()
         )
 
+        shared_compartments = cls._get_shared_compartments(
+            shared_population_simulation, policy_list
+        )
+
         if data_inputs.should_initialize_compartment_populations:
 
             # add to `policy_list` to switch from remaining sentences data to transitions data
@@ -110,13 +136,36 @@ class PopulationSimulationFactory:
             # applied before other policies on the same time step
             policy_list = alternate_transition_policies + policy_list
 
+        # Collect the admissions ARIMA fits of every sub simulation and fit them together
+        arima_fit_scheduler = ArimaFitScheduler(
+            user_inputs.arima_fit_workers,
+            arima_fit_cache,
+            ArimaFitBackend(user_inputs.arima_fit_backend)
+            if user_inputs.arima_fit_backend is not None
+            else ArimaFitBackend.STATSMODELS,
+            user_inputs.arima_fit_check_sample_size,
+        )
         sub_simulations = cls._build_sub_simulations(
             data_inputs,
             user_inputs,
             policy_list,
             first_relevant_time_step,
             simulation_groups,
+            arima_fit_scheduler,
+            shared_compartments,
         )
+        arima_fit_scheduler.fit_pending_predictors()
+
+        # Step all simulation groups together when they use the matrix engine
+        sub_simulation_batch = None
+        if user_inputs.use_matrix_engine:
+            sub_simulation_batch = MatrixSubSimulationBatch(
+                {
+                    simulation_group: sub_simulation
+                    for simulation_group, sub_simulation in sub_simulations.items()
+                    if isinstance(sub_simulation, MatrixSubSimulation)
+                }
+            )
 
         # If compartment populations are initialized, the first time-step is handled in initialization
         if data_inputs.should_initialize_compartment_populations:
@@ -134,17 +183,78 @@ class PopulationSimulationFactory:
             cross_flow_function=user_inputs.cross_flow_function,
             override_cross_flow_function=data_inputs.override_cross_flow_function,
             should_scale_populations=data_inputs.should_scale_populations_after_step,
+            sub_simulation_batch=sub_simulation_batch,
+            steady_state_tolerance=user_inputs.steady_state_tolerance,
         )
 
         # run simulation up to the start_year
-        population_simulation.step_forward(
-            user_inputs.start_time_step - first_relevant_time_step
-        )
+        if warm_up:
+            cls.warm_up_population_simulation(
+                population_simulation,
+                user_inputs,
+                data_inputs,
+                policy_list,
+                first_relevant_time_step,
+            )
 
         print("initialization time: ", time() - start)
 
         return population_simulation
 
+    @staticmethod
+    def warm_up_population_simulation(
+        population_simulation: PopulationSimulation,
+        user_inputs: UserInputs,
+        data_inputs: SimulationInputData,
+        policy_list: List[SparkPolicy],
+        first_relevant_time_step: int,
+    ) -> None:
+        """
+        Step the simulation forward to the start_time_step, restoring the state from the on-disk warm start cache
+        if `user_inputs` enable it and the same inputs were warmed up before, or load the equilibrium cohorts at
+        the start_time_step without stepping if `user_inputs` enable equilibrium initialization.
+        `population_simulation` must have been built by `build_population_simulation()` with `warm_up=False` and
+            not stepped forward since
+        """
+        if user_inputs.use_equilibrium_initialization:
+            EquilibriumInitializer.initialize(
+                population_simulation,
+                first_relevant_time_step,
+                user_inputs.start_time_step,
+            )
+            return
+
+        warm_up_time_steps = user_inputs.start_time_step - first_relevant_time_step
+        if not user_inputs.use_warm_start_cache:
+            population_simulation.step_forward(warm_up_time_steps)
+            return
+
+        warm_start_cache = WarmStartCache(
+            user_inputs.warm_start_cache_directory or DEFAULT_WARM_START_CACHE_DIRECTORY
+        )
+        cache_key = warm_start_cache.get_cache_key(
+            user_inputs,
+            data_inputs,
+            policy_list,
+            first_relevant_time_step,
+            population_simulation.current_time_step + warm_up_time_steps,
+        )
+        if cache_key is None:
+            logging.warning(
+                "Inputs cannot be hashed by content, not using the warm start cache"
+            )
+            population_simulation.step_forward(warm_up_time_steps)
+            return
+
+        snapshot = warm_start_cache.get_snapshot(cache_key)
+        if snapshot is not None:
+            population_simulation.restore_snapshot(snapshot)
+            return
+
+        population_simulation.step_forward(warm_up_time_steps)
+        warm_start_cache.put_snapshot(cache_key, population_simulation.get_snapshot())
+        warm_start_cache.evict()
+
     @classmethod
     def _build_sub_simulations(
         cls,
@@ -153,8 +263,12 @@ class PopulationSimulationFactory:
         policy_list: List[SparkPolicy],
         first_relevant_time_step: int,
         sub_groups: List[str],
+        arima_fit_scheduler: Optional[ArimaFitScheduler] = None,
+        shared_compartments: Optional[Dict[str, Dict[str, SparkCompartment]]] = None,
     ) -> Dict[str, SubSimulation]:
         """Helper function for initialize_simulation. Initialize one sub simulation per sub-population."""
+        if shared_compartments is None:
+            shared_compartments = {}
         sub_simulations = {}
 
         # reset indices to facilitate unused data tracking
@@ -210,6 +324,9 @@ class PopulationSimulationFactory:
                 first_relevant_time_step=first_relevant_time_step,
                 should_single_cohort_initialize_compartments=data_inputs.should_initialize_compartment_populations,
                 starting_cohort_sizes=start_cohort_sizes,
+                use_matrix_engine=bool(user_inputs.use_matrix_engine),
+                arima_fit_scheduler=arima_fit_scheduler,
+                shared_compartments=shared_compartments.get(simulation_group),
             )
 
         # todo: switch order
@@ -232,6 +349,34 @@ class PopulationSimulationFactory:
 
         return sub_simulations
 
+    @staticmethod
+    def _get_shared_compartments(
+        shared_population_simulation: Optional[PopulationSimulation],
+        policy_list: List[SparkPolicy],
+    ) -> Dict[str, Dict[str, SparkCompartment]]:
+        """
+        Helper function for build_population_simulation. Return the compartments of `shared_population_simulation`
+            per simulation group that no policy in `policy_list` applies to
+        """
+        if shared_population_simulation is None:
+            return {}
+
+        shared_compartments = {}
+        sub_simulations = shared_population_simulation.sub_simulations
+        for simulation_group, sub_simulation in sub_simulations.items():
+            group_policies = SparkPolicy.get_sub_population_policies(
+                policy_list, simulation_group
+            )
+            compartments = sub_simulation.simulation_compartments
+            shared_compartments[simulation_group] = {
+                compartment_tag: compartment
+                for compartment_tag, compartment in compartments.items()
+                if not SparkPolicy.get_compartment_policies(
+                    group_policies, compartment_tag
+                )
+            }
+        return shared_compartments
+
     @classmethod
     def _check_inputs_valid(
         cls,
@@ -252,6 +397,15 @@ class PopulationSimulationFactory:
                 f"Policy list can only include SparkPolicy objects: {policy_list}"
             )
 
+        if (
+            data_inputs.should_initialize_compartment_populations
+            and user_inputs.use_equilibrium_initialization
+        ):
+            raise ValueError(
+                "Equilibrium initialization is not available for micro-simulations, which start from the "
+                "microsim population data"
+            )
+
         if data_inputs.should_initialize_compartment_populations:
             if "simulation_group" not in data_inputs.population_data.columns:
                 raise ValueError(
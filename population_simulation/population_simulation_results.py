@@ -0,0 +1,174 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Outputs of a finished PopulationSimulation, kept without the cohorts, transitions and predictors that produced them"""
+from dataclasses import dataclass, field
+from typing import Tuple
+
+import pandas as pd
+
+
+@dataclass
+class PopulationSimulationResults:
+    """Population projections and outflows of one finished PopulationSimulation"""
+
+    # population per compartment, simulation group and time step, as returned by
+    # PopulationSimulation.get_population_projections()
+    population_projections: pd.DataFrame
+    # historical population data the projections are validated against
+    population_data: pd.DataFrame
+    # projected outflows, as returned by PopulationSimulation.get_outflows()
+    outflows: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    def get_population_projections(self) -> pd.DataFrame:
+        return self.population_projections
+
+    def get_outflows(self, collapse_compartments: bool = False) -> pd.DataFrame:
+        """Return the projected outflows (transitions)"""
+        if collapse_compartments:
+            return self.collapse_outflows(self.outflows)
+        return self.outflows
+
+    @staticmethod
+    def collapse_outflows(outflows_df: pd.DataFrame) -> pd.DataFrame:
+        """Sum the outflows of every simulation group per compartment, outflow and time step"""
+        return (
+            outflows_df.reset_index()
+            .groupby(["compartment", "outflow_to", "time_step"])[["cohort_population"]]
+            .sum()
+        )
+
+    def get_data_for_compartment_time_step(
+        self, compartment: str, time_step: int
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        simulation_population = self.population_projections[
+            (self.population_projections.compartment == compartment)
+            & (self.population_projections.time_step == time_step)
+        ]
+        historical_population = self.population_data[
+            (self.population_data.compartment == compartment)
+            & (self.population_data.time_step == time_step)
+        ]
+
+        return simulation_population, historical_population
+
+    def gen_population_error(self) -> pd.DataFrame:
+        """Returns the error of the population projection."""
+        population_error = pd.DataFrame(
+            index=self.population_data.time_step.unique(),
+            columns=self.population_data.compartment.unique(),
+        )
+
+        min_projection_time_step = min(self.population_projections["time_step"])
+        for compartment in population_error.columns:
+            for time_step in population_error.index:
+                if time_step < min_projection_time_step:
+                    continue
+
+                (
+                    simulation_population,
+                    historical_population,
+                ) = self.get_data_for_compartment_time_step(compartment, time_step)
+                simulation_population = (
+                    simulation_population.compartment_population.sum()
+                )
+                historical_population = (
+                    historical_population.compartment_population.sum()
+                )
+
+                if simulation_population == 0:
+                    raise ValueError(
+                        f"Simulation population total for compartment {compartment} and time step {time_step} "
+                        "cannot be 0 for validation"
+                    )
+                if historical_population == 0:
+                    raise ValueError(
+                        f"Historical population data for compartment {compartment} and time step {time_step} "
+                        "cannot be 0 for validation"
+                    )
+
+                population_error.loc[time_step, compartment] = (
+                    simulation_population - historical_population
+                ) / historical_population
+
+        return population_error.sort_index()
+
+    def gen_full_error(self) -> pd.DataFrame:
+        """Compile error data from sub-simulations"""
+        min_projection_time_step = min(self.population_projections["time_step"])
+        population_error = pd.DataFrame(
+            index=pd.MultiIndex.from_product(
+                [
+                    self.population_data.compartment.unique(),
+                    range(
+                        min_projection_time_step,
+                        self.population_data.time_step.max() + 1,
+                    ),
+                ],
+                names=["compartment", "time_step"],
+            ),
+            columns=["simulation_population", "historical_population", "percent_error"],
+        )
+
+        for (compartment, time_step) in population_error.index:
+
+            (
+                simulation_population,
+                historical_population,
+            ) = self.get_data_for_compartment_time_step(compartment, time_step)
+            if simulation_population.empty:
+                simulation_population = None
+            else:
+                simulation_population = (
+                    simulation_population.compartment_population.sum()
+                )
+
+            if historical_population.empty:
+                historical_population = None
+            else:
+                historical_population = (
+                    historical_population.compartment_population.sum()
+                )
+
+            # Skip compartments that do not have any population data
+            if (simulation_population == 0) & (
+                (historical_population == 0) | (historical_population is None)
+            ):
+                continue
+
+            if simulation_population == 0:
+                raise ValueError(
+                    f"Simulation population total for compartment {compartment} and time step {time_step} "
+                    "cannot be 0 for validation"
+                )
+            if historical_population == 0:
+                raise ValueError(
+                    f"Historical population data for compartment {compartment} and time step {time_step} "
+                    "cannot be 0 for validation"
+                )
+
+            if simulation_population is not None and historical_population is not None:
+                population_error.loc[
+                    (compartment, time_step), "simulation_population"
+                ] = simulation_population
+                population_error.loc[
+                    (compartment, time_step), "historical_population"
+                ] = historical_population
+                population_error.loc[(compartment, time_step), "percent_error"] = (
+                    simulation_population - historical_population
+                ) / historical_population
+
+        return population_error.sort_index().dropna()
@@ -0,0 +1,284 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Content-addressed on-disk cache of warmed-up PopulationSimulation states shared across simulation runs"""
+import dataclasses
+import hashlib
+import json
+import os
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from cohort_table import CohortTable
+from spark_policy import SparkPolicy
+from super_simulation.initializer import SimulationInputData, UserInputs
+from utils.array_cache import ArrayCache
+
+DEFAULT_WARM_START_CACHE_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "spark_warm_starts"
+)
+DEFAULT_MAX_WARM_START_CACHE_SIZE_BYTES = 1024**3
+# changed whenever the simulation state or how it is stepped forward changes, so older entries are never restored
+WARM_START_CACHE_VERSION = 2
+# UserInputs that change the state of a simulation at the start time step
+WARM_UP_USER_INPUTS = (
+    "start_time_step",
+    "constant_admissions",
+    "cross_flow_function",
+    "arima_fit_backend",
+)
+# SimulationInputData that does not change the state of a simulation at the start time step
+OUTPUT_ONLY_DATA_INPUTS = ("excluded_population_data",)
+# name of the array holding the JSON structure of a snapshot, the other arrays are referenced from it by name
+SNAPSHOT_STRUCTURE_ARRAY = "snapshot_structure"
+
+
+class _UncacheableInputError(Exception):
+    """Raised for an input whose content cannot be hashed, like a lambda or a locally defined function"""
+
+
+class WarmStartCache(ArrayCache):
+    """
+    Store the snapshot of each PopulationSimulation warmed up to its start time step under the content hash of
+    everything the snapshot depends on, so building the same simulation again restores the snapshot instead of
+    stepping through the warm-up
+    """
+
+    def __init__(
+        self,
+        cache_directory: str = DEFAULT_WARM_START_CACHE_DIRECTORY,
+        max_size_bytes: int = DEFAULT_MAX_WARM_START_CACHE_SIZE_BYTES,
+    ) -> None:
+        super().__init__(cache_directory, max_size_bytes)
+
+    @classmethod
+    def get_cache_key(
+        cls,
+        user_inputs: UserInputs,
+        data_inputs: SimulationInputData,
+        policy_list: List[SparkPolicy],
+        first_relevant_time_step: int,
+        warm_up_end_time_step: int,
+    ) -> Optional[str]:
+        """
+        Return the content hash of the inputs that a simulation warmed up from `first_relevant_time_step` to
+            `warm_up_end_time_step` depends on: the data, the policies that apply before `warm_up_end_time_step`,
+            and the cross flow function. Returns None if an input cannot be hashed by content, in which case the
+            state should not be cached.
+        Functions are identified by their module and qualified name, so changing their code requires a new
+            WARM_START_CACHE_VERSION or clearing the cache.
+        """
+        warm_up_policies = [
+            (
+                policy.spark_compartment,
+                policy.simulation_group,
+                policy.policy_time_step,
+                policy.apply_retroactive,
+                policy.policy_fn,
+            )
+            for policy in policy_list
+            if policy.policy_time_step < warm_up_end_time_step
+        ]
+        try:
+            description = cls._describe(
+                (
+                    WARM_START_CACHE_VERSION,
+                    first_relevant_time_step,
+                    warm_up_end_time_step,
+                    {
+                        field: getattr(user_inputs, field)
+                        for field in WARM_UP_USER_INPUTS
+                    },
+                    {
+                        field.name: getattr(data_inputs, field.name)
+                        for field in dataclasses.fields(data_inputs)
+                        if field.name not in OUTPUT_ONLY_DATA_INPUTS
+                    },
+                    warm_up_policies,
+                )
+            )
+        except (_UncacheableInputError, TypeError):
+            return None
+        return hashlib.sha256(repr(description).encode()).hexdigest()
+
+    @classmethod
+    def _describe(cls, value: Any) -> Any:
+        """Return a description of `value` whose repr only depends on the content of `value`"""
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, (list, tuple)):
+            return [cls._describe(item) for item in value]
+        if isinstance(value, dict):
+            return sorted(
+                (repr(cls._describe(key)), cls._describe(item))
+                for key, item in value.items()
+            )
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            labels = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+            content_hash = hashlib.sha256(
+                pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes()
+            )
+            return (
+                type(value).__name__,
+                [cls._describe(label) for label in labels],
+                content_hash.hexdigest(),
+            )
+        if isinstance(value, partial):
+            return (
+                "partial",
+                cls._describe(value.func),
+                cls._describe(value.args),
+                cls._describe(value.keywords),
+            )
+        qualified_name = getattr(value, "__qualname__", None)
+        if callable(value) and qualified_name is not None and "<" not in qualified_name:
+            return ("function", value.__module__, qualified_name)
+        raise _UncacheableInputError(
+            f"Cannot hash {type(value).__name__} by content: {value}"
+        )
+
+    def get_snapshot(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the PopulationSimulation snapshot stored under `key`, or None if it is not cached"""
+        arrays = self.get(key)
+        if arrays is None or SNAPSHOT_STRUCTURE_ARRAY not in arrays:
+            return None
+        structure = json.loads(str(arrays.pop(SNAPSHOT_STRUCTURE_ARRAY)))
+        return self._rebuild_value(structure, arrays)
+
+    def put_snapshot(self, key: str, snapshot: Dict[str, Any]) -> None:
+        """Store a snapshot returned by PopulationSimulation.get_snapshot() under `key`"""
+        arrays: Dict[str, np.ndarray] = {}
+        structure = self._store_value(snapshot, arrays)
+        arrays[SNAPSHOT_STRUCTURE_ARRAY] = np.array(json.dumps(structure))
+        self.put(key, arrays)
+
+    @classmethod
+    def _store_value(cls, value: Any, arrays: Dict[str, np.ndarray]) -> Any:
+        """Move the arrays of a snapshot value into `arrays` and return the JSON structure to rebuild it from them"""
+        if isinstance(value, dict):
+            return {
+                "dict": [
+                    [cls._get_json_scalar(key), cls._store_value(item, arrays)]
+                    for key, item in value.items()
+                ]
+            }
+        if isinstance(value, CohortTable):
+            return {"cohort_table": cls._store_arrays(value.to_arrays(), arrays)}
+        if isinstance(value, pd.DataFrame):
+            return {
+                "data_frame": cls._store_arrays(
+                    {
+                        "values": value.to_numpy(dtype=np.float64),
+                        "index": cls._get_label_array(value.index),
+                        "columns": cls._get_label_array(value.columns),
+                    },
+                    arrays,
+                ),
+                "index_name": cls._get_json_scalar(value.index.name),
+                "columns_name": cls._get_json_scalar(value.columns.name),
+            }
+        if isinstance(value, pd.Series):
+            return {
+                "series": cls._store_arrays(
+                    {
+                        "values": value.to_numpy(dtype=np.float64),
+                        "index": cls._get_label_array(value.index),
+                    },
+                    arrays,
+                ),
+                "index_name": cls._get_json_scalar(value.index.name),
+                "name": cls._get_json_scalar(value.name),
+            }
+        return {"value": cls._get_json_scalar(value)}
+
+    @classmethod
+    def _rebuild_value(
+        cls, structure: Dict[str, Any], arrays: Dict[str, np.ndarray]
+    ) -> Any:
+        """Rebuild a snapshot value from the structure returned by `_store_value()`"""
+        if "dict" in structure:
+            return {
+                key: cls._rebuild_value(item, arrays) for key, item in structure["dict"]
+            }
+        if "cohort_table" in structure:
+            return CohortTable.from_arrays(
+                cls._load_arrays(structure["cohort_table"], arrays)
+            )
+        if "data_frame" in structure:
+            data_frame_arrays = cls._load_arrays(structure["data_frame"], arrays)
+            return pd.DataFrame(
+                data_frame_arrays["values"],
+                index=pd.Index(
+                    data_frame_arrays["index"], name=structure["index_name"]
+                ),
+                columns=pd.Index(
+                    data_frame_arrays["columns"], name=structure["columns_name"]
+                ),
+            )
+        if "series" in structure:
+            series_arrays = cls._load_arrays(structure["series"], arrays)
+            return pd.Series(
+                series_arrays["values"],
+                index=pd.Index(series_arrays["index"], name=structure["index_name"]),
+                name=structure["name"],
+                dtype=float,
+            )
+        return structure["value"]
+
+    @staticmethod
+    def _store_arrays(
+        named_arrays: Dict[str, np.ndarray], arrays: Dict[str, np.ndarray]
+    ) -> Dict[str, str]:
+        """Add `named_arrays` to `arrays` under unique names and return the names they were stored under"""
+        array_names = {}
+        for name, array in named_arrays.items():
+            array_names[name] = f"array_{len(arrays)}"
+            arrays[array_names[name]] = array
+        return array_names
+
+    @staticmethod
+    def _load_arrays(
+        array_names: Dict[str, str], arrays: Dict[str, np.ndarray]
+    ) -> Dict[str, np.ndarray]:
+        return {name: arrays[array_name] for name, array_name in array_names.items()}
+
+    @staticmethod
+    def _get_label_array(labels: pd.Index) -> np.ndarray:
+        """Return the index labels as an array that can be stored without pickling"""
+        label_array = labels.to_numpy()
+        if label_array.dtype == object:
+            # infer the type of object labels, like time steps added to the columns of an empty DataFrame
+            label_array = np.array(labels.tolist())
+        if label_array.dtype == object:
+            raise ValueError(
+                f"Cannot store mixed type labels in the warm start cache: {labels}"
+            )
+        return label_array
+
+    @staticmethod
+    def _get_json_scalar(value: Any) -> Any:
+        if isinstance(value, np.generic):
+            value = value.item()
+        if value is not None and not isinstance(value, (bool, int, float, str)):
+            raise ValueError(
+                f"Cannot store {type(value).__name__} in the warm start cache: {value}"
+            )
+        return value
@@ -15,16 +15,28 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # =============================================================================
 """admission calculating object for ShellCompartments"""
+import dataclasses
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum, auto
-from typing import Dict, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 from numpy.linalg.linalg import LinAlgError
+from scipy.signal import lfilter
 from statsmodels.tsa.arima.model import ARIMA, ARIMAResults
 
+from utils.arima_fit_cache import ArimaFitCache
+from utils.closed_form_arima import fit_ar1_with_drift, forecast_ar1_with_drift
+
 ORDER = (1, 1, 0)
+TREND = "t"
 MIN_NUM_DATA_POINTS = 4
+# Number of predictions stored with each fitted model, longer forecasts rebuild the model from its parameters
+CACHED_FORECAST_STEPS = 120
+# Seed for the noise added to a series when its ARIMA fit hits a singular matrix, so the refit is reproducible
+SINGULAR_MATRIX_JITTER_SEED = 0
 
 
 class PredictionDirectionType(Enum):
@@ -32,6 +44,299 @@ class PredictionDirectionType(Enum):
     BACKWARD = auto()
 
 
+class ArimaFitBackend(Enum):
+    # fit each model with statsmodels ARIMA
+    STATSMODELS = "statsmodels"
+    # fit all models at once with the vectorized estimator in utils.closed_form_arima
+    CLOSED_FORM = "closed_form"
+
+
+@dataclasses.dataclass(frozen=True)
+class ArimaFitJob:
+    """One ARIMA model to fit on a historical admissions series"""
+
+    # historical values in temporal order
+    series: Tuple[float, ...]
+    # FORWARD models forecast after the series, BACKWARD models backcast before it
+    direction: PredictionDirectionType
+
+    @classmethod
+    def from_values(
+        cls, values: np.ndarray, direction: PredictionDirectionType
+    ) -> "ArimaFitJob":
+        return cls(tuple(np.asarray(values, dtype=float).tolist()), direction)
+
+    def get_training_values(self) -> np.ndarray:
+        """Return the series in the order the model is trained on"""
+        values = np.array(self.series, dtype=float)
+        if self.direction == PredictionDirectionType.BACKWARD:
+            return values[::-1]
+        return values
+
+    def get_jittered_training_values(self) -> np.ndarray:
+        """Return the training values with the seeded noise used when the original series hits a singular matrix"""
+        values = self.get_training_values()
+        return values + np.random.default_rng(SINGULAR_MATRIX_JITTER_SEED).normal(
+            0, 0.001, len(values)
+        )
+
+    def get_cache_key(self, backend: ArimaFitBackend) -> str:
+        """Hash of everything the model fitted by `backend` depends on"""
+        key_hash = hashlib.sha256(
+            repr(
+                (
+                    ORDER,
+                    TREND,
+                    SINGULAR_MATRIX_JITTER_SEED,
+                    self.direction.name,
+                    backend.value,
+                )
+            ).encode()
+        )
+        key_hash.update(np.array(self.series, dtype=np.float64).tobytes())
+        return key_hash.hexdigest()
+
+
+@dataclasses.dataclass(eq=False)
+class ArimaFit:
+    """Fitted ARIMA model for an ArimaFitJob"""
+
+    job: ArimaFitJob
+    # fitted model parameters, enough to rebuild the ARIMAResults without refitting
+    params: np.ndarray
+    # True if the model was fit on a jittered series because the original series hit a singular matrix
+    singular_matrix: bool
+    # first CACHED_FORECAST_STEPS predictions of the model
+    forecast_path: np.ndarray
+
+    @classmethod
+    def from_model(
+        cls, job: ArimaFitJob, model: ARIMAResults, singular_matrix: bool
+    ) -> "ArimaFit":
+        return cls(
+            job,
+            np.asarray(model.params, dtype=float),
+            singular_matrix,
+            np.asarray(model.forecast(steps=CACHED_FORECAST_STEPS), dtype=float),
+        )
+
+    @classmethod
+    def from_arrays(cls, job: ArimaFitJob, arrays: Dict[str, np.ndarray]) -> "ArimaFit":
+        return cls(
+            job,
+            arrays["params"],
+            bool(arrays["singular_matrix"]),
+            arrays["forecast_path"],
+        )
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "params": self.params,
+            "singular_matrix": np.array(self.singular_matrix),
+            "forecast_path": self.forecast_path,
+        }
+
+    def get_model(self) -> ARIMAResults:
+        """Rebuild the fitted model from its parameters"""
+        values = (
+            self.job.get_jittered_training_values()
+            if self.singular_matrix
+            else self.job.get_training_values()
+        )
+        return ARIMA(values, order=ORDER, trend=TREND).filter(self.params)
+
+    def forecast(self, steps: int) -> np.ndarray:
+        """Return the next `steps` predictions of the model"""
+        if steps <= len(self.forecast_path):
+            return self.forecast_path[:steps].copy()
+        return np.asarray(self.get_model().forecast(steps=steps), dtype=float)
+
+    def sample_forecast_errors(
+        self, steps: int, num_replicates: int, rng: np.random.Generator
+    ) -> np.ndarray:
+        """
+        Return (replicate x steps) random deviations of the series from the next `steps` predictions, drawn from the
+            forecast distribution of the model. The innovations of the first differences follow the fitted AR(1)
+            coefficient and variance, which is the last two parameters of both fit backends.
+        """
+        ar, sigma2 = self.params[-2], self.params[-1]
+        innovations = rng.normal(
+            0.0, np.sqrt(max(sigma2, 0.0)), (num_replicates, steps)
+        )
+        difference_errors = lfilter([1.0], [1.0, -ar], innovations, axis=1)
+        return np.cumsum(difference_errors, axis=1)
+
+
+def fit_arima(job: ArimaFitJob) -> ArimaFit:
+    """Fit the ARIMA model for `job`, refit on a seeded jitter of the series if the fit hits a singular matrix"""
+    try:
+        model = ARIMA(job.get_training_values(), order=ORDER, trend=TREND).fit()
+        return ArimaFit.from_model(job, model, False)
+    except LinAlgError:
+        model = ARIMA(
+            job.get_jittered_training_values(), order=ORDER, trend=TREND
+        ).fit()
+        return ArimaFit.from_model(job, model, True)
+
+
+def fit_arima_closed_form(jobs: List[ArimaFitJob]) -> List[ArimaFit]:
+    """Fit the ARIMA models for all `jobs` at once, with one vectorized fit per series length"""
+    fits: Dict[ArimaFitJob, ArimaFit] = {}
+    jobs_by_length: Dict[int, List[ArimaFitJob]] = {}
+    for job in jobs:
+        jobs_by_length.setdefault(len(job.series), []).append(job)
+
+    for length_jobs in jobs_by_length.values():
+        values = np.array([job.get_training_values() for job in length_jobs])
+        differences = np.diff(values, axis=1)
+        drift, ar, sigma2 = fit_ar1_with_drift(differences)
+        forecast_paths = forecast_ar1_with_drift(
+            values[:, -1], differences[:, -1], drift, ar, CACHED_FORECAST_STEPS
+        )
+        # same parameter order as the statsmodels model: trend, ar.L1, sigma2
+        params = np.column_stack([drift, ar, sigma2])
+        for job_index, job in enumerate(length_jobs):
+            fits[job] = ArimaFit(
+                job, params[job_index], False, forecast_paths[job_index]
+            )
+
+    return [fits[job] for job in jobs]
+
+
+def check_closed_form_backend(
+    jobs: List[ArimaFitJob], steps: int = 12, rtol: float = 1e-3
+) -> None:
+    """
+    Throw if the closed form forecasts for `jobs` differ from the statsmodels forecasts by more than `rtol`,
+    relative to the mean absolute value of each series
+    """
+    closed_form_fits = fit_arima_closed_form(jobs)
+    for job, closed_form_fit in zip(jobs, closed_form_fits):
+        statsmodels_forecast = fit_arima(job).forecast(steps)
+        scale = max(1.0, float(np.abs(job.series).mean()))
+        deviation = (
+            np.abs(closed_form_fit.forecast(steps) - statsmodels_forecast).max() / scale
+        )
+        if deviation > rtol:
+            raise ValueError(
+                f"Closed form ARIMA forecast deviates from statsmodels by {deviation} (rtol {rtol}) for {job}"
+            )
+
+
+class ArimaFitScheduler:
+    """Collect the ARIMA fits of many PredictedAdmissions and run them together, optionally in a process pool"""
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        arima_fit_cache: Optional[ArimaFitCache] = None,
+        backend: ArimaFitBackend = ArimaFitBackend.STATSMODELS,
+        check_sample_size: Optional[int] = None,
+    ) -> None:
+        """
+        `num_workers` number of worker processes to fit the models in, fit in this process if None or 1
+        `arima_fit_cache` optional on-disk cache consulted before fitting and updated with every new fit
+        `backend` how the models are fit, CLOSED_FORM fits every new model in one batched call
+        `check_sample_size` if set, up to this many of the new models of every CLOSED_FORM batch are also fit with
+            statsmodels, throwing if their forecasts differ, see `check_closed_form_backend()`
+        """
+        if num_workers is not None and num_workers < 1:
+            raise ValueError(
+                f"ARIMA fit scheduler needs at least one worker: {num_workers}"
+            )
+        if check_sample_size is not None and check_sample_size < 1:
+            raise ValueError(
+                f"ARIMA fit check needs at least one sampled model: {check_sample_size}"
+            )
+        if check_sample_size is not None and backend != ArimaFitBackend.CLOSED_FORM:
+            raise ValueError(
+                f"Only the {ArimaFitBackend.CLOSED_FORM.value} ARIMA fit backend can be checked against "
+                f"statsmodels, not {backend.value}"
+            )
+        self.num_workers = num_workers
+        self.arima_fit_cache = arima_fit_cache
+        self.backend = backend
+        self.check_sample_size = check_sample_size
+        self.fits: Dict[ArimaFitJob, ArimaFit] = {}
+        self.pending_predictors: List["PredictedAdmissions"] = []
+
+    def add_predictor(self, predictor: "PredictedAdmissions") -> None:
+        """Defer fitting the models of `predictor` until fit_pending_predictors() is called"""
+        self.pending_predictors.append(predictor)
+
+    def fit_pending_predictors(self) -> None:
+        """
+        Fit the models of every pending predictor in two rounds: the models that fill in missing historical data,
+        then the models that predict admissions from the filled in data
+        """
+        predictors = self.pending_predictors
+        self.pending_predictors = []
+
+        self.fit_jobs(
+            job
+            for predictor in predictors
+            for job in predictor.get_missing_data_fit_jobs()
+        )
+        for predictor in predictors:
+            predictor.infer_missing_data()
+
+        self.fit_jobs(
+            job for predictor in predictors for job in predictor.get_training_fit_jobs()
+        )
+        for predictor in predictors:
+            predictor.train_arima_models()
+
+    def fit_jobs(self, jobs: Iterable[ArimaFitJob]) -> None:
+        """Fit every job that has not been fit yet, identical jobs are only fit once"""
+        new_jobs = [job for job in dict.fromkeys(jobs) if job not in self.fits]
+        if self.arima_fit_cache is not None:
+            uncached_jobs = []
+            for job in new_jobs:
+                cached_arrays = self.arima_fit_cache.get(
+                    job.get_cache_key(self.backend)
+                )
+                if cached_arrays is None:
+                    uncached_jobs.append(job)
+                else:
+                    self.fits[job] = ArimaFit.from_arrays(job, cached_arrays)
+            new_jobs = uncached_jobs
+
+        if self.backend == ArimaFitBackend.CLOSED_FORM:
+            if self.check_sample_size is not None and new_jobs:
+                # evenly spaced sample, so checks are reproducible across runs
+                sample_step = max(1, len(new_jobs) // self.check_sample_size)
+                check_closed_form_backend(
+                    new_jobs[::sample_step][: self.check_sample_size]
+                )
+            fits = fit_arima_closed_form(new_jobs)
+        elif self.num_workers is None or self.num_workers == 1 or len(new_jobs) <= 1:
+            fits = [fit_arima(job) for job in new_jobs]
+        else:
+            num_workers = min(self.num_workers, len(new_jobs))
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                fits = list(
+                    executor.map(
+                        fit_arima,
+                        new_jobs,
+                        chunksize=max(1, len(new_jobs) // (4 * num_workers)),
+                    )
+                )
+        self.fits.update(zip(new_jobs, fits))
+
+        if self.arima_fit_cache is not None and new_jobs:
+            for arima_fit in fits:
+                self.arima_fit_cache.put(
+                    arima_fit.job.get_cache_key(self.backend), arima_fit.to_arrays()
+                )
+            self.arima_fit_cache.evict()
+
+    def get_fit(self, job: ArimaFitJob) -> ArimaFit:
+        """Return the fitted model for `job`, fitting it now if it was not scheduled"""
+        if job not in self.fits:
+            self.fit_jobs([job])
+        return self.fits[job]
+
+
 class PredictedAdmissions:
     """Predict the new admissions based on the historical trend"""
 
@@ -39,6 +344,8 @@ class PredictedAdmissions:
         self,
         historical_data: pd.DataFrame,
         constant_admissions: bool,
+        arima_fit_scheduler: Optional[ArimaFitScheduler] = None,
+        prediction_horizon: Optional[Tuple[int, int]] = None,
     ):
         """
         historical_data is a DataFrame with columns for each time step and rows for each admission_to type (jail,
@@ -48,101 +355,199 @@ class PredictedAdmissions:
 
         The input data will not necessarily be sorted in temporal order, so that step is done here. Additionally, an
         ARIMA model will fail if all data is 0, so any rows with no data will be dropped as well.
-        """
-        historical_data, constant_admissions = self._infer_missing_data(
-            historical_data, constant_admissions
-        )
-        self.historical_data = historical_data
-        self.trained_model_dict: Dict[
-            Tuple[str, PredictionDirectionType], ARIMAResults
-        ] = {}
-        self.predictions_df = pd.DataFrame(
-            columns=["admission_to", "time_step"]
-        ).set_index(["admission_to", "time_step"])
 
-        # if historical data has more than specified number of years, train an ARIMA model
-        if (
-            len(self.historical_data.columns) >= MIN_NUM_DATA_POINTS
-            and not constant_admissions
-        ):
-            self._train_arima_models()
-            self.predict_constant_value = False
-        else:
-            self.predict_constant_value = True
+        `arima_fit_scheduler` if provided, the ARIMA models are fit when the scheduler fits its pending predictors
+        (or on the first prediction) so the fits can be batched with other predictors. Otherwise they are fit here.
 
+        `prediction_horizon` optional first and last time step to predict admissions for. The estimates for the whole
+        horizon are computed on first use and later lookups are array indexing.
+        """
         # add warnings attribute that prints at the end of shell_compartment initialization
         self.warnings: list = []
 
+        # Convert different forms of NA into "None" to make processing the missing values easier
+        historical_data.replace({np.nan: None}, inplace=True)
+        self.historical_data = historical_data.astype(float).sort_index(axis=1)
+        self.constant_admissions = constant_admissions
+        self.predict_constant_value = True
+        self.trained_model_dict: Dict[
+            Tuple[str, PredictionDirectionType], ArimaFit
+        ] = {}
+        self.prediction_horizon = prediction_horizon
+        # dense (time step x admission_to) estimates, actuals for the historical time steps and predictions otherwise
+        self.estimates = np.empty((0, len(self.historical_data)))
+        self.first_estimate_time_step = 0
+
+        self.is_fit = False
+        self.arima_fit_scheduler = (
+            arima_fit_scheduler
+            if arima_fit_scheduler is not None
+            else ArimaFitScheduler()
+        )
+        self.arima_fit_scheduler.add_predictor(self)
+        if arima_fit_scheduler is None:
+            self.arima_fit_scheduler.fit_pending_predictors()
+
     def get_time_step_estimate(self, time_step: int) -> Dict[str, float]:
         """
         Return the estimated admissions for the time_step provided as a dict of compartment -> predicted value.
 
-        If the time period is one for which we have actual data, return that. If it is for a year for which
-        predictions have already been made, take that prediction from the dataframe. Else, generate predictions
-        for the requested time period + an additional 10 steps.
+        If the time period is one for which we have actual data, return that. Otherwise return the prediction.
         """
-        default_steps_forward = 10
-        if time_step in self.historical_data.columns:
-            return self.historical_data[time_step].to_dict()
-
-        if (
-            time_step
-            in self.predictions_df.index.get_level_values("time_step").unique()
-        ):
-            return (
-                self.predictions_df.unstack(0).loc[time_step, "predictions"].to_dict()
+        return dict(
+            zip(
+                self.historical_data.index,
+                self.get_time_step_estimate_array(time_step).tolist(),
             )
+        )
+
+    def get_time_step_estimate_array(self, time_step: int) -> np.ndarray:
+        """
+        Return the read-only estimated admissions for the time_step provided, ordered like the historical_data rows.
 
-        last_time_step_to_process = int(
-            max(self.historical_data.columns.max(), time_step) + default_steps_forward
+        The estimates are materialized over the whole prediction horizon on first use. A time step outside of it
+        extends the estimates to that time step + an additional 10 steps.
+        """
+        self._fit_if_pending()
+        estimate_index = time_step - self.first_estimate_time_step
+        if not 0 <= estimate_index < len(self.estimates):
+            self._materialize_estimates(time_step)
+            estimate_index = time_step - self.first_estimate_time_step
+        return self.estimates[estimate_index]
+
+    def sample_time_step_estimates(
+        self,
+        first_time_step: int,
+        num_time_steps: int,
+        num_replicates: int,
+        rng: np.random.Generator,
+    ) -> np.ndarray:
+        """
+        Return (replicate x time step x admission_to) admissions for the `num_time_steps` time steps from
+            `first_time_step`. Time steps forecast past the historical data follow random paths drawn from the
+            forecast distribution of each ARIMA model, while the historical data, backcasts, and constant
+            admissions are the same in every replicate.
+        """
+        last_time_step = first_time_step + num_time_steps - 1
+        # materialize the estimates over both ends of the requested time steps
+        self.get_time_step_estimate_array(first_time_step)
+        self.get_time_step_estimate_array(last_time_step)
+        first_index = first_time_step - self.first_estimate_time_step
+        estimates = np.repeat(
+            self.estimates[np.newaxis, first_index : first_index + num_time_steps],
+            num_replicates,
+            axis=0,
         )
-        self._gen_predicted_data(time_step, last_time_step_to_process)
-        return self.predictions_df.unstack(0).loc[time_step, "predictions"].to_dict()
+
+        last_data_time_step = int(self.historical_data.columns.max())
+        num_forward_steps = last_time_step - last_data_time_step
+        if self.predict_constant_value or num_forward_steps <= 0:
+            return estimates
+
+        forward_time_steps = np.arange(last_data_time_step + 1, last_time_step + 1)
+        sampled_steps = forward_time_steps >= first_time_step
+        for admission_index, admission_compartment in enumerate(
+            self.historical_data.index
+        ):
+            arima_fit = self.trained_model_dict[
+                admission_compartment, PredictionDirectionType.FORWARD
+            ]
+            forecast_errors = arima_fit.sample_forecast_errors(
+                num_forward_steps, num_replicates, rng
+            )
+            forecast_paths = arima_fit.forecast(num_forward_steps) + forecast_errors
+            estimates[
+                :, forward_time_steps[sampled_steps] - first_time_step, admission_index
+            ] = forecast_paths[:, sampled_steps].clip(min=0)
+        return estimates
 
     def gen_arima_output_df(self) -> pd.DataFrame:
         """Return the prediction DataFrame"""
-        historical_data = pd.Series(
-            self.historical_data.stack(), name="actuals"
-        ).to_frame()
+        self._fit_if_pending()
+        if len(self.estimates) == 0:
+            self._materialize_estimates()
+
+        time_steps = self._get_estimate_time_steps()
+        is_historical = np.isin(time_steps, self.historical_data.columns)
+        historical_data = pd.DataFrame(
+            {"actuals": self.estimates[is_historical].T.ravel()},
+            index=pd.MultiIndex.from_product(
+                [self.historical_data.index, time_steps[is_historical]],
+                names=["admission_to", "time_step"],
+            ),
+        )
         full_arima_output = pd.concat(
             [self.predictions_df, historical_data]
         ).sort_index()
         return full_arima_output
 
-    @staticmethod
-    def _infer_missing_data(
-        historical_data: pd.DataFrame, constant_admissions: bool
-    ) -> Tuple[pd.DataFrame, bool]:
-        """Fill in historical data so all admission_to cover the same time steps of data"""
+    def _fit_if_pending(self) -> None:
+        """Fit the models of this predictor, and any others pending in the same scheduler, if not done yet"""
+        if not self.is_fit:
+            self.arima_fit_scheduler.fit_pending_predictors()
 
-        # Convert different forms of NA into "None" to make processing the missing values easier
-        historical_data.replace({np.nan: None}, inplace=True)
-        historical_data = historical_data.astype(float).sort_index(axis=1)
+    def _record_singular_matrix_warning(self, arima_fit: ArimaFit) -> None:
+        warn_text = "Singular matrix encountered fitting ARIMA model."
+        if arima_fit.singular_matrix and warn_text not in self.warnings:
+            self.warnings.append(warn_text)
 
+    @staticmethod
+    def _get_missing_time_steps(row: pd.Series) -> Tuple[pd.Index, pd.Index]:
+        """Return the time steps missing before and after the historical data of one admission_to row"""
+        missing_data = row.index[row.isnull()]
+        missing_data_backward = missing_data[missing_data < row.dropna().index.min()]
+        missing_data_forward = missing_data[missing_data > row.dropna().index.max()]
+        return missing_data_backward, missing_data_forward
+
+    def get_missing_data_fit_jobs(self) -> List[ArimaFitJob]:
+        """Return the ARIMA fits infer_missing_data() needs to backcast and forecast the missing historical data"""
+        fit_jobs = []
+        for _, row in self.historical_data.iterrows():
+            if len(row.dropna()) < MIN_NUM_DATA_POINTS:
+                continue
+            missing_data_backward, missing_data_forward = self._get_missing_time_steps(
+                row
+            )
+            if not missing_data_backward.empty:
+                fit_jobs.append(
+                    ArimaFitJob.from_values(
+                        row.dropna().values, PredictionDirectionType.BACKWARD
+                    )
+                )
+            if not missing_data_forward.empty:
+                fit_jobs.append(
+                    ArimaFitJob.from_values(
+                        row.dropna().values, PredictionDirectionType.FORWARD
+                    )
+                )
+        return fit_jobs
+
+    def infer_missing_data(self) -> None:
+        """Fill in historical data so all admission_to cover the same time steps of data"""
+        historical_data = self.historical_data
         for admission, row in historical_data.iterrows():
-            missing_data = historical_data.columns[row.isnull()]
+            missing_data_backward, missing_data_forward = self._get_missing_time_steps(
+                row
+            )
 
             min_data_time_step = row.dropna().index.min()
             max_data_time_step = row.dropna().index.max()
 
-            missing_data_backward = missing_data[missing_data < min_data_time_step]
-            missing_data_forward = missing_data[missing_data > max_data_time_step]
-
             if not missing_data_backward.empty:
                 if len(row.dropna()) < MIN_NUM_DATA_POINTS:
-                    constant_admissions = True
+                    self.constant_admissions = True
                     historical_data.loc[
                         admission, missing_data_backward
                     ] = historical_data.loc[admission, min_data_time_step]
                 else:
-                    model_backcast = (
-                        ARIMA(
-                            row.iloc[::-1].dropna().values.astype(float),
-                            order=ORDER,
-                            trend="t",
+                    backcast_fit = self.arima_fit_scheduler.get_fit(
+                        ArimaFitJob.from_values(
+                            row.dropna().values, PredictionDirectionType.BACKWARD
                         )
-                        .fit()
-                        .forecast(steps=len(missing_data_backward))
+                    )
+                    self._record_singular_matrix_warning(backcast_fit)
+                    model_backcast = backcast_fit.forecast(
+                        steps=len(missing_data_backward)
                     )
 
                     # flip the predictions back around so they're ordered correctly for the historical data indexing
@@ -152,191 +557,174 @@ class PredictedAdmissions:
 
             if not missing_data_forward.empty:
                 if len(row.dropna()) < MIN_NUM_DATA_POINTS:
-                    constant_admissions = True
+                    self.constant_admissions = True
                     historical_data.loc[
                         admission, missing_data_forward
                     ] = historical_data.loc[admission, max_data_time_step]
                 else:
-                    model_forecast = (
-                        ARIMA(row.dropna().values.astype(float), order=ORDER, trend="t")
-                        .fit()
-                        .forecast(steps=len(missing_data_forward))
+                    forecast_fit = self.arima_fit_scheduler.get_fit(
+                        ArimaFitJob.from_values(
+                            row.dropna().values, PredictionDirectionType.FORWARD
+                        )
+                    )
+                    self._record_singular_matrix_warning(forecast_fit)
+                    model_forecast = forecast_fit.forecast(
+                        steps=len(missing_data_forward)
                     )
 
                     historical_data.loc[
                         admission, missing_data_forward
                     ] = model_forecast
-        return historical_data, constant_admissions
 
-    def _train_arima_models(self) -> None:
+    def _should_train_arima_models(self) -> bool:
+        """Train ARIMA models if historical data has more than specified number of time steps"""
+        return (
+            len(self.historical_data.columns) >= MIN_NUM_DATA_POINTS
+            and not self.constant_admissions
+        )
+
+    def get_training_fit_jobs(self) -> List[ArimaFitJob]:
+        """Return the ARIMA fits train_arima_models() needs, only valid after infer_missing_data()"""
+        if not self._should_train_arima_models():
+            return []
+        return [
+            ArimaFitJob.from_values(row.values, direction)
+            for _, row in self.historical_data.iterrows()
+            for direction in PredictionDirectionType
+        ]
+
+    def train_arima_models(self) -> None:
         """
         Create a dictionary to store the forecasted and backcasted trained ARIMA model objects
         A dictionary is created for each admission type with both a forecasting model and a backcasting model
         """
-        trained_model_dict = {}
-        for admission_compartment, row in self.historical_data.iterrows():
-            model_forecast = ARIMA(row.values, order=ORDER, trend="t")
-            model_backcast = ARIMA(row.iloc[::-1].values, order=ORDER, trend="t")
-            try:
-                trained_model_dict[
-                    (admission_compartment, PredictionDirectionType.FORWARD)
-                ] = model_forecast.fit()
-                trained_model_dict[
-                    (admission_compartment, PredictionDirectionType.BACKWARD)
-                ] = model_backcast.fit()
-
-            except LinAlgError:
-                # Add warnings
-                warn_text = "Singular matrix encountered fitting ARIMA model."
-                if warn_text not in self.warnings:
-                    self.warnings.append(warn_text)
-
-                # adjust forecast and backcast
-                model_forecast = ARIMA(
-                    row.values + np.random.normal(0, 0.001, len(row.values)),
-                    order=ORDER,
-                    trend="t",
-                )
-                model_backcast = ARIMA(
-                    row.iloc[::-1].values + np.random.normal(0, 0.001, len(row.values)),
-                    order=ORDER,
-                    trend="t",
-                )
-                trained_model_dict[
-                    (admission_compartment, PredictionDirectionType.FORWARD)
-                ] = model_forecast.fit()
-                trained_model_dict[
-                    (admission_compartment, PredictionDirectionType.BACKWARD)
-                ] = model_backcast.fit()
+        self.predict_constant_value = not self._should_train_arima_models()
+        if not self.predict_constant_value:
+            trained_model_dict = {}
+            for admission_compartment, row in self.historical_data.iterrows():
+                for direction in PredictionDirectionType:
+                    arima_fit = self.arima_fit_scheduler.get_fit(
+                        ArimaFitJob.from_values(row.values, direction)
+                    )
+                    self._record_singular_matrix_warning(arima_fit)
+                    trained_model_dict[(admission_compartment, direction)] = arima_fit
 
-        self.trained_model_dict = trained_model_dict
+            self.trained_model_dict = trained_model_dict
+        self.is_fit = True
 
-    def _gen_predicted_data(self, start_period: int, end_period: int) -> None:
-        """Generate the predictions between the start and end periods"""
+    def _materialize_estimates(self, time_step: Optional[int] = None) -> None:
+        """
+        Fill the dense (time step x admission_to) estimates over the prediction horizon, the historical data,
+        any time steps already materialized, and `time_step` + an additional 10 steps if it is outside the data
+        """
+        default_steps_forward = 10
+        first_data_time_step = int(self.historical_data.columns.min())
+        last_data_time_step = int(self.historical_data.columns.max())
+
+        first_time_step = first_data_time_step
+        last_time_step = last_data_time_step
+        if self.prediction_horizon is not None:
+            first_time_step = min(first_time_step, self.prediction_horizon[0])
+            last_time_step = max(last_time_step, self.prediction_horizon[1])
+        if len(self.estimates) > 0:
+            first_time_step = min(first_time_step, self.first_estimate_time_step)
+            last_time_step = max(
+                last_time_step, self.first_estimate_time_step + len(self.estimates) - 1
+            )
+        if time_step is not None and time_step not in self.historical_data.columns:
+            first_time_step = min(first_time_step, time_step)
+            last_time_step = max(
+                last_time_step,
+                max(last_data_time_step, time_step) + default_steps_forward,
+            )
 
-        # calculate the range of time steps to forecast forward and backward
-        pred_periods_forward = range(
-            int(self.historical_data.columns.max()) + 1, int(end_period) + 1
+        num_backward_steps = first_data_time_step - first_time_step
+        num_forward_steps = last_time_step - last_data_time_step
+        estimates = np.full(
+            (last_time_step - first_time_step + 1, len(self.historical_data)), np.nan
         )
-        pred_periods_backward = range(
-            int(start_period), int(self.historical_data.columns.min())
-        )[::-1]
+        estimates[
+            self.historical_data.columns.values.astype(int) - first_time_step
+        ] = self.historical_data.values.T
 
-        predictions_df = pd.DataFrame()
-
-        for admission_compartment, row in self.historical_data.iterrows():
+        for admission_index, (admission_compartment, row) in enumerate(
+            self.historical_data.iterrows()
+        ):
             # If not specified to use the constant rate assumption...
             if not self.predict_constant_value:
-                # Create dataframes to store forecasted and backcasted model outputs
-                predictions_df_sub = pd.DataFrame()
-                if len(pred_periods_backward) > 0:
-                    backward_df = self._get_arima_predictions_df(
-                        admission_compartment=admission_compartment,
-                        cast_type=PredictionDirectionType.BACKWARD,
-                        prediction_indexes=pred_periods_backward,
-                    )
-                    predictions_df_sub = pd.concat([predictions_df_sub, backward_df])
-
-                if len(pred_periods_forward) > 0:
-                    forward_df = self._get_arima_predictions_df(
-                        admission_compartment=admission_compartment,
-                        cast_type=PredictionDirectionType.FORWARD,
-                        prediction_indexes=pred_periods_forward,
-                    )
-                    predictions_df_sub = pd.concat([predictions_df_sub, forward_df])
-
-                # Combine forecast and backcast data
-                predictions_df_sub = predictions_df_sub.sort_index().loc[
-                    start_period:end_period
-                ]
+                backward_predictions = (
+                    self.trained_model_dict[
+                        admission_compartment, PredictionDirectionType.BACKWARD
+                    ].forecast(num_backward_steps)[::-1]
+                    if num_backward_steps > 0
+                    else np.empty(0)
+                )
+                forward_predictions = (
+                    self.trained_model_dict[
+                        admission_compartment, PredictionDirectionType.FORWARD
+                    ].forecast(num_forward_steps)
+                    if num_forward_steps > 0
+                    else np.empty(0)
+                )
 
             # If using the constant rate assumption, just take the average of the last 12 values
             # TODO(#10033): update constant admissions logic to be more accurate
             else:
-                predictions_df_sub = pd.DataFrame(
-                    index=range(start_period, end_period + 1),
-                    columns=["predictions"],
-                )
-                predictions_df_sub.sort_index(inplace=True)
                 # Take the average of all rows if there are less than 12
                 number_of_rows = min(len(row), 12)
-                avg_forward_value = np.mean(row.iloc[:number_of_rows])
-                predictions_df_sub.loc[
-                    predictions_df_sub.index < int(self.historical_data.columns.min()),
-                    "predictions",
-                ] = avg_forward_value
-                avg_backwards_value = np.mean(row.iloc[-number_of_rows:])
-                predictions_df_sub.loc[
-                    predictions_df_sub.index > int(self.historical_data.columns.max()),
-                    "predictions",
-                ] = avg_backwards_value
-                predictions_df_sub = predictions_df_sub[
-                    ~predictions_df_sub.index.isin(self.historical_data.columns)
-                ]
-
-            # Label the dataframe indices
-            predictions_df_sub.index.name = "time_step"
-            predictions_df_sub = pd.concat(
-                {admission_compartment: predictions_df_sub}, names=["admission_to"]
-            )
+                backward_predictions = np.full(
+                    num_backward_steps, np.mean(row.iloc[:number_of_rows])
+                )
+                forward_predictions = np.full(
+                    num_forward_steps, np.mean(row.iloc[-number_of_rows:])
+                )
 
             # Throw warning if the lower bound has been hit
             warn_text = "Warning: lower bound hit when predicting admissions."
-            if any(predictions_df_sub.predictions < 0) and (
-                warn_text not in self.warnings
-            ):
+            if (
+                any(backward_predictions < 0) or any(forward_predictions < 0)
+            ) and warn_text not in self.warnings:
                 self.warnings.append(warn_text)
-            # Clip negative values at 0
-            predictions_df_sub["predictions"] = predictions_df_sub["predictions"].clip(
-                lower=0
-            )
 
-            # append df_sub to df
-            max_allowable_pred = predictions_df_sub["predictions"].max()
-            predictions_df_sub["predictions"] = predictions_df_sub["predictions"].clip(
-                0, max_allowable_pred
+            # Clip negative values at 0
+            estimates[:num_backward_steps, admission_index] = backward_predictions.clip(
+                min=0
             )
+            estimates[
+                len(estimates) - num_forward_steps :, admission_index
+            ] = forward_predictions.clip(min=0)
+
+        estimates.flags.writeable = False
+        self.estimates = estimates
+        self.first_estimate_time_step = first_time_step
+
+    def _get_estimate_time_steps(self) -> np.ndarray:
+        return np.arange(
+            self.first_estimate_time_step,
+            self.first_estimate_time_step + len(self.estimates),
+        )
 
-            predictions_df = pd.concat([predictions_df, predictions_df_sub])
-
-        # If predictions are made more than once on an overlapping set of periods we will get duplicates. Drop those.
-        predictions_df = pd.concat([predictions_df, self.predictions_df])
-        predictions_df = predictions_df[
-            ~predictions_df.index.duplicated(keep="first")
-        ].sort_index()
-
-        # Store the predictions
-        self.predictions_df = predictions_df
-
-    def _get_arima_predictions_df(
-        self,
-        admission_compartment: str,
-        cast_type: PredictionDirectionType,
-        prediction_indexes: range,
-    ) -> pd.DataFrame:
-        """Helper function to generate the ARIMA forecast DataFrame for the provided prediction period
-
-        Args:
-            admission_compartment: The compartment to generate the predicted admissions for
-            cast_type: the type of forecast to use (forecast or backcast) from within the trained model
-            prediction_indexes: the index labels for the generated prediction DataFrame
-
-        Returns:
-            pd.DataFrame with columns for the prediction, high/low conf interval, and standard error
-        """
-        admission_model = self.trained_model_dict[admission_compartment, cast_type]
-        predictions_array = admission_model.forecast(steps=len(prediction_indexes))
-        prediction_data = {
-            "predictions": predictions_array,
-        }
-        predictions_df = pd.DataFrame(index=prediction_indexes, data=prediction_data)
-        return predictions_df
+    @property
+    def predictions_df(self) -> pd.DataFrame:
+        """The materialized predictions outside of the historical data, indexed by admission_to and time_step"""
+        time_steps = self._get_estimate_time_steps()
+        is_predicted = ~np.isin(time_steps, self.historical_data.columns)
+        return pd.DataFrame(
+            {"predictions": self.estimates[is_predicted].T.ravel()},
+            index=pd.MultiIndex.from_product(
+                [self.historical_data.index, time_steps[is_predicted]],
+                names=["admission_to", "time_step"],
+            ),
+        )
 
     def __eq__(self, other: object) -> bool:
         """Check if two PredictedAdmissions are equal (does not require projection_df to be equal)"""
         if not isinstance(other, PredictedAdmissions):
             return False
 
+        self._fit_if_pending()
+        other._fit_if_pending()
+
         try:
             if (self.historical_data != other.historical_data).any().any():
                 return False
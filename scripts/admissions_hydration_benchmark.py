@@ -0,0 +1,130 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""
+Benchmark Initializer.fully_hydrate_admissions() on synthetic sparse microsim admissions.
+Run from the repository root with `python -m scripts.admissions_hydration_benchmark`
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from super_simulation.initializer import Initializer
+
+
+def generate_admissions_data(
+    num_simulation_groups: int,
+    num_time_steps: int,
+    num_run_dates: int,
+    density: float,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Return monthly admissions for every group and run date with only `density` of the time steps recorded"""
+    rng = np.random.default_rng(seed)
+    run_dates = pd.date_range("2018-01-01", periods=num_run_dates, freq="MS")
+    grid = pd.MultiIndex.from_product(
+        [
+            [f"group_{i}" for i in range(num_simulation_groups)],
+            ["PRETRIAL", "PAROLE"],
+            ["INCARCERATION - GENERAL", "SUPERVISION - PROBATION"],
+            run_dates,
+            np.arange(-num_time_steps, 0),
+        ],
+        names=[
+            "simulation_group",
+            "compartment",
+            "admission_to",
+            "run_date",
+            "time_step",
+        ],
+    ).to_frame(index=False)
+    admissions_data = grid[rng.random(len(grid)) < density].reset_index(drop=True)
+    admissions_data["cohort_population"] = rng.gamma(2.0, 5.0, len(admissions_data))
+    return admissions_data
+
+
+def reference_fully_hydrate_admissions(admissions_data: pd.DataFrame) -> pd.DataFrame:
+    """The row-wise explode and merge hydration the vectorized implementation replaced, for comparison"""
+    fully_hydrated_columns = [
+        "simulation_group",
+        "compartment",
+        "admission_to",
+        "run_date",
+    ]
+    time_range_per_compartment = admissions_data.groupby(
+        fully_hydrated_columns, as_index=False
+    )["time_step"].agg(["min", "max"])
+    time_range_per_compartment["time_step"] = time_range_per_compartment.apply(
+        lambda row: range(row["min"], row["max"] + 1), axis=1
+    )
+    time_range_per_compartment = time_range_per_compartment.explode("time_step")[
+        ["time_step"]
+    ].astype(int)
+    fully_hydrated_data = time_range_per_compartment.merge(
+        admissions_data[fully_hydrated_columns + ["time_step", "cohort_population"]],
+        on=["time_step"] + fully_hydrated_columns,
+        how="left",
+    )
+    fully_hydrated_data.fillna(0, inplace=True)
+    return fully_hydrated_data[
+        ["time_step"] + fully_hydrated_columns + ["cohort_population"]
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--simulation_groups", type=int, default=100)
+    parser.add_argument("--time_steps", type=int, default=120)
+    parser.add_argument("--run_dates", type=int, default=48)
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument(
+        "--skip_reference",
+        action="store_true",
+        help="only time the vectorized implementation",
+    )
+    args = parser.parse_args()
+
+    admissions_data = generate_admissions_data(
+        args.simulation_groups, args.time_steps, args.run_dates, args.density
+    )
+    print(f"admissions rows: {len(admissions_data)}")
+
+    start = time.perf_counter()
+    fully_hydrated_data = Initializer.fully_hydrate_admissions(admissions_data, True)
+    vectorized_time = time.perf_counter() - start
+    print(
+        f"fully_hydrate_admissions: {vectorized_time:.2f}s, "
+        f"{len(fully_hydrated_data)} hydrated rows"
+    )
+
+    if not args.skip_reference:
+        start = time.perf_counter()
+        reference_data = reference_fully_hydrate_admissions(admissions_data)
+        reference_time = time.perf_counter() - start
+        pd.testing.assert_frame_equal(
+            fully_hydrated_data.reset_index(drop=True),
+            reference_data.reset_index(drop=True),
+        )
+        print(
+            f"reference: {reference_time:.2f}s, "
+            f"speedup {reference_time / vectorized_time:.1f}x, outputs match"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""
+Check the steady state extrapolation of a baseline projection against the same projection stepped through every
+time step. Run from the repository root with `python -m scripts.check_steady_state <model yaml>`
+"""
+import argparse
+import dataclasses
+import sys
+
+from super_simulation.super_simulation_factory import SuperSimulationFactory
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("yaml_file_path")
+    parser.add_argument(
+        "--steady_state_tolerance",
+        type=float,
+        help="defaults to the steady_state_tolerance of the model yaml",
+    )
+    parser.add_argument(
+        "--max_relative_error",
+        type=float,
+        default=0.01,
+        help="largest relative difference of any compartment population that passes the check",
+    )
+    args = parser.parse_args()
+
+    super_simulation = SuperSimulationFactory.build_super_simulation(
+        args.yaml_file_path
+    )
+    user_inputs = super_simulation.initializer.get_user_inputs()
+    data_inputs = super_simulation.initializer.get_data_inputs()
+    first_relevant_time_step = (
+        super_simulation.initializer.get_first_relevant_time_step()
+    )
+    steady_state_tolerance = (
+        args.steady_state_tolerance or user_inputs.steady_state_tolerance
+    )
+    if steady_state_tolerance is None:
+        raise ValueError(
+            "Set steady_state_tolerance in the model yaml or pass --steady_state_tolerance"
+        )
+
+    projections = {}
+    steady_state_time_step = None
+    for tolerance in [None, steady_state_tolerance]:
+        super_simulation.simulator.simulate_baseline(
+            dataclasses.replace(user_inputs, steady_state_tolerance=tolerance),
+            data_inputs,
+            [],
+            first_relevant_time_step,
+        )
+        baseline_simulation = super_simulation.simulator.pop_simulations[
+            "baseline_projections"
+        ]
+        projections[tolerance] = baseline_simulation.get_population_projections()
+        steady_state_time_step = baseline_simulation.steady_state_time_step
+
+    if steady_state_time_step is None:
+        print(f"no steady state reached with tolerance {steady_state_tolerance}")
+        return 0
+
+    merged_projections = projections[None].merge(
+        projections[steady_state_tolerance],
+        on=["simulation_group", "compartment", "time_step"],
+        suffixes=("_stepped", "_extrapolated"),
+    )
+    merged_projections["relative_error"] = (
+        merged_projections.compartment_population_extrapolated
+        - merged_projections.compartment_population_stepped
+    ).abs() / merged_projections.compartment_population_stepped.abs().clip(lower=1)
+    compartment_errors = merged_projections.groupby("compartment").relative_error.max()
+    print(
+        f"extrapolated from time step {steady_state_time_step}, "
+        f"max relative error per compartment:\n{compartment_errors.to_string()}"
+    )
+    return int(compartment_errors.max() > args.max_relative_error)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,9 +18,10 @@
 
 from typing import Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 
-from predicted_admissions import PredictedAdmissions
+from predicted_admissions import ArimaFitScheduler, PredictedAdmissions
 from spark_compartment import SparkCompartment
 from spark_policy import SparkPolicy
 from utils.transitions_utils import MIN_POSSIBLE_POLICY_TIME_STEP
@@ -29,6 +30,10 @@ from utils.transitions_utils import MIN_POSSIBLE_POLICY_TIME_STEP
 class ShellCompartment(SparkCompartment):
     """Simple Spark Compartment that only sends groups to other compartments and does not ingest cohorts"""
 
+    # the admissions predictors are fit once from the policy list and are not changed by stepping forward, so they
+    # are left out of snapshots and a restored compartment keeps the predictors of its own scenario
+    SNAPSHOT_ATTRIBUTES = SparkCompartment.SNAPSHOT_ATTRIBUTES
+
     def __init__(
         self,
         outflows_data: pd.DataFrame,
@@ -36,7 +41,17 @@ class ShellCompartment(SparkCompartment):
         tag: str,
         policy_list: List[SparkPolicy],
         constant_admissions: bool,
+        arima_fit_scheduler: Optional[ArimaFitScheduler] = None,
+        max_time_steps: Optional[int] = None,
+        admissions_source: Optional["ShellCompartment"] = None,
     ) -> None:
+        """
+        `arima_fit_scheduler` optional scheduler to batch the admissions ARIMA fits with other compartments
+        `max_time_steps` the number of time steps the compartment is expected to be simulated for, used to
+            precompute the predicted admissions over the whole projection
+        `admissions_source` optional ShellCompartment of another simulation with the same admissions data and
+            policies, whose fitted admissions predictors are shared instead of fit again
+        """
 
         super().__init__(outflows_data, starting_time_step, tag)
 
@@ -46,9 +61,25 @@ class ShellCompartment(SparkCompartment):
 
         self.policy_data: Dict[int, pd.DataFrame] = {}
 
-        self._initialize_admissions_predictors(constant_admissions)
+        self.prediction_horizon = (
+            (starting_time_step, starting_time_step + max_time_steps)
+            if max_time_steps is not None
+            else None
+        )
 
-    def _initialize_admissions_predictors(self, constant_admissions: bool) -> None:
+        if admissions_source is not None:
+            self.policy_data = admissions_source.policy_data
+            self.admissions_predictors = admissions_source.admissions_predictors
+        else:
+            self._initialize_admissions_predictors(
+                constant_admissions, arima_fit_scheduler
+            )
+
+    def _initialize_admissions_predictors(
+        self,
+        constant_admissions: bool,
+        arima_fit_scheduler: Optional[ArimaFitScheduler],
+    ) -> None:
         """Generate the dictionary of one admission predictor per policy time step that defines admissions behaviors"""
         policy_time_steps = list(
             {policy.policy_time_step for policy in self.policy_list}
@@ -88,7 +119,10 @@ class ShellCompartment(SparkCompartment):
         # second pass creates admissions predictors from transformed outflows data
         for time_step, time_step_data in self.policy_data.items():
             self.admissions_predictors[time_step] = PredictedAdmissions(
-                time_step_data, constant_admissions
+                time_step_data,
+                constant_admissions,
+                arima_fit_scheduler,
+                self.prediction_horizon,
             )
 
     def initialize_edges(self, edges: List[SparkCompartment]) -> None:
@@ -109,16 +143,80 @@ class ShellCompartment(SparkCompartment):
         if self.tag in influx:
             raise ValueError(f"Shell compartment {self.tag} cannot ingest cohorts")
 
+    def get_time_step_admissions(self, time_step: int) -> Dict[str, float]:
+        """Return the predicted admissions per admission_to compartment for `time_step`"""
+        policy_time_steps = [ts for ts in self.policy_data if ts <= time_step]
+        policy_time_steps.sort()
+        return self.admissions_predictors[policy_time_steps[-1]].get_time_step_estimate(
+            time_step
+        )
+
+    def get_stationary_time_step(self) -> int:
+        """The predicted admissions can change after the latest policy, see `get_constant_admissions_time_step()`"""
+        return max(self.policy_data)
+
+    def get_constant_admissions_time_step(
+        self, first_time_step: int, end_time_step: int, tolerance: float
+    ) -> int:
+        """
+        Return the first time step from `first_time_step` on whose predicted admissions, and those of every later
+            time step before `end_time_step`, are within the relative `tolerance` of the admissions of the last time
+            step before `end_time_step`
+        """
+        final_admissions = self.get_time_step_admissions(end_time_step - 1)
+        time_step = end_time_step - 1
+        while time_step > first_time_step:
+            admissions = self.get_time_step_admissions(time_step - 1)
+            if set(admissions) != set(final_admissions) or any(
+                abs(admissions[admission_to] - final_admission)
+                > tolerance * abs(final_admission)
+                for admission_to, final_admission in final_admissions.items()
+            ):
+                break
+            time_step -= 1
+        return time_step
+
+    def sample_time_step_admissions(
+        self,
+        first_time_step: int,
+        num_time_steps: int,
+        num_replicates: int,
+        rng: np.random.Generator,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Return (replicate x time step) admissions per admission_to compartment for the `num_time_steps` time steps
+            from `first_time_step`, drawn from the forecast distributions of the admissions predictors as described
+            in PredictedAdmissions.sample_time_step_estimates()
+        """
+        time_steps = np.arange(first_time_step, first_time_step + num_time_steps)
+        policy_time_steps = sorted(self.policy_data)
+        # the predictor of each time step is the one of the latest policy time step that has passed
+        predictor_indices = np.searchsorted(policy_time_steps, time_steps, side="right")
+
+        sampled_admissions: Dict[str, np.ndarray] = {}
+        for predictor_index, policy_time_step in enumerate(policy_time_steps, start=1):
+            predictor_time_steps = predictor_indices == predictor_index
+            if not predictor_time_steps.any():
+                continue
+            predictor = self.admissions_predictors[policy_time_step]
+            predictor_admissions = predictor.sample_time_step_estimates(
+                first_time_step, num_time_steps, num_replicates, rng
+            )
+            for admission_index, admission_to in enumerate(
+                predictor.historical_data.index
+            ):
+                admissions = sampled_admissions.setdefault(
+                    admission_to, np.zeros((num_replicates, num_time_steps))
+                )
+                admissions[:, predictor_time_steps] = predictor_admissions[
+                    :, predictor_time_steps, admission_index
+                ]
+        return sampled_admissions
+
     def step_forward(self) -> None:
         """Simulate one time step in the projection"""
         super().step_forward()
-        policy_time_steps = [
-            ts for ts in self.policy_data if ts <= self.current_time_step
-        ]
-        policy_time_steps.sort()
-        outflow_dict = self.admissions_predictors[
-            policy_time_steps[-1]
-        ].get_time_step_estimate(self.current_time_step)
+        outflow_dict = self.get_time_step_admissions(self.current_time_step)
 
         # Store the outflows
         self.outflows.loc[:, self.current_time_step] = outflow_dict
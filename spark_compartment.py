@@ -18,14 +18,43 @@
 
 from abc import ABC, abstractmethod
 from copy import deepcopy
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 
 
+def extrapolate_trend(history: np.ndarray, num_time_steps: int) -> np.ndarray:
+    """
+    Extrapolate each row of `history`, values per time step ending with the latest, for `num_time_steps` time steps.
+    The latest change continues, shrinking every time step by the ratio of the latest two changes, so values that
+    converge geometrically approach their limit and values that change by a constant amount keep doing so.
+    """
+    extrapolated = np.repeat(history[:, -1:], num_time_steps, axis=1)
+    if history.shape[1] < 2:
+        return extrapolated
+    latest_change = history[:, -1] - history[:, -2]
+    change_ratio = np.ones(len(history))
+    if history.shape[1] > 2:
+        previous_change = history[:, -2] - history[:, -3]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change_ratio = np.where(
+                previous_change != 0, latest_change / previous_change, 1
+            )
+        # hold oscillating values and continue diverging values at their latest change
+        change_ratio = np.clip(change_ratio, 0, 1)
+    cumulative_change_ratios = np.cumsum(
+        change_ratio[:, np.newaxis] ** np.arange(1, num_time_steps + 1), axis=1
+    )
+    return extrapolated + latest_change[:, np.newaxis] * cumulative_change_ratios
+
+
 class SparkCompartment(ABC):
     """Encapsulate all the logic for one compartment within the simulation"""
 
+    # attributes that change while the compartment is stepped forward, captured by `get_snapshot()`
+    SNAPSHOT_ATTRIBUTES: Tuple[str, ...] = ("current_time_step", "outflows", "error")
+
     def __init__(
         self, outflows_data: pd.DataFrame, starting_time_step: int, tag: str
     ) -> None:
@@ -73,6 +102,52 @@ class SparkCompartment(ABC):
         # increase the `current_time_step` by 1 to simulate the population at the beginning of the next time_step
         self.current_time_step += 1
 
+    @abstractmethod
+    def get_stationary_time_step(self) -> int:
+        """
+        Return the first time step from which the compartment is stepped the same way every time step, apart from
+            the population it receives
+        """
+
+    def extend_steady_state(self, num_time_steps: int) -> None:
+        """Skip `num_time_steps` time steps, extrapolating the outflows of the latest time steps to each of them"""
+        if len(self.outflows.columns) > 0:
+            latest_time_step = max(self.outflows.columns)
+            # only extrapolate from consecutive time steps
+            history_time_steps = [latest_time_step]
+            while (
+                len(history_time_steps) < 3
+                and history_time_steps[0] - 1 in self.outflows.columns
+            ):
+                history_time_steps.insert(0, history_time_steps[0] - 1)
+            steady_state_outflows = pd.DataFrame(
+                extrapolate_trend(
+                    self.outflows[history_time_steps].to_numpy(dtype=float),
+                    num_time_steps,
+                ),
+                index=self.outflows.index,
+                columns=range(
+                    latest_time_step + 1, latest_time_step + 1 + num_time_steps
+                ),
+            )
+            self.outflows = pd.concat([self.outflows, steady_state_outflows], axis=1)
+        self.current_time_step += num_time_steps
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the state that changes while the compartment is stepped forward"""
+        return {
+            attribute: deepcopy(getattr(self, attribute))
+            for attribute in self.SNAPSHOT_ATTRIBUTES
+        }
+
+    def restore_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Reset the compartment to the state returned by `get_snapshot()`. The snapshot is copied so it can be
+            restored into several compartments
+        """
+        for attribute in self.SNAPSHOT_ATTRIBUTES:
+            setattr(self, attribute, deepcopy(snapshot[attribute]))
+
     def get_error(self, unit: str = "abs") -> pd.DataFrame:
         if unit == "abs":
             return self.error.sort_index(axis=1).transpose()
@@ -0,0 +1,1191 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""SubSimulations that step all of their compartments, and optionally several sub groups, at once with NumPy arrays"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from full_compartment import FullCompartment
+from shell_compartment import ShellCompartment
+from spark_compartment import SparkCompartment
+from sub_simulation.sub_simulation import SubSimulation
+from utils.transitions_utils import SIG_FIGS
+
+# time step before the first historical outflows of compartments without any
+NO_HISTORICAL_OUTFLOWS = np.iinfo(np.int64).min
+
+
+class MatrixSubSimulation(SubSimulation):
+    """
+    Run the population projection for one sub group with the matrix engine.
+
+    The cohorts, outflows and populations of the sub group live in a MatrixSubSimulationBatch, which is a batch of
+    one unless the sub group was added to a larger batch. The compartment objects are views of the batch state,
+    brought up to date whenever `simulation_compartments` is accessed.
+    """
+
+    def __init__(
+        self,
+        simulation_compartments: Dict[str, SparkCompartment],
+        max_time_steps: Optional[int] = None,
+    ) -> None:
+        """
+        `simulation_compartments` compartments with initialized edges and cohorts, as built by SubSimulationFactory
+        `max_time_steps` the number of time steps the sub group is expected to be simulated for, used to
+            preallocate the cohort storage
+        """
+        self._batch: Optional[MatrixSubSimulationBatch] = None
+        self._group_index = 0
+        super().__init__(simulation_compartments)
+
+        MatrixSubSimulationBatch.check_compartments_valid(
+            list(simulation_compartments.values())
+        )
+        self.max_time_steps = max_time_steps
+
+    @property
+    def simulation_compartments(self) -> Dict[str, SparkCompartment]:
+        if self._batch is not None:
+            self._batch.sync_group(self._group_index)
+        return self._simulation_compartments
+
+    @simulation_compartments.setter
+    def simulation_compartments(
+        self, simulation_compartments: Dict[str, SparkCompartment]
+    ) -> None:
+        self._simulation_compartments = simulation_compartments
+
+    @property
+    def batch(self) -> "MatrixSubSimulationBatch":
+        """The batch stepping this sub group, created as a batch of one on first use"""
+        if self._batch is None:
+            MatrixSubSimulationBatch({"": self}, self.max_time_steps)
+        assert self._batch is not None
+        return self._batch
+
+    def join_batch(
+        self, batch: "MatrixSubSimulationBatch", group_index: int
+    ) -> List[SparkCompartment]:
+        """
+        Hand this sub group over to `batch` and return its up to date compartments, only called by
+            MatrixSubSimulationBatch
+        """
+        if self._batch is not None:
+            self._batch.sync_group(self._group_index)
+        self._batch = batch
+        self._group_index = group_index
+        return list(self._simulation_compartments.values())
+
+    def _get_single_group_batch(self) -> "MatrixSubSimulationBatch":
+        if self.batch.num_groups > 1:
+            raise ValueError(
+                "Sub groups of a MatrixSubSimulationBatch are stepped together through the batch"
+            )
+        return self.batch
+
+    def restore_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Reset the sub group to the state returned by `get_snapshot()`. The sub group leaves its batch, which is
+            out of date with the restored compartments, and is stepped by a new batch built from them
+        """
+        self._batch = None
+        super().restore_snapshot(snapshot)
+
+    def step_forward(self) -> None:
+        """Run the simulation for one time step"""
+        self._get_single_group_batch().step_forward()
+
+    def scale_cohorts(self, scale_factors: pd.DataFrame, time_step: int) -> None:
+        """Scale cohort sizes to match historical data"""
+        if len(scale_factors.compartment.unique()) != len(scale_factors):
+            raise ValueError(f"Duplicate compartment scale factors: {scale_factors}")
+
+        for compartment_tag in scale_factors.compartment.unique():
+            compartment_obj = self._simulation_compartments[compartment_tag]
+            if isinstance(compartment_obj, FullCompartment):
+                scale_factor = (
+                    scale_factors.loc[scale_factors.compartment == compartment_tag]
+                    .iloc[0]
+                    .scale_factor
+                )
+                self.batch.scale_cohorts(
+                    self._group_index, compartment_tag, scale_factor
+                )
+                self.end_time_step_scale_factors.loc[
+                    time_step, compartment_tag
+                ] = scale_factor
+
+    def create_new_cohort(self) -> None:
+        """Create a new cohort from new admissions from other compartments"""
+        self._get_single_group_batch().create_new_cohort()
+
+    def prepare_for_next_step(self) -> None:
+        """Prepare all compartments for next step"""
+        self._get_single_group_batch().prepare_for_next_step()
+
+    def cross_flow(self) -> pd.DataFrame:
+        return (
+            self._get_single_group_batch().cross_flow().drop("simulation_group", axis=1)
+        )
+
+    def ingest_cross_simulation_cohorts(
+        self, cross_simulation_flows: pd.DataFrame
+    ) -> None:
+        batch = self._get_single_group_batch()
+        batch.ingest_cross_simulation_cohorts(
+            cross_simulation_flows.assign(
+                simulation_group=batch.simulation_groups[self._group_index]
+            )
+        )
+
+    def get_current_populations(self) -> pd.DataFrame:
+        """Pull the compartment populations from the current time step."""
+        return self.batch.get_current_populations(self._group_index)
+
+    def get_cohort_labels(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        return self.batch.get_cohort_labels()
+
+    def get_cohort_state(self, num_durations: int) -> List[np.ndarray]:
+        return self.batch.get_cohort_state(num_durations, self._group_index)
+
+    def pop_cohort_populations(
+        self, start_time_steps: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        return self.batch.pop_cohort_populations(self._group_index, start_time_steps)
+
+    def add_cohort_populations(
+        self, start_time_steps: np.ndarray, cohort_populations: Dict[str, np.ndarray]
+    ) -> None:
+        self.batch.add_cohort_populations(
+            self._group_index, start_time_steps, cohort_populations
+        )
+
+
+class MatrixSubSimulationBatch:
+    """
+    Step the compartments of one or more sub groups that share a compartment architecture together.
+
+    The cohorts of every FullCompartment are stored in one (sub group x compartment x cohort x time step) array.
+    Each time step stacks the per time step transition matrices of every sub group into one transfer operator over
+    the outflow names of the batch and collects the ShellCompartment admissions into one admissions array, so all
+    sub groups are stepped with a handful of NumPy operations.
+    """
+
+    def __init__(
+        self,
+        sub_simulations: Dict[str, MatrixSubSimulation],
+        max_time_steps: Optional[int] = None,
+    ) -> None:
+        """
+        `sub_simulations` the sub groups to step together, keyed by simulation group
+        `max_time_steps` the number of time steps the sub groups are expected to be simulated for, used to
+            preallocate the cohort storage. Defaults to the longest `max_time_steps` of the sub groups
+        """
+        if len(sub_simulations) == 0:
+            raise ValueError(
+                "Cannot build a MatrixSubSimulationBatch without sub groups"
+            )
+
+        self.simulation_groups = list(sub_simulations)
+        self.num_groups = len(self.simulation_groups)
+        if max_time_steps is None:
+            max_time_steps = max(
+                sub_simulation.max_time_steps or 0
+                for sub_simulation in sub_simulations.values()
+            )
+
+        # take over the sub groups once their compartments are up to date with any previous batch
+        group_compartments = []
+        for group_index, sub_simulation in enumerate(sub_simulations.values()):
+            group_compartments.append(sub_simulation.join_batch(self, group_index))
+        self._check_architectures_match(group_compartments)
+
+        self._full_compartments: List[List[FullCompartment]] = [
+            [c for c in compartments if isinstance(c, FullCompartment)]
+            for compartments in group_compartments
+        ]
+        self._shell_compartments: List[List[ShellCompartment]] = [
+            [c for c in compartments if isinstance(c, ShellCompartment)]
+            for compartments in group_compartments
+        ]
+        # FullCompartments followed by ShellCompartments, the order of the outflow bookkeeping
+        self._ordered_compartments: List[List[SparkCompartment]] = [
+            [*full_compartments, *shell_compartments]
+            for full_compartments, shell_compartments in zip(
+                self._full_compartments, self._shell_compartments
+            )
+        ]
+        full_tags = [compartment.tag for compartment in self._full_compartments[0]]
+        shell_tags = [compartment.tag for compartment in self._shell_compartments[0]]
+        self._compartment_indices = {tag: index for index, tag in enumerate(full_tags)}
+        num_full_compartments = len(full_tags)
+
+        full_time_steps = {
+            compartment.current_time_step
+            for full_compartments in self._full_compartments
+            for compartment in full_compartments
+        }
+        if len(full_time_steps) != 1:
+            raise ValueError(
+                f"FullCompartments must all be on the same time step to be stepped together: {full_time_steps}"
+            )
+        self.current_time_step = full_time_steps.pop()
+        self._shell_time_steps = np.array(
+            [
+                [shell.current_time_step for shell in shell_compartments]
+                for shell_compartments in self._shell_compartments
+            ],
+            dtype=np.int64,
+        ).reshape(self.num_groups, len(shell_tags))
+
+        # every outflow name in the batch gets one column of the transfer operator
+        self._outflow_names: List[str] = []
+        self._outflow_columns: Dict[str, int] = {}
+        self._get_outflow_columns(full_tags + shell_tags)
+        for full_compartments in self._full_compartments:
+            for compartment in full_compartments:
+                self._get_outflow_columns(compartment.compartment_transitions.outflows)
+                self._get_outflow_columns(compartment.historical_outflows.index)
+        for shell_compartments in self._shell_compartments:
+            for shell in shell_compartments:
+                for policy_data in shell.policy_data.values():
+                    self._get_outflow_columns(policy_data.index)
+        self._compartment_columns = self._get_outflow_columns(full_tags)
+        self._shell_tags = {
+            self._outflow_columns[shell_tag]: shell_tag for shell_tag in shell_tags
+        }
+
+        # historical outflows per sub group and FullCompartment, ordered like the compartment outflows index
+        self._historical_columns: List[List[np.ndarray]] = []
+        self._historical_outflows: List[List[Dict[int, np.ndarray]]] = []
+        self._first_historical_time_steps = np.full(
+            (self.num_groups, num_full_compartments), NO_HISTORICAL_OUTFLOWS
+        )
+        for group_index, full_compartments in enumerate(self._full_compartments):
+            self._historical_columns.append([])
+            self._historical_outflows.append([])
+            for compartment_index, compartment in enumerate(full_compartments):
+                historical_outflows = compartment.historical_outflows
+                self._historical_columns[group_index].append(
+                    self._get_outflow_columns(historical_outflows.index)
+                )
+                self._historical_outflows[group_index].append(
+                    {
+                        time_step: historical_outflows[time_step].to_numpy(
+                            dtype=np.float64
+                        )
+                        for time_step in historical_outflows.columns
+                    }
+                )
+                if not historical_outflows.empty:
+                    self._first_historical_time_steps[
+                        group_index, compartment_index
+                    ] = min(historical_outflows.columns)
+        # dense historical outflow overrides, rebuilt whenever an outflow name is added
+        self._historical_overrides: Dict[
+            int, Tuple[np.ndarray, np.ndarray, np.ndarray]
+        ] = {}
+        self._first_historical_outflows = (np.zeros(0), np.zeros(0, dtype=bool))
+        self._num_historical_outflows = -1
+
+        # cohort populations, only the [:, :, :num_cohorts, :num_time_steps] block is valid
+        self._populations = np.zeros((self.num_groups, num_full_compartments, 0, 0))
+        self._start_time_steps = np.zeros(0, dtype=np.int64)
+        self._time_steps = np.zeros(0, dtype=np.int64)
+        self._num_cohorts = 0
+        self._num_time_steps = 0
+        self._cohort_rows: Dict[int, int] = {}
+        self._time_step_columns: Dict[int, int] = {}
+        self._load_cohorts(
+            [
+                [compartment.cohorts.cohort_df for compartment in full_compartments]
+                for full_compartments in self._full_compartments
+            ],
+            max(max_time_steps, 0) + 1,
+        )
+        self._incoming_cohorts = np.array(
+            [
+                [compartment.incoming_cohorts for compartment in full_compartments]
+                for full_compartments in self._full_compartments
+            ],
+            dtype=np.float64,
+        )
+
+        # results of every time step, each sub group syncs its compartments from its own cursor
+        self._end_time_steps: List[int] = []
+        self._end_time_step_populations: List[np.ndarray] = []
+        self._recorded_time_steps: Set[int] = set()
+        for full_compartments in self._full_compartments:
+            for compartment in full_compartments:
+                self._recorded_time_steps.update(
+                    compartment.end_time_step_populations.index
+                )
+        self._full_outflow_records: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        self._shell_outflow_records: List[
+            Tuple[np.ndarray, np.ndarray, np.ndarray]
+        ] = []
+        self._error_records: List[List[List[Tuple[int, np.ndarray]]]] = [
+            [[] for _ in full_compartments]
+            for full_compartments in self._full_compartments
+        ]
+        self._synced_populations = [0] * self.num_groups
+        self._synced_outflows = [0] * self.num_groups
+        self._synced_groups = [True] * self.num_groups
+
+        # outflows index of every compartment and the names added to it, with the outflow record they first appear in
+        self._outflow_index: List[List[List[str]]] = [
+            [list(compartment.outflows.index) for compartment in compartments]
+            for compartments in self._ordered_compartments
+        ]
+        self._new_outflow_names: List[List[Dict[str, int]]] = [
+            [{} for _ in compartments] for compartments in self._ordered_compartments
+        ]
+
+        # stacked transfer operators keyed by the ids of the transition matrices they were built from
+        self._transfer_operator_cache: Dict[
+            Tuple[int, ...],
+            Tuple[Tuple[np.ndarray, ...], np.ndarray, np.ndarray, np.ndarray],
+        ] = {}
+
+    @staticmethod
+    def check_compartments_valid(compartments: List[SparkCompartment]) -> None:
+        """Throws if the compartments of one sub group cannot be stepped together"""
+        compartment_ids = {id(compartment) for compartment in compartments}
+        for compartment in compartments:
+            if not isinstance(compartment, (FullCompartment, ShellCompartment)):
+                raise ValueError(
+                    f"Cannot step compartment {compartment.tag} of type {type(compartment).__name__} "
+                    "with the matrix engine"
+                )
+            if {id(edge) for edge in compartment.edges} != compartment_ids:
+                raise ValueError(
+                    f"Compartment {compartment.tag} must have every compartment of the sub simulation as an edge "
+                    "to be stepped with the matrix engine"
+                )
+        if not any(
+            isinstance(compartment, FullCompartment) for compartment in compartments
+        ):
+            raise ValueError(
+                "Cannot step a sub simulation without FullCompartments with the matrix engine"
+            )
+
+    def _check_architectures_match(
+        self, group_compartments: List[List[SparkCompartment]]
+    ) -> None:
+        """Throws if the sub groups do not share the same compartment architecture"""
+        architectures = [
+            [(compartment.tag, type(compartment)) for compartment in compartments]
+            for compartments in group_compartments
+        ]
+        for simulation_group, architecture in zip(
+            self.simulation_groups, architectures
+        ):
+            if architecture != architectures[0]:
+                raise ValueError(
+                    f"Simulation group {simulation_group} does not share the compartment architecture of "
+                    f"{self.simulation_groups[0]}: {architecture} != {architectures[0]}"
+                )
+
+    def _mark_unsynced(self) -> None:
+        self._synced_groups = [False] * self.num_groups
+
+    def _get_outflow_columns(self, outflow_names: Iterable[str]) -> np.ndarray:
+        """Return the transfer operator columns of `outflow_names`, adding columns for new names"""
+        columns = []
+        for outflow_name in outflow_names:
+            column = self._outflow_columns.get(outflow_name)
+            if column is None:
+                column = len(self._outflow_names)
+                self._outflow_names.append(outflow_name)
+                self._outflow_columns[outflow_name] = column
+            columns.append(column)
+        return np.array(columns, dtype=np.int64)
+
+    def _compile_historical_overrides(self) -> None:
+        """Build the dense historical outflows that replace the modeled outflows for each time step"""
+        num_outflows = len(self._outflow_names)
+        overrides_shape = (*self._first_historical_time_steps.shape, num_outflows)
+
+        self._historical_overrides = {}
+        first_counts = np.zeros(overrides_shape)
+        first_present = np.zeros(overrides_shape, dtype=bool)
+        for group_index, compartment_outflows in enumerate(self._historical_outflows):
+            for compartment_index, historical_outflows in enumerate(
+                compartment_outflows
+            ):
+                columns = self._historical_columns[group_index][compartment_index]
+                for time_step, counts in historical_outflows.items():
+                    if time_step not in self._historical_overrides:
+                        self._historical_overrides[time_step] = (
+                            np.zeros(overrides_shape[:2], dtype=bool),
+                            np.zeros(overrides_shape),
+                            np.zeros(overrides_shape, dtype=bool),
+                        )
+                    mask, override_counts, present = self._historical_overrides[
+                        time_step
+                    ]
+                    mask[group_index, compartment_index] = True
+                    override_counts[group_index, compartment_index, columns] = counts
+                    present[group_index, compartment_index, columns] = True
+
+                first_time_step = self._first_historical_time_steps[
+                    group_index, compartment_index
+                ]
+                if first_time_step != NO_HISTORICAL_OUTFLOWS:
+                    first_counts[
+                        group_index, compartment_index, columns
+                    ] = historical_outflows[first_time_step]
+                    first_present[group_index, compartment_index, columns] = True
+
+        self._first_historical_outflows = (first_counts, first_present)
+        self._num_historical_outflows = num_outflows
+
+    def _get_transfer_operator(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return the (sub group x compartment x time in compartment x outflow) transfer operator for the current time
+            step, the longest time in compartment of each transition table, and which outflows each table models.
+        The last column is the `remaining` probability. It is 0 for cohorts that have not spent a full time step in
+            the compartment and 1 past the end of the transition table, where cohorts must already be empty.
+        """
+        transition_matrices = [
+            compartment.compartment_transitions.get_per_time_step_transition_matrix(
+                self.current_time_step
+            )
+            for full_compartments in self._full_compartments
+            for compartment in full_compartments
+        ]
+        cache_key = tuple(id(matrix) for matrix, _ in transition_matrices)
+
+        cached_operator = self._transfer_operator_cache.get(cache_key)
+        if (
+            cached_operator is not None
+            and all(
+                cached_matrix is matrix
+                for cached_matrix, (matrix, _) in zip(
+                    cached_operator[0], transition_matrices
+                )
+            )
+            and cached_operator[1].shape[-1] == len(self._outflow_names) + 1
+        ):
+            return cached_operator[1:]
+
+        model_columns = [
+            self._get_outflow_columns(outflows) for _, outflows in transition_matrices
+        ]
+        num_full_compartments = len(self._compartment_indices)
+        max_durations = np.array(
+            [len(matrix) for matrix, _ in transition_matrices], dtype=np.int64
+        ).reshape(self.num_groups, num_full_compartments)
+        transfer_operator = np.zeros(
+            (
+                self.num_groups,
+                num_full_compartments,
+                max_durations.max() + 2,
+                len(self._outflow_names) + 1,
+            )
+        )
+        model_outflows = np.zeros(
+            (self.num_groups, num_full_compartments, len(self._outflow_names)),
+            dtype=bool,
+        )
+        for index, ((matrix, _), columns) in enumerate(
+            zip(transition_matrices, model_columns)
+        ):
+            group_index, compartment_index = divmod(index, num_full_compartments)
+            compartment_operator = transfer_operator[group_index, compartment_index]
+            max_duration = len(matrix)
+            compartment_operator[1 : max_duration + 1][:, columns] = matrix[:, :-1]
+            compartment_operator[1 : max_duration + 1, -1] = matrix[:, -1]
+            compartment_operator[max_duration + 1 :, -1] = 1.0
+            model_outflows[group_index, compartment_index, columns] = True
+            self._index_model_outflows(group_index, compartment_index, columns)
+        transfer_operator.flags.writeable = False
+
+        self._transfer_operator_cache[cache_key] = (
+            tuple(matrix for matrix, _ in transition_matrices),
+            transfer_operator,
+            max_durations,
+            model_outflows,
+        )
+        return transfer_operator, max_durations, model_outflows
+
+    def _index_model_outflows(
+        self, group_index: int, compartment_index: int, columns: np.ndarray
+    ) -> None:
+        """Add rows to the outflows of a FullCompartment for any new outflow of its transition table"""
+        outflow_index = self._outflow_index[group_index][compartment_index]
+        missing_names = [
+            self._outflow_names[column]
+            for column in columns
+            if self._outflow_names[column] not in outflow_index
+        ]
+        if len(missing_names) > 0:
+            outflow_index.extend(missing_names)
+            outflow_index.sort()
+            for outflow_name in missing_names:
+                self._new_outflow_names[group_index][compartment_index][
+                    outflow_name
+                ] = len(self._full_outflow_records)
+
+    def step_forward(self) -> None:
+        """Run the simulation of every sub group for one time step"""
+        self._mark_unsynced()
+        time_step = self.current_time_step
+
+        # predict the admissions first since they can add outflow names to the transfer operator
+        shell_admissions = []
+        for group_index, shell_compartments in enumerate(self._shell_compartments):
+            for shell_index, shell in enumerate(shell_compartments):
+                admissions = shell.get_time_step_admissions(
+                    int(self._shell_time_steps[group_index, shell_index])
+                )
+                shell_admissions.append(
+                    (
+                        group_index,
+                        shell_index,
+                        self._get_outflow_columns(admissions.keys()),
+                        np.fromiter(admissions.values(), np.float64, len(admissions)),
+                    )
+                )
+        transfer_operator, max_durations, model_outflows = self._get_transfer_operator()
+        num_outflows = len(self._outflow_names)
+        if self._num_historical_outflows != num_outflows:
+            self._compile_historical_overrides()
+
+        # no cohort should start in cohort after current_ts
+        time_in_compartment = time_step - self._start_time_steps[: self._num_cohorts]
+        if (time_in_compartment < 0).any():
+            raise ValueError(
+                "Cohort cannot start after current time step\n"
+                f"Current time step: {time_step}\n"
+                f"Cohort start times: {time_step - time_in_compartment}"
+            )
+
+        latest_populations = self._get_latest_cohort_populations()
+        long_cohorts = time_in_compartment > max_durations[:, :, np.newaxis]
+        if not np.isclose(latest_populations[long_cohorts], 0, SIG_FIGS).all():
+            raise ValueError(
+                f"cohorts not empty after max sentence: {latest_populations[long_cohorts]}"
+            )
+
+        duration_rows = np.clip(time_in_compartment, 0, transfer_operator.shape[2] - 1)
+        transitions = (
+            transfer_operator[:, :, duration_rows]
+            * latest_populations[:, :, :, np.newaxis]
+        )
+        end_populations = transitions[:, :, :, -1]
+        end_populations[:, :, time_in_compartment < 1] = 0
+        outflow_counts = transitions[:, :, :, :-1].sum(axis=2)
+
+        too_large = np.round(end_populations, SIG_FIGS) > np.round(
+            latest_populations, SIG_FIGS
+        )
+        if too_large.any():
+            raise ValueError(
+                "Cannot append cohort data that is larger than the latest population\n"
+                f"Latest population: {latest_populations[too_large]}\n"
+                f"Attempting to append: {end_populations[too_large]}"
+            )
+
+        # if historical data available, use that instead of the modeled outflows
+        outflows_present = model_outflows
+        historical_overrides = self._historical_overrides.get(time_step)
+        if historical_overrides is not None:
+            override_mask, override_counts, override_present = historical_overrides
+            for group_index, compartment_index in zip(*np.nonzero(override_mask)):
+                self._record_error(
+                    group_index,
+                    compartment_index,
+                    time_step,
+                    np.where(
+                        model_outflows[group_index, compartment_index],
+                        outflow_counts[group_index, compartment_index],
+                        np.nan,
+                    ),
+                )
+            outflow_counts = np.where(
+                override_mask[:, :, np.newaxis], override_counts, outflow_counts
+            )
+            outflows_present = np.where(
+                override_mask[:, :, np.newaxis], override_present, outflows_present
+            )
+
+        # if prior to historical data, interpolate from earliest ts of data
+        before_historical_outflows = time_step < self._first_historical_time_steps
+        if before_historical_outflows.any():
+            first_counts, first_present = self._first_historical_outflows
+            outflow_counts = np.where(
+                before_historical_outflows[:, :, np.newaxis],
+                first_counts,
+                outflow_counts,
+            )
+            outflows_present = np.where(
+                before_historical_outflows[:, :, np.newaxis],
+                first_present,
+                outflows_present,
+            )
+
+        # Store the outflows with the previous time step since transitions from the last
+        # time step get us the total population for this time step
+        self._full_outflow_records.append(
+            (time_step - 1, outflow_counts, outflows_present)
+        )
+        self._check_shell_influx(np.flatnonzero(outflows_present.any(axis=(0, 1))))
+
+        admissions_shape = (*self._shell_time_steps.shape, num_outflows)
+        admissions_counts = np.zeros(admissions_shape)
+        admissions_present = np.zeros(admissions_shape, dtype=bool)
+        for group_index, shell_index, columns, counts in shell_admissions:
+            self._check_shell_influx(columns)
+            admissions_counts[group_index, shell_index, columns] = counts
+            admissions_present[group_index, shell_index, columns] = True
+        self._shell_outflow_records.append(
+            (self._shell_time_steps.copy(), admissions_counts, admissions_present)
+        )
+
+        outflow_totals = outflow_counts.sum(axis=1) + admissions_counts.sum(axis=1)
+        self._incoming_cohorts += outflow_totals[:, self._compartment_columns]
+
+        if time_step in self._time_step_columns:
+            raise ValueError(f"Cannot overwrite cohort for time {time_step}")
+        column = self._append_time_step(time_step)
+        self._populations[:, :, : self._num_cohorts, column] = end_populations
+
+    def _record_error(
+        self,
+        group_index: int,
+        compartment_index: int,
+        time_step: int,
+        model_outflows: np.ndarray,
+    ) -> None:
+        historical_columns = self._historical_columns[group_index][compartment_index]
+        historical_counts = self._historical_outflows[group_index][compartment_index][
+            time_step
+        ]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            error = (
+                100
+                * (model_outflows[historical_columns] - historical_counts)
+                / historical_counts
+            )
+        self._error_records[group_index][compartment_index].append((time_step, error))
+
+    def _check_shell_influx(self, columns: np.ndarray) -> None:
+        for column in columns:
+            if column in self._shell_tags:
+                raise ValueError(
+                    f"Shell compartment {self._shell_tags[column]} cannot ingest cohorts"
+                )
+
+    def create_new_cohort(self) -> None:
+        """Create a new cohort in every FullCompartment from the admissions of the time step"""
+        if self.current_time_step not in self._time_step_columns:
+            raise ValueError(
+                f"Cannot append cohort with start time {self.current_time_step} outside of the cohort timeline "
+                f"{self._time_steps[: self._num_time_steps]}"
+            )
+        if self.current_time_step in self._cohort_rows:
+            raise ValueError(
+                f"Cannot overwrite cohort for time {self.current_time_step}"
+            )
+
+        self._mark_unsynced()
+        row = self._append_row(self.current_time_step)
+        self._populations[
+            :, :, row, self._time_step_columns[self.current_time_step]
+        ] = self._incoming_cohorts
+        self._incoming_cohorts = np.zeros(self._incoming_cohorts.shape)
+
+    def prepare_for_next_step(self) -> None:
+        """Record the compartment populations and move every sub group 1 time step forward"""
+        if self.current_time_step in self._recorded_time_steps:
+            raise ValueError(
+                f"Cannot prepare_for_next_step() if population already recorded for this time step \n"
+                f"time step {self.current_time_step} already in end_time_step_populations"
+            )
+        self._mark_unsynced()
+        self._recorded_time_steps.add(self.current_time_step)
+        self._end_time_steps.append(self.current_time_step)
+        self._end_time_step_populations.append(
+            self._get_latest_cohort_populations().sum(axis=2)
+        )
+
+        self.current_time_step += 1
+        self._shell_time_steps += 1
+
+    def scale_cohorts(
+        self, group_index: int, compartment_tag: str, scale_factor: float
+    ) -> None:
+        if scale_factor < 0:
+            raise ValueError(
+                f"Cannot scale cohort by a negative factor: {scale_factor}"
+            )
+        self._synced_groups[group_index] = False
+        self._populations[
+            group_index,
+            self._compartment_indices[compartment_tag],
+            : self._num_cohorts,
+            : self._num_time_steps,
+        ] *= scale_factor
+
+    def get_current_populations(
+        self, group_index: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Pull the compartment populations from the current time step.
+        `group_index` the sub group to pull, or None to pull every sub group with their `simulation_group`
+        """
+        compartment_populations = self._get_latest_cohort_populations().sum(axis=2)
+        if group_index is not None:
+            return pd.DataFrame(
+                {
+                    "compartment": list(self._compartment_indices),
+                    "compartment_population": compartment_populations[group_index],
+                },
+                columns=["compartment", "compartment_population"],
+            )
+
+        return pd.DataFrame(
+            {
+                "compartment": np.tile(
+                    list(self._compartment_indices), self.num_groups
+                ),
+                "compartment_population": compartment_populations.ravel(),
+                "simulation_group": np.repeat(
+                    self.simulation_groups, len(self._compartment_indices)
+                ),
+            },
+            columns=["compartment", "compartment_population", "simulation_group"],
+        )
+
+    def get_cohort_state(
+        self, num_durations: int, group_index: Optional[int] = None
+    ) -> List[np.ndarray]:
+        """
+        Return the population of every FullCompartment per time spent in it, with every stay of `num_durations`
+            time steps or longer counted in the last one, followed by the latest outflows of every FullCompartment,
+            like `SubSimulation.get_cohort_state()`.
+        `group_index` the sub group to pull, or None to pull every sub group
+        """
+        time_in_compartment = np.minimum(
+            self.current_time_step - self._start_time_steps[: self._num_cohorts],
+            num_durations - 1,
+        )
+        duration_populations = (
+            self._get_latest_cohort_populations()
+            @ np.eye(num_durations)[time_in_compartment]
+        )
+        if len(self._full_outflow_records) > 0:
+            latest_outflows = self._full_outflow_records[-1][1]
+        else:
+            latest_outflows = np.zeros(self._populations.shape[:2] + (0,))
+        if group_index is not None:
+            duration_populations = duration_populations[group_index : group_index + 1]
+            latest_outflows = latest_outflows[group_index : group_index + 1]
+        return list(duration_populations.reshape(-1, num_durations)) + list(
+            latest_outflows.reshape(-1, latest_outflows.shape[-1])
+        )
+
+    def get_cohort_labels(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the (cohort start time steps, time steps) shared by every sub group and FullCompartment"""
+        return (
+            self._start_time_steps[: self._num_cohorts].copy(),
+            self._time_steps[: self._num_time_steps].copy(),
+        )
+
+    def pop_cohort_populations(
+        self, group_index: int, start_time_steps: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """Remove the cohorts starting at `start_time_steps` from one sub group and return their populations"""
+        self._synced_groups[group_index] = False
+        rows = [
+            self._cohort_rows[start_time_step] for start_time_step in start_time_steps
+        ]
+        group_populations = self._populations[group_index]
+        cohort_populations = group_populations[:, rows, : self._num_time_steps]
+        group_populations[:, rows, : self._num_time_steps] = 0.0
+        return dict(zip(self._compartment_indices, cohort_populations))
+
+    def add_cohort_populations(
+        self,
+        group_index: int,
+        start_time_steps: np.ndarray,
+        cohort_populations: Dict[str, np.ndarray],
+    ) -> None:
+        """Add the populations returned by `pop_cohort_populations` to the cohorts of one sub group"""
+        self._synced_groups[group_index] = False
+        rows = [
+            self._cohort_rows[start_time_step] for start_time_step in start_time_steps
+        ]
+        for compartment_tag, compartment_populations in cohort_populations.items():
+            self._populations[
+                group_index,
+                self._compartment_indices[compartment_tag],
+                rows,
+                : self._num_time_steps,
+            ] += compartment_populations
+
+    def remap_simulation_groups(
+        self,
+        simulation_group_mapping: Dict[str, str],
+        transitioning_cohorts: np.ndarray,
+    ) -> None:
+        """
+        Move the `transitioning_cohorts` of every sub group to the sub group given by `simulation_group_mapping`
+        `transitioning_cohorts` boolean mask over the cohorts, ordered like `get_cohort_labels()`
+        """
+        rows = np.flatnonzero(transitioning_cohorts)
+        if len(rows) == 0:
+            return
+
+        self._mark_unsynced()
+        target_groups = [
+            self.simulation_groups.index(simulation_group_mapping[simulation_group])
+            for simulation_group in self.simulation_groups
+        ]
+        cohort_populations = self._populations[:, :, rows, : self._num_time_steps]
+        remapped_populations = np.zeros(cohort_populations.shape)
+        np.add.at(remapped_populations, target_groups, cohort_populations)
+        self._populations[:, :, rows, : self._num_time_steps] = remapped_populations
+
+    def cross_flow(self) -> pd.DataFrame:
+        """Hand over the cohorts of every sub group, with their `compartment` and `simulation_group`"""
+        num_full_compartments = len(self._compartment_indices)
+        cohorts_table = pd.DataFrame(
+            self._populations[
+                :, :, : self._num_cohorts, : self._num_time_steps
+            ].reshape(-1, self._num_time_steps),
+            index=pd.Index(
+                np.tile(
+                    self._start_time_steps[: self._num_cohorts],
+                    self.num_groups * num_full_compartments,
+                ),
+                name="start_time_step",
+            ),
+            columns=pd.Index(
+                self._time_steps[: self._num_time_steps], name="simulation_time_step"
+            ),
+        )
+        cohorts_table["compartment"] = np.repeat(
+            np.tile(list(self._compartment_indices), self.num_groups),
+            self._num_cohorts,
+        )
+        cohorts_table["simulation_group"] = np.repeat(
+            self.simulation_groups, num_full_compartments * self._num_cohorts
+        )
+
+        # the cohorts are handed over to the cross flow and ingested back afterwards
+        self._mark_unsynced()
+        self._num_cohorts = 0
+        self._num_time_steps = 0
+        self._cohort_rows = {}
+        self._time_step_columns = {}
+
+        return cohorts_table
+
+    def ingest_cross_simulation_cohorts(
+        self, cross_simulation_flows: pd.DataFrame
+    ) -> None:
+        """
+        Ingest the cohorts of every sub group, split by their `compartment` and `simulation_group` columns.
+        Cohorts of simulation groups outside of the batch are ignored.
+        """
+        self._mark_unsynced()
+        group_indices = pd.Index(self.simulation_groups).get_indexer(
+            cross_simulation_flows["simulation_group"]
+        )
+        compartment_indices = pd.Index(list(self._compartment_indices)).get_indexer(
+            cross_simulation_flows["compartment"]
+        )
+        batch_cohorts = (group_indices >= 0) & (compartment_indices >= 0)
+        cohorts = cross_simulation_flows[batch_cohorts].drop(
+            ["compartment", "simulation_group"], axis=1
+        )
+        start_time_steps = np.unique(cohorts.index.to_numpy(dtype=np.int64))
+
+        self._num_cohorts = 0
+        self._num_time_steps = 0
+        self._cohort_rows = {}
+        self._time_step_columns = {}
+        self._ensure_capacity(len(start_time_steps), len(cohorts.columns))
+        for time_step in cohorts.columns:
+            self._append_time_step(int(time_step))
+        for start_time_step in start_time_steps:
+            self._append_row(int(start_time_step))
+
+        self._populations[:, :, : self._num_cohorts, : self._num_time_steps] = 0.0
+        self._populations[
+            group_indices[batch_cohorts],
+            compartment_indices[batch_cohorts],
+            np.searchsorted(start_time_steps, cohorts.index.to_numpy(dtype=np.int64)),
+            : self._num_time_steps,
+        ] = cohorts.to_numpy(dtype=np.float64)
+
+    def _get_latest_cohort_populations(self) -> np.ndarray:
+        if self._num_time_steps == 0:
+            return np.zeros(self._populations.shape[:2] + (self._num_cohorts,))
+        return self._populations[:, :, : self._num_cohorts, self._num_time_steps - 1]
+
+    def _get_cohort_df(self, group_index: int, compartment_index: int) -> pd.DataFrame:
+        return pd.DataFrame(
+            self._populations[
+                group_index,
+                compartment_index,
+                : self._num_cohorts,
+                : self._num_time_steps,
+            ].copy(),
+            index=pd.Index(
+                self._start_time_steps[: self._num_cohorts], name="start_time_step"
+            ),
+            columns=pd.Index(
+                self._time_steps[: self._num_time_steps], name="simulation_time_step"
+            ),
+        )
+
+    def _load_cohorts(
+        self, cohort_dfs: List[List[pd.DataFrame]], min_capacity: int = 0
+    ) -> None:
+        """Replace the cohorts of every FullCompartment, aligned on the union of their cohorts and time steps"""
+        all_cohort_dfs = [
+            cohort_df
+            for group_cohort_dfs in cohort_dfs
+            for cohort_df in group_cohort_dfs
+        ]
+        start_time_steps = all_cohort_dfs[0].index
+        time_steps = all_cohort_dfs[0].columns
+        for cohort_df in all_cohort_dfs[1:]:
+            if not cohort_df.index.equals(start_time_steps):
+                start_time_steps = start_time_steps.union(cohort_df.index)
+            if not cohort_df.columns.equals(time_steps):
+                time_steps = time_steps.union(cohort_df.columns)
+
+        self._num_cohorts = 0
+        self._num_time_steps = 0
+        self._cohort_rows = {}
+        self._time_step_columns = {}
+        self._ensure_capacity(
+            max(len(start_time_steps), min_capacity),
+            max(len(time_steps), min_capacity),
+        )
+        for time_step in time_steps:
+            self._append_time_step(int(time_step))
+        for start_time_step in start_time_steps:
+            self._append_row(int(start_time_step))
+
+        for group_index, group_cohort_dfs in enumerate(cohort_dfs):
+            for compartment_index, cohort_df in enumerate(group_cohort_dfs):
+                if not (
+                    cohort_df.index.equals(start_time_steps)
+                    and cohort_df.columns.equals(time_steps)
+                ):
+                    cohort_df = cohort_df.reindex(
+                        index=start_time_steps, columns=time_steps, fill_value=0
+                    )
+                self._populations[
+                    group_index,
+                    compartment_index,
+                    : self._num_cohorts,
+                    : self._num_time_steps,
+                ] = cohort_df.to_numpy(dtype=np.float64)
+
+    def _append_time_step(self, time_step: int) -> int:
+        """Reserve the next column for `time_step` and return its position"""
+        self._ensure_capacity(self._num_cohorts, self._num_time_steps + 1)
+        column = self._num_time_steps
+        self._time_steps[column] = time_step
+        self._time_step_columns[time_step] = column
+        self._num_time_steps += 1
+        return column
+
+    def _append_row(self, start_time_step: int) -> int:
+        """Reserve the next (zeroed) row for the cohorts starting at `start_time_step` and return its position"""
+        self._ensure_capacity(self._num_cohorts + 1, self._num_time_steps)
+        row = self._num_cohorts
+        self._populations[:, :, row, : self._num_time_steps] = 0.0
+        self._start_time_steps[row] = start_time_step
+        self._cohort_rows[start_time_step] = row
+        self._num_cohorts += 1
+        return row
+
+    def _ensure_capacity(self, num_cohorts: int, num_time_steps: int) -> None:
+        """Double the preallocated storage along any axis that is too small to hold the requested size"""
+        row_capacity, column_capacity = self._populations.shape[2:]
+        if num_cohorts <= row_capacity and num_time_steps <= column_capacity:
+            return
+
+        row_capacity = max(row_capacity, 1)
+        column_capacity = max(column_capacity, 1)
+        while row_capacity < num_cohorts:
+            row_capacity *= 2
+        while column_capacity < num_time_steps:
+            column_capacity *= 2
+
+        populations = np.zeros(
+            self._populations.shape[:2] + (row_capacity, column_capacity)
+        )
+        populations[
+            :, :, : self._num_cohorts, : self._num_time_steps
+        ] = self._populations[:, :, : self._num_cohorts, : self._num_time_steps]
+        self._populations = populations
+
+        start_time_steps = np.zeros(row_capacity, dtype=np.int64)
+        start_time_steps[: self._num_cohorts] = self._start_time_steps[
+            : self._num_cohorts
+        ]
+        self._start_time_steps = start_time_steps
+
+        time_steps = np.zeros(column_capacity, dtype=np.int64)
+        time_steps[: self._num_time_steps] = self._time_steps[: self._num_time_steps]
+        self._time_steps = time_steps
+
+    def sync_group(self, group_index: int) -> None:
+        """Bring the compartment objects of one sub group up to date with the batch state"""
+        if self._synced_groups[group_index]:
+            return
+
+        first_population = self._synced_populations[group_index]
+        for compartment_index, compartment in enumerate(
+            self._full_compartments[group_index]
+        ):
+            compartment.cohorts.ingest_cross_simulation_cohorts(
+                self._get_cohort_df(group_index, compartment_index)
+            )
+            compartment.incoming_cohorts = float(
+                self._incoming_cohorts[group_index, compartment_index]
+            )
+            compartment.current_time_step = self.current_time_step
+            if first_population < len(self._end_time_steps):
+                compartment.end_time_step_populations = pd.concat(
+                    [
+                        compartment.end_time_step_populations,
+                        pd.Series(
+                            [
+                                populations[group_index, compartment_index]
+                                for populations in self._end_time_step_populations[
+                                    first_population:
+                                ]
+                            ],
+                            index=self._end_time_steps[first_population:],
+                        ),
+                    ]
+                )
+
+            error_records = self._error_records[group_index][compartment_index]
+            for time_step, error in error_records:
+                compartment.error[time_step] = error
+            error_records.clear()
+        self._synced_populations[group_index] = len(self._end_time_steps)
+
+        for shell_index, shell in enumerate(self._shell_compartments[group_index]):
+            shell.current_time_step = int(
+                self._shell_time_steps[group_index, shell_index]
+            )
+
+        first_record = self._synced_outflows[group_index]
+        for compartment_index, compartment in enumerate(
+            self._full_compartments[group_index]
+        ):
+            self._sync_outflows(
+                group_index,
+                compartment_index,
+                compartment,
+                [
+                    (record, time_step, counts, present)
+                    for record, (time_step, counts, present) in enumerate(
+                        self._full_outflow_records[first_record:], first_record
+                    )
+                    # if no outflow, nothing was stored
+                    if present[group_index, compartment_index].any()
+                ],
+            )
+        num_full_compartments = len(self._compartment_indices)
+        for shell_index, shell in enumerate(self._shell_compartments[group_index]):
+            self._sync_outflows(
+                group_index,
+                num_full_compartments + shell_index,
+                shell,
+                [
+                    (record, int(time_steps[group_index, shell_index]), counts, present)
+                    for record, (time_steps, counts, present) in enumerate(
+                        self._shell_outflow_records[first_record:], first_record
+                    )
+                ],
+                shell_index,
+            )
+        self._synced_outflows[group_index] = len(self._full_outflow_records)
+
+        self._synced_groups[group_index] = True
+
+    def _sync_outflows(
+        self,
+        group_index: int,
+        compartment_index: int,
+        compartment: SparkCompartment,
+        outflow_records: List[Tuple[int, int, np.ndarray, np.ndarray]],
+        record_index: Optional[int] = None,
+    ) -> None:
+        """
+        Append the recorded outflows to the outflows DataFrame of one compartment
+        `compartment_index` the position of the compartment among the FullCompartments followed by the
+            ShellCompartments
+        `outflow_records` (record number, time step, outflow counts, outflows present) of the batch
+        `record_index` the position of the compartment in the records, defaults to `compartment_index`
+        """
+        if record_index is None:
+            record_index = compartment_index
+        new_outflow_names = self._new_outflow_names[group_index][compartment_index]
+        if len(outflow_records) == 0 and len(new_outflow_names) == 0:
+            return
+
+        outflows = compartment.outflows
+        if len(new_outflow_names) > 0:
+            # new outflows are 0 for the time steps before they first appeared
+            outflows = outflows.reindex(
+                pd.Index(self._outflow_index[group_index][compartment_index]),
+                fill_value=0,
+            )
+        outflow_rows = outflows.index.get_indexer(self._outflow_names)
+
+        recorded_outflows = np.full((len(outflows.index), len(outflow_records)), np.nan)
+        for column, (_, _, counts, present) in enumerate(outflow_records):
+            record_present = present[group_index, record_index]
+            record_columns = np.flatnonzero(
+                record_present & (outflow_rows[: len(record_present)] >= 0)
+            )
+            recorded_outflows[outflow_rows[record_columns], column] = counts[
+                group_index, record_index, record_columns
+            ]
+        record_numbers = np.array([record for record, _, _, _ in outflow_records])
+        for outflow_name, first_record in new_outflow_names.items():
+            recorded_outflows[
+                outflows.index.get_loc(outflow_name), record_numbers < first_record
+            ] = 0
+
+        compartment.outflows = pd.concat(
+            [
+                outflows,
+                pd.DataFrame(
+                    recorded_outflows,
+                    index=outflows.index,
+                    columns=[time_step for _, time_step, _, _ in outflow_records],
+                ),
+            ],
+            axis=1,
+        )
+        new_outflow_names.clear()
@@ -16,13 +16,16 @@
 # =============================================================================
 """Simulate multiple demographic/age groups"""
 
-from typing import Dict
+from copy import deepcopy
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 from full_compartment import FullCompartment
 from shell_compartment import ShellCompartment
 from spark_compartment import SparkCompartment
+from utils.results_builder import ResultsBuilder
 
 
 class SubSimulation:
@@ -90,6 +93,56 @@ class SubSimulation:
         for compartment in self.simulation_compartments.values():
             compartment.prepare_for_next_step()
 
+    def get_stationary_time_step(
+        self, first_time_step: int, end_time_step: int, tolerance: float
+    ) -> int:
+        """
+        Return the first time step from which every compartment is stepped the same way up to `end_time_step`, with
+            predicted admissions within the relative `tolerance` of each other
+        """
+        stationary_time_steps = [first_time_step]
+        for compartment in self.simulation_compartments.values():
+            stationary_time_steps.append(compartment.get_stationary_time_step())
+            if isinstance(compartment, ShellCompartment):
+                stationary_time_steps.append(
+                    compartment.get_constant_admissions_time_step(
+                        first_time_step, end_time_step, tolerance
+                    )
+                )
+        return max(stationary_time_steps)
+
+    def get_max_duration(self) -> int:
+        """Return the longest time any FullCompartment keeps a cohort before it transitions"""
+        return max(
+            (
+                compartment.compartment_transitions.get_max_duration()
+                for compartment in self.simulation_compartments.values()
+                if isinstance(compartment, FullCompartment)
+            ),
+            default=0,
+        )
+
+    def get_cohort_state(self, num_durations: int) -> List[np.ndarray]:
+        """
+        Return the state that keeps changing until the sub group reaches its steady state: the population of every
+            FullCompartment per time spent in it, see `FullCompartment.get_duration_populations()`, followed by
+            the latest outflows of every FullCompartment
+        """
+        full_compartments = [
+            compartment
+            for compartment in self.simulation_compartments.values()
+            if isinstance(compartment, FullCompartment)
+        ]
+        return [
+            compartment.get_duration_populations(num_durations)
+            for compartment in full_compartments
+        ] + [compartment.get_latest_outflows() for compartment in full_compartments]
+
+    def extend_steady_state(self, num_time_steps: int) -> None:
+        """Skip `num_time_steps` time steps, extrapolating the results of the latest time step in every compartment"""
+        for compartment in self.simulation_compartments.values():
+            compartment.extend_steady_state(num_time_steps)
+
     def cross_flow(self) -> pd.DataFrame:
         cohorts_table = pd.DataFrame(columns=["compartment"])
         for compartment_name, compartment_obj in self.simulation_compartments.items():
@@ -109,23 +162,110 @@ class SubSimulation:
             if isinstance(compartment_obj, FullCompartment):
                 compartment_obj.ingest_cross_simulation_cohorts(cross_simulation_flows)
 
+    def get_cohort_labels(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Return the (cohort start time steps, time steps) shared by the cohorts of every FullCompartment, or None
+            if the FullCompartments do not track the same cohorts
+        """
+        cohort_labels = None
+        for compartment in self.simulation_compartments.values():
+            if isinstance(compartment, FullCompartment):
+                compartment_labels = (
+                    compartment.cohorts.get_start_time_steps(),
+                    compartment.cohorts.get_time_steps(),
+                )
+                if cohort_labels is None:
+                    cohort_labels = compartment_labels
+                elif not (
+                    np.array_equal(cohort_labels[0], compartment_labels[0])
+                    and np.array_equal(cohort_labels[1], compartment_labels[1])
+                ):
+                    return None
+        return cohort_labels
+
+    def pop_cohort_populations(
+        self, start_time_steps: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """Remove the cohorts starting at `start_time_steps` from every FullCompartment and return their populations"""
+        return {
+            compartment_tag: compartment.cohorts.pop_cohort_populations(
+                start_time_steps
+            )
+            for compartment_tag, compartment in self.simulation_compartments.items()
+            if isinstance(compartment, FullCompartment)
+        }
+
+    def add_cohort_populations(
+        self, start_time_steps: np.ndarray, cohort_populations: Dict[str, np.ndarray]
+    ) -> None:
+        """Add the populations returned by `pop_cohort_populations` to the cohorts starting at `start_time_steps`"""
+        for compartment_tag, compartment_populations in cohort_populations.items():
+            compartment = self.simulation_compartments[compartment_tag]
+            if isinstance(compartment, FullCompartment):
+                compartment.cohorts.add_cohort_populations(
+                    start_time_steps, compartment_populations
+                )
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the state of the sub group and its compartments at the current time step"""
+        return {
+            "end_time_step_scale_factors": self.end_time_step_scale_factors.copy(),
+            "simulation_compartments": {
+                compartment_tag: compartment.get_snapshot()
+                for compartment_tag, compartment in self.simulation_compartments.items()
+            },
+        }
+
+    def restore_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Reset the sub group to the state returned by `get_snapshot()`. Only the stepped state is restored, the
+            compartments keep their own transitions and admissions predictors
+        """
+        self.end_time_step_scale_factors = deepcopy(
+            snapshot["end_time_step_scale_factors"]
+        )
+        for compartment_tag, compartment in self.simulation_compartments.items():
+            compartment.restore_snapshot(
+                snapshot["simulation_compartments"][compartment_tag]
+            )
+
     def get_population_projections(self) -> pd.DataFrame:
         """Return a DataFrame with the simulation population projections"""
-        # combine the results into one DataFrame
-        simulation_results = pd.DataFrame()
+        results_builder = ResultsBuilder(
+            ["compartment"],
+            "compartment_population",
+            capacity=self.get_num_population_projection_rows(),
+        )
+        self.add_population_projections(results_builder, {})
+        simulation_results = results_builder.to_data_frame()
+        simulation_results.index = simulation_results.time_step.to_numpy()
+        return simulation_results[
+            ["compartment", "compartment_population", "time_step"]
+        ]
+
+    def add_population_projections(
+        self, results_builder: ResultsBuilder, labels: Dict[str, str]
+    ) -> None:
+        """
+        Add the population projections of every FullCompartment to `results_builder`
+        `labels` the labels of the sub simulation, like its simulation group
+        """
         for compartment_name, compartment in self.simulation_compartments.items():
             if isinstance(compartment, FullCompartment):
-                compartment_results = pd.DataFrame(
-                    compartment.get_per_time_step_population(),
-                    columns=["compartment_population"],
-                )
-                compartment_results["compartment"] = compartment_name
-                compartment_results["time_step"] = compartment_results.index
-                simulation_results = pd.concat(
-                    [simulation_results, compartment_results], sort=True
+                compartment_populations = compartment.get_per_time_step_population()
+                results_builder.add(
+                    compartment_populations.index,
+                    compartment_populations.to_numpy(),
+                    {**labels, "compartment": compartment_name},
                 )
 
-        return simulation_results
+    def get_num_population_projection_rows(self) -> int:
+        """Return the number of rows `add_population_projections()` adds"""
+        return sum(
+            len(compartment.get_per_time_step_population())
+            for compartment in self.simulation_compartments.values()
+            if isinstance(compartment, FullCompartment)
+        )
 
     def get_current_populations(self) -> pd.DataFrame:
         """Pull the compartment populations from the current time step."""
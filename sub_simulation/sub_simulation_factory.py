@@ -16,15 +16,17 @@
 # =============================================================================
 """Composition object for SubSimulation to initialize compartments for a macro-simulation and scale populations."""
 import logging
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 
 from compartment_transitions import CompartmentTransitions
 from full_compartment import FullCompartment
+from predicted_admissions import ArimaFitScheduler
 from shell_compartment import ShellCompartment
 from spark_compartment import SparkCompartment
 from spark_policy import SparkPolicy
+from sub_simulation.matrix_sub_simulation import MatrixSubSimulation
 from sub_simulation.sub_simulation import SubSimulation
 from super_simulation.initializer import UserInputs
 
@@ -43,11 +45,25 @@ class SubSimulationFactory:
         first_relevant_time_step: int,
         should_single_cohort_initialize_compartments: bool,
         starting_cohort_sizes: pd.DataFrame,
+        use_matrix_engine: bool = False,
+        arima_fit_scheduler: Optional[ArimaFitScheduler] = None,
+        shared_compartments: Optional[Dict[str, SparkCompartment]] = None,
     ) -> SubSimulation:
-        """Build a sub_simulation."""
+        """
+        Build a sub_simulation.
+        `use_matrix_engine` True to step the compartments together with a MatrixSubSimulation
+        `arima_fit_scheduler` optional scheduler to batch the shell compartment ARIMA fits across sub_simulations
+        `shared_compartments` optional compartments of another sub_simulation built from the same data and
+            policies, whose transition tables and fitted admissions predictors are reused instead of built again
+        """
+        if shared_compartments is None:
+            shared_compartments = {}
 
         transitions_per_compartment, shell_policies = cls._initialize_transition_tables(
-            transitions_data, compartments_architecture, policy_list
+            transitions_data,
+            compartments_architecture,
+            policy_list,
+            shared_compartments,
         )
 
         # Preprocess the historical admissions data into separate pieces per compartment
@@ -65,20 +81,46 @@ class SubSimulationFactory:
             first_relevant_time_step,
             starting_cohort_sizes,
             should_single_cohort_initialize_compartments,
+            arima_fit_scheduler,
+            shared_compartments,
         )
 
+        if use_matrix_engine:
+            return MatrixSubSimulation(
+                simulation_compartments,
+                cls._get_max_time_steps(user_inputs, first_relevant_time_step),
+            )
+
         return SubSimulation(
             simulation_compartments,
         )
 
+    @staticmethod
+    def _get_max_time_steps(
+        user_inputs: UserInputs, first_relevant_time_step: int
+    ) -> int:
+        """Number of initialization steps from the first relevant time step plus the projection itself"""
+        return (
+            user_inputs.start_time_step
+            - first_relevant_time_step
+            + user_inputs.projection_time_steps
+            + 1
+        )
+
     @classmethod
     def _initialize_transition_tables(
         cls,
         transitions_data: pd.DataFrame,
         compartments_architecture: Dict[str, str],
         policy_list: List[SparkPolicy],
+        shared_compartments: Optional[Dict[str, SparkCompartment]] = None,
     ) -> Tuple[Dict[str, CompartmentTransitions], Dict[str, List[SparkPolicy]]]:
-        """Create and initialize all transition tables and store shell policies."""
+        """
+        Create and initialize all transition tables and store shell policies.
+        `shared_compartments` FullCompartments whose initialized transition tables are reused as they are
+        """
+        if shared_compartments is None:
+            shared_compartments = {}
 
         # Warn the user if there are transitions for compartments that are not in the compartment architecture
         unused_transitions_data = transitions_data[
@@ -94,6 +136,12 @@ class SubSimulationFactory:
         transitions_per_compartment = {}
         for compartment in compartments_architecture:
             compartment_type = compartments_architecture[compartment]
+            shared_compartment = shared_compartments.get(compartment)
+            if isinstance(shared_compartment, FullCompartment):
+                transitions_per_compartment[
+                    compartment
+                ] = shared_compartment.compartment_transitions
+                continue
             compartment_duration_data = transitions_data[
                 transitions_data["compartment"] == compartment
             ]
@@ -131,6 +179,8 @@ class SubSimulationFactory:
             )
 
             # add to the dict compartment -> transition class with policies applied
+            if isinstance(shared_compartments.get(compartment), FullCompartment):
+                continue
             if compartment in transitions_per_compartment:
                 transitions_per_compartment[compartment].initialize_transition_tables(
                     compartment_policies
@@ -187,8 +237,17 @@ class SubSimulationFactory:
         first_relevant_time_step: int,
         starting_cohort_sizes: pd.DataFrame,
         should_initialize_compartment_populations: bool,
+        arima_fit_scheduler: Optional[ArimaFitScheduler] = None,
+        shared_compartments: Optional[Dict[str, SparkCompartment]] = None,
     ) -> Dict[str, SparkCompartment]:
-        """Initialize all the SparkCompartments for the subpopulation simulation"""
+        """
+        Initialize all the SparkCompartments for the subpopulation simulation
+        `shared_compartments` ShellCompartments whose fitted admissions predictors are reused
+        """
+        if shared_compartments is None:
+            shared_compartments = {}
+
+        max_time_steps = cls._get_max_time_steps(user_inputs, first_relevant_time_step)
 
         simulation_compartments: Dict[str, SparkCompartment] = {}
         for compartment, compartment_type in simulation_architecture.items():
@@ -204,6 +263,7 @@ class SubSimulationFactory:
                     raise ValueError(
                         f"admissions_data for shell compartment {compartment} cannot be empty"
                     )
+                shared_compartment = shared_compartments.get(compartment)
                 simulation_compartments[compartment] = ShellCompartment(
                     outflows_data=outflows_data,
                     starting_time_step=first_relevant_time_step,
@@ -213,6 +273,11 @@ class SubSimulationFactory:
                     else False,
                     tag=compartment,
                     policy_list=shell_policies[compartment],
+                    arima_fit_scheduler=arima_fit_scheduler,
+                    max_time_steps=max_time_steps,
+                    admissions_source=shared_compartment
+                    if isinstance(shared_compartment, ShellCompartment)
+                    else None,
                 )
             # initialize full compartment
             elif compartment_type == "full":
@@ -229,6 +294,7 @@ class SubSimulationFactory:
                     ],
                     starting_time_step=first_relevant_time_step,
                     tag=compartment,
+                    max_time_steps=max_time_steps,
                 )
             else:
                 logging.warning("Not initializing a compartment for %s", compartment)
@@ -15,12 +15,14 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # =============================================================================
 """SuperSimulation composed object for outputting simulation results."""
-from typing import Dict, List, Optional, Tuple
+import logging
+from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
 
 from super_simulation.time_converter import TimeConverter
 from utils import bq_utils
+from utils.result_sink import ResultSink
 
 
 class Exporter:
@@ -46,8 +48,9 @@ class Exporter:
         output_outflows_data: pd.DataFrame,
         excluded_pop: pd.DataFrame,
         total_pop: pd.DataFrame,
+        result_sink: Optional[ResultSink] = None,
     ) -> Dict[str, pd.DataFrame]:
-        """Format then upload baseline simulation results to Big Query."""
+        """Format then upload baseline simulation results to Big Query, or `result_sink` if provided."""
 
         microsim_population_df = output_population_data.copy()
         microsim_outflows_df = output_outflows_data.copy()
@@ -62,12 +65,14 @@ class Exporter:
                 microsim_population_df, excluded_pop, total_pop
             )
 
-        bq_utils.upload_baseline_simulation_results(
+        write_times = bq_utils.upload_baseline_simulation_results(
             project_id,
             microsim_population_df,
             microsim_outflows_df,
             simulation_tag if simulation_tag else self.simulation_tag,
+            result_sink,
         )
+        self._log_write_times(write_times)
         return {
             "baseline_output_data": microsim_population_df,
             "baseline_transition_data": microsim_outflows_df,
@@ -79,8 +84,9 @@ class Exporter:
         simulation_tag: Optional[str],
         output_data: Dict[str, pd.DataFrame],
         cost_multipliers: pd.DataFrame,
+        result_sink: Optional[ResultSink] = None,
     ) -> Dict[str, pd.DataFrame]:
-        """Format then upload policy simulation results to Big Query."""
+        """Format then upload policy simulation results to Big Query, or `result_sink` if provided."""
         # TODO(#6633): incorporate excluded populations into policy simulation upload for microsimulations
         (
             spending_diff,
@@ -100,14 +106,16 @@ class Exporter:
             .reset_index()
         )
         aggregate_output_data.index = aggregate_output_data.year
-        bq_utils.upload_policy_simulation_results(
+        write_times = bq_utils.upload_policy_simulation_results(
             project_id,
             simulation_tag if simulation_tag else self.simulation_tag,
             spending_diff,
             compartment_life_years_diff,
             aggregate_output_data,
             spending_diff_non_cumulative,
+            result_sink,
         )
+        self._log_write_times(write_times)
         return {
             "spending_diff": spending_diff,
             "compartment_life_years_diff": compartment_life_years_diff,
@@ -120,6 +128,7 @@ class Exporter:
         project_id: str,
         simulation_tag: Optional[str],
         validation_projections_data: pd.DataFrame,
+        result_sink: Optional[ResultSink] = None,
     ) -> None:
         if "time_step" in validation_projections_data.columns:
             validation_projections_data[
@@ -129,11 +138,74 @@ class Exporter:
             )
             validation_projections_data.drop("time_step", axis=1, inplace=True)
 
-        bq_utils.upload_validation_projection_results(
+        write_times = bq_utils.upload_validation_projection_results(
             project_id,
             validation_projections_data,
             simulation_tag if simulation_tag else self.simulation_tag,
+            result_sink,
         )
+        self._log_write_times(write_times)
+
+    @staticmethod
+    def _log_write_times(write_times: Dict[str, float]) -> None:
+        for table_name, seconds in write_times.items():
+            logging.info("Wrote %s in %.2f seconds", table_name, seconds)
+
+    def get_policy_sweep_results(
+        self,
+        scenario_parameters: Dict[str, Dict[str, Any]],
+        scenario_output_data: Dict[str, pd.DataFrame],
+        cost_multipliers: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """
+        Combine the output metrics of every policy scenario of a sweep into one DataFrame with one row per
+            parameter values, year, and compartment
+        `scenario_parameters` the policy parameter values of each policy scenario, keyed by scenario name
+        `scenario_output_data` the formatted control and policy populations of each policy scenario, keyed by
+            scenario name
+        """
+        sweep_results = []
+        for scenario, output_data in scenario_output_data.items():
+            (
+                spending_diff,
+                compartment_life_years_diff,
+                spending_diff_non_cumulative,
+            ) = self._get_output_metrics(output_data, cost_multipliers)
+            scenario_results = pd.concat(
+                {
+                    "spending_diff": spending_diff.stack(),
+                    "compartment_life_years_diff": compartment_life_years_diff.stack(),
+                    "spending_diff_non_cumulative": spending_diff_non_cumulative.stack(),
+                },
+                axis=1,
+            ).astype(float)
+            scenario_results.index.names = ["year", "compartment"]
+
+            population_diff = (
+                output_data.reset_index(drop=False)
+                .groupby(["year", "compartment"])[
+                    ["policy_compartment_population", "control_compartment_population"]
+                ]
+                .sum()
+            )
+            scenario_results = scenario_results.join(population_diff, how="outer")
+
+            for parameter, value in scenario_parameters[scenario].items():
+                scenario_results[parameter] = value
+            sweep_results.append(scenario_results.reset_index())
+
+        if not sweep_results:
+            return pd.DataFrame()
+        sweep_results_df = pd.concat(sweep_results, ignore_index=True)
+        parameter_columns = list(next(iter(scenario_parameters.values()), {}))
+        return sweep_results_df[
+            parameter_columns
+            + [
+                column
+                for column in sweep_results_df.columns
+                if column not in parameter_columns
+            ]
+        ]
 
     @classmethod
     def _prep_for_upload(
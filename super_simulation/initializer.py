@@ -20,13 +20,16 @@ import logging
 from datetime import datetime
 from typing import Callable, Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
 from super_simulation.time_converter import TimeConverter
 from utils import (
     ignite_bq_utils,
+    parquet_input_utils,
     spark_bq_utils,
 )
+from utils.query_cache import DEFAULT_QUERY_CACHE_DIRECTORY, QueryResultCache
 
 
 @dataclasses.dataclass
@@ -48,6 +51,41 @@ class UserInputs:
     speed_run: Optional[bool] = None
     # Optional alternative function to handle cross-flows between SubSimulations
     cross_flow_function: Optional[str] = None
+    # True if each SubSimulation should step all of its compartments together as stacked arrays
+    use_matrix_engine: Optional[bool] = None
+    # Number of worker processes to fit the admissions ARIMA models in, fit in the main process if not set
+    arima_fit_workers: Optional[int] = None
+    # True if fitted ARIMA models should be reused from an on-disk cache, defaults to True for runs that build
+    # several simulations (policy, backfill, and baseline over time runs) and False otherwise
+    use_arima_fit_cache: Optional[bool] = None
+    # Directory of the on-disk ARIMA fit cache, defaults to DEFAULT_ARIMA_FIT_CACHE_DIRECTORY
+    arima_fit_cache_directory: Optional[str] = None
+    # How to fit the admissions ARIMA models: "statsmodels" (default) or "closed_form" to fit all of the models
+    # in one vectorized call
+    arima_fit_backend: Optional[str] = None
+    # Number of the closed_form ARIMA fits of each batch also fit with statsmodels to check the closed_form
+    # forecasts, see predicted_admissions.check_closed_form_backend(). Only for the closed_form backend, off if not set
+    arima_fit_check_sample_size: Optional[int] = None
+    # True if the control and policy scenarios of a policy run should be built and run at the same time in worker
+    # processes. Only the population projections are returned from the workers.
+    concurrent_scenarios: Optional[bool] = None
+    # True if the simulation state at the start_time_step should be restored from an on-disk cache keyed by the
+    # content of the inputs instead of stepping through the warm-up, defaults to False
+    use_warm_start_cache: Optional[bool] = None
+    # Directory of the on-disk warm start cache, defaults to DEFAULT_WARM_START_CACHE_DIRECTORY
+    warm_start_cache_directory: Optional[str] = None
+    # Tolerance below which the cohorts and outflows of every compartment are considered converged and the remaining
+    # time steps of the projection are extrapolated instead of simulated, see PopulationSimulation.step_forward().
+    # Off if not set, check a tolerance with `python -m scripts.check_steady_state`
+    steady_state_tolerance: Optional[float] = None
+    # True if the cohorts at the start_time_step should be computed from the admissions, transition tables, and
+    # population data instead of stepping through the warm-up from the first relevant time step, defaults to False
+    use_equilibrium_initialization: Optional[bool] = None
+    # True if the BigQuery input tables should be read through an on-disk cache that only downloads a table again
+    # once newer data was uploaded, defaults to False
+    use_query_cache: Optional[bool] = None
+    # Directory of the on-disk BigQuery result cache, defaults to DEFAULT_QUERY_CACHE_DIRECTORY
+    query_cache_directory: Optional[str] = None
 
 
 @dataclasses.dataclass
@@ -109,6 +147,9 @@ class MicroSimulationDataInputs:
     # Optional table name for population totals that should be excluded from the
     # predicted population output for certain compartments
     excluded_population_data: Optional[str] = None
+    # Optional directory with a local Parquet mirror of the BigQuery tables, read
+    # instead of BigQuery when set
+    local_input_directory: Optional[str] = None
 
 
 @dataclasses.dataclass
@@ -117,6 +158,96 @@ class MacroSimulationDataInputs:
 
     # State/policy specific string used for downloading and uploading the data
     big_query_simulation_tag: str
+    # Optional directory with a local Parquet mirror of the BigQuery tables, read
+    # instead of BigQuery when set
+    local_input_directory: Optional[str] = None
+
+
+class MicroSimulationInputStore:
+    """
+    Microsim input tables partitioned by run_date. Each partition is loaded, hydrated, and completed with the
+    terminal compartment rows the first time a simulation asks for it, and kept for the later simulations.
+    """
+
+    def __init__(
+        self,
+        data_inputs_params: MicroSimulationDataInputs,
+        read_table_data: Callable[[str, Optional[str]], pd.DataFrame],
+        read_run_dates: Callable[[str], pd.Series],
+    ) -> None:
+        self.data_inputs_params = data_inputs_params
+        # Load the rows of a table for one run date, given as a "YYYY-MM-DD" string
+        self.read_table_data = read_table_data
+        # Load the distinct run dates of a table
+        self.read_run_dates = read_run_dates
+        self.partitions: Dict[Tuple[str, pd.Timestamp], pd.DataFrame] = {}
+        self.latest_run_dates: Dict[str, pd.Timestamp] = {}
+
+    def get_admissions_data(self, run_date: Union[str, datetime]) -> pd.DataFrame:
+        return self._get_partition(
+            self.data_inputs_params.admissions_data,
+            run_date,
+            lambda admissions_data: Initializer.fully_hydrate_admissions(
+                admissions_data, True
+            ),
+        )
+
+    def get_population_data(self, run_date: Union[str, datetime]) -> pd.DataFrame:
+        return self._get_partition(self.data_inputs_params.population_data, run_date)
+
+    def get_transitions_data(self, run_date: Union[str, datetime]) -> pd.DataFrame:
+        # add extra transitions from the RELEASE compartment
+        return self._get_partition(
+            self.data_inputs_params.remaining_sentence_data,
+            run_date,
+            ignite_bq_utils.add_remaining_sentence_rows,
+        )
+
+    def get_microsim_data(self, run_date: Union[str, datetime]) -> pd.DataFrame:
+        return self._get_partition(
+            self.data_inputs_params.transitions_data,
+            run_date,
+            ignite_bq_utils.add_transition_rows,
+        )
+
+    def get_excluded_population_data(
+        self, run_date: Union[str, datetime]
+    ) -> pd.DataFrame:
+        if self.data_inputs_params.excluded_population_data is None:
+            return pd.DataFrame()
+        return self._get_partition(
+            self.data_inputs_params.excluded_population_data, run_date
+        )
+
+    def get_latest_admissions_run_date(self) -> pd.Timestamp:
+        return self._get_latest_run_date(self.data_inputs_params.admissions_data)
+
+    def get_latest_population_run_date(self) -> pd.Timestamp:
+        return self._get_latest_run_date(self.data_inputs_params.population_data)
+
+    def _get_latest_run_date(self, table_name: str) -> pd.Timestamp:
+        if table_name not in self.latest_run_dates:
+            self.latest_run_dates[table_name] = pd.to_datetime(
+                self.read_run_dates(table_name)
+            ).max()
+        return self.latest_run_dates[table_name]
+
+    def _get_partition(
+        self,
+        table_name: str,
+        run_date: Union[str, datetime],
+        prepare: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    ) -> pd.DataFrame:
+        """Return the rows of `table_name` for `run_date`, loading and preparing them on the first request"""
+        partition_key = (table_name, pd.Timestamp(run_date))
+        if partition_key not in self.partitions:
+            table_data = self.read_table_data(
+                table_name, partition_key[1].strftime("%Y-%m-%d")
+            )
+            if prepare is not None and not table_data.empty:
+                table_data = prepare(table_data)
+            self.partitions[partition_key] = table_data
+        return self.partitions[partition_key]
 
 
 class Initializer:
@@ -136,6 +267,8 @@ class Initializer:
         self.time_converter = time_converter
 
         self.user_inputs = user_inputs
+        # run_date partitions of the microsim input tables, None for the macrosim
+        self.microsim_input_store: Optional[MicroSimulationInputStore] = None
         self.data_inputs = self._raw_data_inputs_from_data_inputs(
             data_inputs_params, compartments_architecture, microsim
         )
@@ -227,10 +360,10 @@ class Initializer:
         """Pull historical admissions data for Validator.calculate_admissions_error"""
         if self.data_inputs.microsim:
             # Use the most up-to-date admissions to compute the simulation error
-            return self.data_inputs.admissions_data[
-                self.data_inputs.admissions_data.run_date
-                == self.data_inputs.admissions_data.run_date.max()
-            ]
+            microsim_input_store = self._get_microsim_input_store()
+            return microsim_input_store.get_admissions_data(
+                microsim_input_store.get_latest_admissions_run_date()
+            )
         return self.data_inputs.admissions_data
 
     def get_data_inputs(
@@ -241,24 +374,18 @@ class Initializer:
             raise ValueError("Cannot override run_date for Macrosimulation.")
 
         if self.data_inputs.microsim:
-            run_date = run_date_override or self.user_inputs.run_date
+            run_date = run_date_override or self._get_run_date()
+            microsim_input_store = self._get_microsim_input_store()
             return SimulationInputData(
                 compartments_architecture=self.data_inputs.compartments_architecture,
                 microsim=self.data_inputs.microsim,
-                admissions_data=self.data_inputs.admissions_data[
-                    self.data_inputs.admissions_data.run_date == run_date
-                ],
+                admissions_data=microsim_input_store.get_admissions_data(run_date),
                 # Use the most recent total population data
-                population_data=self.data_inputs.population_data[
-                    self.data_inputs.population_data.run_date
-                    == self.data_inputs.population_data.run_date.max()
-                ],
-                transitions_data=self.data_inputs.transitions_data[
-                    self.data_inputs.transitions_data.run_date == run_date
-                ],
-                microsim_data=self.data_inputs.microsim_data[
-                    self.data_inputs.microsim_data.run_date == run_date
-                ],
+                population_data=microsim_input_store.get_population_data(
+                    microsim_input_store.get_latest_population_run_date()
+                ),
+                transitions_data=microsim_input_store.get_transitions_data(run_date),
+                microsim_data=microsim_input_store.get_microsim_data(run_date),
                 excluded_population_data=self.get_excluded_pop_data(),
                 should_initialize_compartment_populations=self.data_inputs.should_initialize_compartment_populations,
                 should_scale_populations_after_step=self.data_inputs.should_scale_populations_after_step,
@@ -280,12 +407,16 @@ class Initializer:
         Return the size of the population that should be excluded per compartment at
         the first time step of the simulation
         """
-        excluded_pop = self.data_inputs.excluded_population_data
-        if self.data_inputs.microsim & (not excluded_pop.empty):
-            # Only return the excluded pop for the model run date and starting time step
+        if not self.data_inputs.microsim:
+            return self.data_inputs.excluded_population_data
+
+        # Only return the excluded pop for the model run date and starting time step
+        excluded_pop = self._get_microsim_input_store().get_excluded_population_data(
+            self._get_run_date()
+        )
+        if not excluded_pop.empty:
             excluded_pop = excluded_pop[
-                (excluded_pop.time_step == self.user_inputs.start_time_step)
-                & (excluded_pop.run_date == self.user_inputs.run_date)
+                excluded_pop.time_step == self.user_inputs.start_time_step
             ]
         return excluded_pop
 
@@ -293,11 +424,10 @@ class Initializer:
         self,
     ) -> Tuple[pd.DataFrame, pd.DataFrame]:
         excluded_pop = self.get_excluded_pop_data()
-        total_pop = self.data_inputs.population_data
-        total_pop = total_pop[
-            (total_pop.time_step == self.user_inputs.start_time_step)
-            & (total_pop.run_date == self.user_inputs.run_date)
-        ]
+        total_pop = self._get_microsim_input_store().get_population_data(
+            self._get_run_date()
+        )
+        total_pop = total_pop[total_pop.time_step == self.user_inputs.start_time_step]
         return excluded_pop, total_pop
 
     def get_inputs_for_microsim_baseline_over_time(
@@ -312,6 +442,16 @@ class Initializer:
             ] = self.time_converter.convert_timestamp_to_time_step(start_date)
         return data_input_dict, first_relevant_time_step_dict
 
+    def _get_run_date(self) -> str:
+        if self.user_inputs.run_date is None:
+            raise ValueError("run_date must be set for the microsimulation")
+        return self.user_inputs.run_date
+
+    def _get_microsim_input_store(self) -> MicroSimulationInputStore:
+        if self.microsim_input_store is None:
+            raise ValueError("Microsim input tables are only loaded for the microsim")
+        return self.microsim_input_store
+
     def set_override_cross_flow_function(
         self, cross_flow_function: Callable[[pd.DataFrame, int], pd.DataFrame]
     ) -> None:
@@ -331,50 +471,79 @@ class Initializer:
 
         # For each shell compartment, complete data so that every time step between
         # MIN(time_step) and MAX(time_step) has data (i.e. fill in 0s)
-        time_range_per_compartment = admissions_data.groupby(
-            fully_hydrated_columns, as_index=False
-        )["time_step"].agg(["min", "max"])
-        time_range_per_compartment["time_step"] = time_range_per_compartment.apply(
-            lambda row: range(row["min"], row["max"] + 1), axis=1
+        admissions_groups = admissions_data.groupby(fully_hydrated_columns)
+        time_range_per_compartment = admissions_groups["time_step"].agg(["min", "max"])
+        min_time_steps = time_range_per_compartment["min"].to_numpy(dtype=int)
+        num_time_steps = time_range_per_compartment["max"].to_numpy(dtype=int) - (
+            min_time_steps - 1
+        )
+        num_groups = len(num_time_steps)
+
+        # Position of each admissions record in the complete (group x time_step) grid, which
+        # lists every time step of each group range in group order and then time step order.
+        # Records without a group (null keys) are dropped like in the groupby
+        group_offsets = np.cumsum(num_time_steps) - num_time_steps
+        record_groups = admissions_groups.ngroup()
+        has_group = record_groups.notna().to_numpy()
+        record_groups = record_groups[has_group].to_numpy(dtype=int)
+        record_positions = (
+            group_offsets[record_groups]
+            + admissions_data["time_step"].to_numpy(dtype=int)[has_group]
+            - min_time_steps[record_groups]
+        )
+
+        # Every grid cell gets one row per matching record, or a single empty row
+        grid_size = int(num_time_steps.sum())
+        cell_groups = np.repeat(np.arange(num_groups), num_time_steps)
+        cell_time_steps = (
+            np.arange(grid_size)
+            - group_offsets[cell_groups]
+            + min_time_steps[cell_groups]
         )
-        # Collect the total compartment & admissions combinations
-        # unique_compartment_admissions = admissions_data.groupby(fully_hydrated_columns + ["admissions_to"],
-        #                                                     as_index=False).size()
-        # unique_compartment_admissions.drop("size", axis=1, inplace=True)
-
-        # Merge the compartment/admissions to get the entire set of compartments, admissions, and time steps
-        # time_range_per_compartment = unique_compartment_admissions.merge(time_range_per_compartment,
-        #                                  on=fully_hydrated_columns,
-        #                                  how="left")
-        time_range_per_compartment = time_range_per_compartment.explode("time_step")[
-            ["time_step"]
-        ].astype(int)
-
-        fully_hydrated_data = time_range_per_compartment.merge(
-            admissions_data[
-                fully_hydrated_columns + ["time_step", "cohort_population"]
-            ],
-            on=["time_step", "admission_to"] + fully_hydrated_columns,
-            how="left",
+        records_per_cell = np.bincount(record_positions, minlength=grid_size)
+        rows_per_cell = np.maximum(records_per_cell, 1)
+        row_groups = np.repeat(cell_groups, rows_per_cell)
+
+        # Place the records in row order, keeping the input order of records in the same cell
+        record_order = np.argsort(record_positions, kind="stable")
+        sorted_positions = record_positions[record_order]
+        first_cell_rows = np.cumsum(rows_per_cell) - rows_per_cell
+        first_cell_records = np.cumsum(records_per_cell) - records_per_cell
+        record_rows = (
+            first_cell_rows[sorted_positions]
+            + np.arange(len(sorted_positions))
+            - first_cell_records[sorted_positions]
         )
-        fully_hydrated_data.fillna(0, inplace=True)
+        cohort_population = np.zeros(len(row_groups))
+        cohort_population[record_rows] = admissions_data["cohort_population"].to_numpy(
+            dtype=float
+        )[has_group][record_order]
+
+        fully_hydrated_data = time_range_per_compartment.index[row_groups].to_frame(
+            index=False
+        )
+        fully_hydrated_data.insert(
+            0, "time_step", np.repeat(cell_time_steps, rows_per_cell)
+        )
+        # The group keys and time steps come from the grid, so only the populations can be missing
+        cohort_population[np.isnan(cohort_population)] = 0
+        fully_hydrated_data["cohort_population"] = cohort_population
 
         # Raise a warning if there are disaggregations without admissions records for more
         # than the MISSING_EVENT_THRESHOLD percent of admissions per compartment
-        fully_hydrated_data[
-            "missing_admission"
-        ] = fully_hydrated_data.cohort_population.isnull()
-        number_of_missing_events = fully_hydrated_data.groupby(
-            fully_hydrated_columns
-        ).agg({"missing_admission": ["sum", "size"]})
-        number_of_missing_events["percent_missing"] = (
-            number_of_missing_events["missing_admission", "sum"]
-            / number_of_missing_events["missing_admission", "size"]
+        percent_missing = pd.Series(
+            np.bincount(
+                row_groups,
+                weights=fully_hydrated_data.cohort_population.isnull(),
+                minlength=num_groups,
+            )
+            / np.bincount(row_groups, minlength=num_groups),
+            index=time_range_per_compartment.index,
+            name="percent_missing",
         )
-        sparse_disaggregations = number_of_missing_events[
-            number_of_missing_events["percent_missing"]
-            > Initializer.MISSING_EVENT_THRESHOLD
-        ]["percent_missing"]
+        sparse_disaggregations = percent_missing[
+            percent_missing > Initializer.MISSING_EVENT_THRESHOLD
+        ]
         if microsim:
             sparse_disaggregations = sparse_disaggregations.unstack("run_date")
         if not sparse_disaggregations.empty:
@@ -385,10 +554,6 @@ class Initializer:
                 100 * sparse_disaggregations,
             )
 
-        # Fill the total population with 0 and remove the `missing_admission` column
-        fully_hydrated_data.drop("missing_admission", axis=1, inplace=True)
-        fully_hydrated_data.fillna(0, inplace=True)
-
         # Return the fully hydrated admissions data with a standard column ordering
         return fully_hydrated_data[
             ["time_step"] + fully_hydrated_columns + ["cohort_population"]
@@ -413,20 +578,40 @@ class Initializer:
             f"Cannot initialize {microsim=} with {type(data_inputs_params)=}!"
         )
 
+    def _get_query_cache(self) -> Optional[QueryResultCache]:
+        """Return the cache the BigQuery input tables are read through, or None if it is not enabled"""
+        if not self.user_inputs.use_query_cache:
+            return None
+        return QueryResultCache(
+            self.user_inputs.query_cache_directory or DEFAULT_QUERY_CACHE_DIRECTORY
+        )
+
     def _microsim_data_inputs_to_raw_data_inputs(
         self,
         big_query_params: MicroSimulationDataInputs,
         compartments_architecture: Dict[str, str],
     ) -> SimulationInputData:
         """Helper function for _raw_data_inputs_from_data_inputs()"""
-
-        def read_table_data(table_name: str) -> pd.DataFrame:
-            table_data = ignite_bq_utils.load_ignite_table_from_big_query(
-                big_query_params.project_id,
-                big_query_params.input_dataset,
-                table_name,
-                big_query_params.state_code,
-            )
+        query_cache = self._get_query_cache()
+
+        def read_table_data(table_name: str, run_date: Optional[str]) -> pd.DataFrame:
+            if big_query_params.local_input_directory is not None:
+                table_data = parquet_input_utils.load_ignite_table_from_parquet(
+                    big_query_params.local_input_directory,
+                    big_query_params.input_dataset,
+                    table_name,
+                    big_query_params.state_code,
+                    run_date,
+                )
+            else:
+                table_data = ignite_bq_utils.load_ignite_table_from_big_query(
+                    big_query_params.project_id,
+                    big_query_params.input_dataset,
+                    table_name,
+                    big_query_params.state_code,
+                    query_cache,
+                    run_date,
+                )
             if "time_step" in table_data.columns:
                 # Convert the time_step from a timestamp to a relative int value
                 table_data["time_step"] = table_data["time_step"].apply(
@@ -436,32 +621,34 @@ class Initializer:
                 table_data["run_date"] = pd.to_datetime(table_data["run_date"])
             return table_data
 
-        if big_query_params.excluded_population_data is None:
-            excluded_population_data = pd.DataFrame()
-        else:
-            excluded_population_data = read_table_data(
-                big_query_params.excluded_population_data
+        def read_run_dates(table_name: str) -> pd.Series:
+            if big_query_params.local_input_directory is not None:
+                return parquet_input_utils.load_ignite_run_dates_from_parquet(
+                    big_query_params.local_input_directory,
+                    big_query_params.input_dataset,
+                    table_name,
+                    big_query_params.state_code,
+                )
+            return ignite_bq_utils.load_ignite_run_dates_from_big_query(
+                big_query_params.project_id,
+                big_query_params.input_dataset,
+                table_name,
+                big_query_params.state_code,
+                query_cache,
             )
 
-        sparse_admissions = read_table_data(big_query_params.admissions_data)
-        admissions_data = self.fully_hydrate_admissions(
-            sparse_admissions,
-            True,
+        # The tables are only loaded one run_date at a time when a simulation asks for them
+        self.microsim_input_store = MicroSimulationInputStore(
+            big_query_params, read_table_data, read_run_dates
         )
 
         return SimulationInputData(
             compartments_architecture=compartments_architecture,
             microsim=True,
-            admissions_data=admissions_data,
-            population_data=read_table_data(big_query_params.population_data),
-            # add extra transitions from the RELEASE compartment
-            transitions_data=ignite_bq_utils.add_remaining_sentence_rows(
-                read_table_data(big_query_params.remaining_sentence_data)
-            ),
-            microsim_data=ignite_bq_utils.add_transition_rows(
-                read_table_data(big_query_params.transitions_data)
-            ),
-            excluded_population_data=excluded_population_data,
+            admissions_data=pd.DataFrame(),
+            population_data=pd.DataFrame(),
+            transitions_data=pd.DataFrame(),
+            microsim_data=pd.DataFrame(),
             should_initialize_compartment_populations=True,
             should_scale_populations_after_step=False,
         )
@@ -472,10 +659,17 @@ class Initializer:
         compartments_architecture: Dict[str, str],
     ) -> SimulationInputData:
         """Helper function for _raw_data_inputs_from_data_inputs()"""
+        query_cache = self._get_query_cache()
 
         def read_table_data(table_bq_name: str) -> pd.DataFrame:
+            if data_inputs_params.local_input_directory is not None:
+                return parquet_input_utils.load_spark_table_from_parquet(
+                    data_inputs_params.local_input_directory,
+                    table_bq_name,
+                    data_inputs_params.big_query_simulation_tag,
+                )
             table_data = spark_bq_utils.load_spark_table_from_big_query(
-                table_bq_name, data_inputs_params.big_query_simulation_tag
+                table_bq_name, data_inputs_params.big_query_simulation_tag, query_cache
             )
             return table_data
 
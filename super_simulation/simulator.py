@@ -15,16 +15,28 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # =============================================================================
 """SuperSimulation composed object for initializing simulations."""
+import dataclasses
 import logging
+import multiprocessing
+import os
+import resource
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from population_simulation.monte_carlo_projection import (
+    DEFAULT_TRANSITION_UNCERTAINTY,
+    MonteCarloProjection,
+)
 from population_simulation.population_simulation import PopulationSimulation
 from population_simulation.population_simulation_factory import PopulationSimulationFactory
+from population_simulation.population_simulation_results import (
+    PopulationSimulationResults,
+)
 from shell_compartment import ShellCompartment
 from spark_policy import SparkPolicy
 from super_simulation.initializer import (
@@ -33,6 +45,340 @@ from super_simulation.initializer import (
 )
 from super_simulation.super_simulation_results import SuperSimulationResults
 from super_simulation.time_converter import TimeConverter
+from utils.arima_fit_cache import (
+    DEFAULT_ARIMA_FIT_CACHE_DIRECTORY,
+    ArimaFitCache,
+)
+from utils.result_sink import OUTFLOWS_TABLE, POPULATION_PROJECTIONS_TABLE, ResultSink
+
+
+@dataclasses.dataclass
+class ScenarioResults:
+    """Compact results of a scenario run in a worker process"""
+
+    # numeric population projection columns
+    numeric_columns: Dict[str, np.ndarray]
+    # label population projection columns as integer codes into their unique labels
+    label_columns: Dict[str, Tuple[np.ndarray, np.ndarray]]
+    # population projection column names in order
+    columns: List[str]
+    # predicted admissions warnings raised while building and running the scenario
+    warnings: List[str]
+
+    @classmethod
+    def from_population_simulation(
+        cls, pop_simulation: PopulationSimulation, warnings: List[str]
+    ) -> "ScenarioResults":
+        population_projections = pop_simulation.get_population_projections()
+        numeric_columns = {}
+        label_columns = {}
+        for column in population_projections.columns:
+            values = population_projections[column]
+            if pd.api.types.is_numeric_dtype(values):
+                numeric_columns[column] = values.to_numpy()
+            else:
+                codes, labels = pd.factorize(values)
+                label_columns[column] = (codes.astype(np.int32), np.asarray(labels))
+        return cls(
+            numeric_columns,
+            label_columns,
+            list(population_projections.columns),
+            warnings,
+        )
+
+    def get_population_projections(self) -> pd.DataFrame:
+        columns = {
+            column: self.numeric_columns[column]
+            if column in self.numeric_columns
+            else self.label_columns[column][1][self.label_columns[column][0]]
+            for column in self.columns
+        }
+        return pd.DataFrame(columns)
+
+
+# Inputs of the scenarios being run concurrently, inherited by the forked worker processes so the inputs (which can
+# hold lambdas in policies or cross flow functions) never need to be pickled
+_FORKED_SCENARIO_INPUTS: Dict[
+    str,
+    Tuple[
+        UserInputs,
+        SimulationInputData,
+        List[SparkPolicy],
+        int,
+        Optional[ArimaFitCache],
+    ],
+] = {}
+
+
+def _run_forked_scenario(scenario: str) -> ScenarioResults:
+    """Build and run one scenario in a forked worker process"""
+    (
+        user_inputs,
+        data_inputs,
+        policy_list,
+        first_relevant_time_step,
+        arima_fit_cache,
+    ) = _FORKED_SCENARIO_INPUTS[scenario]
+    pop_simulation = PopulationSimulationFactory.build_population_simulation(
+        user_inputs=user_inputs,
+        policy_list=policy_list,
+        first_relevant_time_step=first_relevant_time_step,
+        data_inputs=data_inputs,
+        arima_fit_cache=arima_fit_cache,
+    )
+    pop_simulation.simulate_policies()
+    return ScenarioResults.from_population_simulation(
+        pop_simulation,
+        Simulator.get_predicted_admissions_warnings({scenario: pop_simulation}),
+    )
+
+
+@dataclasses.dataclass
+class PolicySweep:
+    """
+    Policy scenarios forked from one control scenario. Each policy scenario reuses the control transition tables
+    and fitted admissions predictors of the compartments its policies do not change, and starts from a snapshot of
+    the control scenario at its earliest policy time step.
+
+    Nothing before the earliest policy time step depends on the policies. Retroactive policies change the
+    transitions of cohorts that started before their policy time step, but those transitions are only applied from
+    the policy time step on, so a policy scenario can resume from the control cohorts with its own transitions and
+    admissions. Policy scenarios with policies before the start of the simulation share no state with the control
+    scenario and are simulated from the start.
+    """
+
+    user_inputs: UserInputs
+    data_inputs: SimulationInputData
+    first_relevant_time_step: int
+    arima_fit_cache: Optional[ArimaFitCache]
+    # policies of each policy scenario
+    scenario_policies: Dict[str, List[SparkPolicy]]
+    # control scenario, run up to `end_time_step`
+    control_simulation: PopulationSimulation
+    # time step every scenario is simulated up to
+    end_time_step: int
+    # snapshots of the control scenario keyed by the time step they were taken at
+    control_snapshots: Dict[int, Dict[str, Any]]
+
+    @classmethod
+    def run_control(
+        cls,
+        user_inputs: UserInputs,
+        data_inputs: SimulationInputData,
+        first_relevant_time_step: int,
+        arima_fit_cache: Optional[ArimaFitCache],
+        scenario_policies: Dict[str, List[SparkPolicy]],
+    ) -> "PolicySweep":
+        """Run the control scenario, taking a snapshot at the time step every policy scenario is forked at"""
+        control_simulation = PopulationSimulationFactory.build_population_simulation(
+            user_inputs=user_inputs,
+            policy_list=[],
+            first_relevant_time_step=first_relevant_time_step,
+            data_inputs=data_inputs,
+            arima_fit_cache=arima_fit_cache,
+            warm_up=False,
+        )
+        end_time_step = (
+            control_simulation.current_time_step
+            + user_inputs.start_time_step
+            - first_relevant_time_step
+            + control_simulation.projection_time_steps
+        )
+        policy_sweep = cls(
+            user_inputs,
+            data_inputs,
+            first_relevant_time_step,
+            arima_fit_cache,
+            scenario_policies,
+            control_simulation,
+            end_time_step,
+            {},
+        )
+
+        # the control scenario is warmed up to the start_time_step through PopulationSimulationFactory, and only
+        # stepped forward by hand to fork policy scenarios before the start_time_step. The warm start cache and
+        # the equilibrium initialization only provide the state at the start_time_step, so with either of them
+        # those policy scenarios are warmed up on their own
+        build_time_step = control_simulation.current_time_step
+        warm_up_end_time_step = (
+            build_time_step + user_inputs.start_time_step - first_relevant_time_step
+        )
+        fork_during_warm_up = not (
+            user_inputs.use_warm_start_cache
+            or user_inputs.use_equilibrium_initialization
+        )
+
+        checkpoint_time_steps = {
+            policy_sweep.get_checkpoint_time_step(policy_list)
+            for policy_list in scenario_policies.values()
+        }
+        for time_step in sorted(checkpoint_time_steps):
+            if time_step < control_simulation.current_time_step:
+                continue
+            if time_step < warm_up_end_time_step:
+                if not fork_during_warm_up:
+                    continue
+            elif control_simulation.current_time_step == build_time_step:
+                policy_sweep._warm_up_control()
+            control_simulation.step_forward(
+                time_step - control_simulation.current_time_step
+            )
+            policy_sweep.control_snapshots[
+                time_step
+            ] = control_simulation.get_snapshot()
+        if control_simulation.current_time_step == build_time_step:
+            policy_sweep._warm_up_control()
+        control_simulation.simulate_policies(
+            end_time_step - control_simulation.current_time_step
+        )
+        return policy_sweep
+
+    def _warm_up_control(self) -> None:
+        """Run the control scenario up to the start_time_step, see `PopulationSimulationFactory`"""
+        PopulationSimulationFactory.warm_up_population_simulation(
+            self.control_simulation,
+            self.user_inputs,
+            self.data_inputs,
+            [],
+            self.first_relevant_time_step,
+        )
+
+    def get_checkpoint_time_step(self, policy_list: List[SparkPolicy]) -> int:
+        """Return the time step a policy scenario can be forked from the control scenario at"""
+        return min(
+            [policy.policy_time_step for policy in policy_list] + [self.end_time_step]
+        )
+
+    def run_scenario(self, scenario: str) -> PopulationSimulation:
+        """Build one policy scenario from the control scenario and run it to the end of the projection"""
+        policy_list = self.scenario_policies[scenario]
+        checkpoint_time_step = self.get_checkpoint_time_step(policy_list)
+        # policy scenarios without a control snapshot to fork from are warmed up on their own
+        pop_simulation = PopulationSimulationFactory.build_population_simulation(
+            user_inputs=self.user_inputs,
+            policy_list=policy_list,
+            first_relevant_time_step=self.first_relevant_time_step,
+            data_inputs=self.data_inputs,
+            arima_fit_cache=self.arima_fit_cache,
+            warm_up=checkpoint_time_step not in self.control_snapshots,
+            shared_population_simulation=self.control_simulation,
+        )
+        if checkpoint_time_step in self.control_snapshots:
+            pop_simulation.restore_snapshot(
+                self.control_snapshots[checkpoint_time_step]
+            )
+        pop_simulation.simulate_policies(
+            self.end_time_step - pop_simulation.current_time_step
+        )
+        return pop_simulation
+
+
+# Policy sweep being run, inherited by the forked worker processes so the control scenario and the policies never
+# need to be pickled
+_FORKED_POLICY_SWEEPS: List[PolicySweep] = []
+
+
+def _run_forked_policy_sweep_scenario(scenario: str) -> ScenarioResults:
+    """Build and run one policy scenario of a policy sweep in a forked worker process"""
+    pop_simulation = _FORKED_POLICY_SWEEPS[-1].run_scenario(scenario)
+    return ScenarioResults.from_population_simulation(
+        pop_simulation,
+        Simulator.get_predicted_admissions_warnings({scenario: pop_simulation}),
+    )
+
+
+@dataclasses.dataclass
+class CohortHydrationRuns:
+    """
+    Baseline runs that only differ in their first relevant time step. Every run reuses the transition tables and
+    fitted admissions predictors of the run with the earliest first relevant time step, whose admissions
+    predictions cover the time steps of all the others.
+    """
+
+    user_inputs: UserInputs
+    data_inputs: SimulationInputData
+    arima_fit_cache: Optional[ArimaFitCache]
+    # run with the earliest first relevant time step, built but not stepped forward yet
+    shared_simulation: PopulationSimulation
+    shared_first_relevant_time_step: int
+    # outflow error kept from each run
+    output_compartment: str
+    outflow_to: str
+    unit: str
+
+    def get_error_summary(self, first_relevant_time_step: int) -> pd.Series:
+        """Run the baseline from `first_relevant_time_step` and return its outflow error per sub group"""
+        if first_relevant_time_step == self.shared_first_relevant_time_step:
+            pop_simulation = self.shared_simulation
+            PopulationSimulationFactory.warm_up_population_simulation(
+                pop_simulation,
+                self.user_inputs,
+                self.data_inputs,
+                [],
+                first_relevant_time_step,
+            )
+        else:
+            pop_simulation = PopulationSimulationFactory.build_population_simulation(
+                user_inputs=self.user_inputs,
+                policy_list=[],
+                first_relevant_time_step=first_relevant_time_step,
+                data_inputs=self.data_inputs,
+                arima_fit_cache=self.arima_fit_cache,
+                shared_population_simulation=self.shared_simulation,
+            )
+        pop_simulation.simulate_policies()
+        return pop_simulation.get_outflow_error_summary(
+            self.output_compartment, self.outflow_to, self.unit
+        )
+
+
+# Cohort hydration runs being computed, inherited by the forked worker processes
+_FORKED_COHORT_HYDRATION_RUNS: List[CohortHydrationRuns] = []
+
+
+def _get_forked_cohort_hydration_error(first_relevant_time_step: int) -> pd.Series:
+    """Run one cohort hydration baseline in a forked worker process"""
+    return _FORKED_COHORT_HYDRATION_RUNS[-1].get_error_summary(first_relevant_time_step)
+
+
+# Inputs of the microsim run dates being run concurrently, inherited by the forked worker processes
+_FORKED_MICROSIM_BASELINE_INPUTS: Dict[
+    str, Tuple[UserInputs, SimulationInputData, int, Optional[ArimaFitCache]]
+] = {}
+
+
+def _run_forked_microsim_baseline(
+    simulation_name: str,
+) -> Tuple[PopulationSimulationResults, List[str], int]:
+    """
+    Build and run the baseline of one run date in a forked worker process. Returns its population projections and
+        outflows, the predicted admissions warnings, and the peak resident memory of the worker in bytes
+    """
+    (
+        user_inputs,
+        data_inputs,
+        first_relevant_time_step,
+        arima_fit_cache,
+    ) = _FORKED_MICROSIM_BASELINE_INPUTS[simulation_name]
+    pop_simulation = PopulationSimulationFactory.build_population_simulation(
+        user_inputs=user_inputs,
+        policy_list=[],
+        first_relevant_time_step=first_relevant_time_step,
+        data_inputs=data_inputs,
+        arima_fit_cache=arima_fit_cache,
+    )
+    pop_simulation.simulate_policies()
+
+    # the population data is already held by the parent process
+    results = dataclasses.replace(
+        pop_simulation.get_results(), population_data=pd.DataFrame()
+    )
+    return (
+        results,
+        Simulator.get_predicted_admissions_warnings({simulation_name: pop_simulation}),
+        # ru_maxrss is in kilobytes on Linux
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    )
 
 
 class Simulator:
@@ -40,6 +386,10 @@ class Simulator:
 
     def __init__(self, microsim: bool, time_converter: TimeConverter) -> None:
         self.pop_simulations: Dict[str, PopulationSimulation] = {}
+        # Compact results of the scenarios run in worker processes, which have no PopulationSimulation
+        self.scenario_results: Dict[str, ScenarioResults] = {}
+        # Outputs of the simulations run in worker processes that are kept without their PopulationSimulation
+        self.simulation_results: Dict[str, PopulationSimulationResults] = {}
         self.microsim = microsim
         self.time_converter = time_converter
         self.results: Optional[SuperSimulationResults] = None
@@ -64,6 +414,10 @@ class Simulator:
         `policy_list` should be a list of SparkPolicy objects to be applied in the policy scenario
         `output_compartment` should be the primary compartment to be graphed at the end (doesn't affect calculation)
         `cost_multipliers` should be a df with one column per disaggregation axis and a column `multiplier`
+
+        If `user_inputs.concurrent_scenarios` is True, the control and policy scenarios are built and run at the same
+        time in worker processes. Only their population projections are returned to this process, so the
+        PopulationSimulations are not available afterwards.
         """
         if output_compartment not in data_inputs.compartments_architecture.keys():
             raise ValueError(
@@ -71,33 +425,36 @@ class Simulator:
                 {data_inputs.compartments_architecture.keys()}"
             )
 
-        simulation_groups = list(data_inputs.transitions_data.simulation_group.unique())
-        for policy in policy_list:
-            if policy.simulation_group not in simulation_groups:
-                raise ValueError(
-                    f"Subgroup '{policy.simulation_group}' in policy function not found in simulation groups \
-                    {simulation_groups}"
-                )
-
+        self._check_policy_simulation_groups(data_inputs, policy_list)
         self._reset_pop_simulations()
 
-        self.pop_simulations["control"] = self._build_population_simulation(
-            user_inputs, data_inputs, [], first_relevant_time_step
-        )
-
-        self.pop_simulations["policy"] = self._build_population_simulation(
-            user_inputs, data_inputs, policy_list, first_relevant_time_step
-        )
-
-        self.pop_simulations["policy"].simulate_policies()
-        self.pop_simulations["control"].simulate_policies()
+        arima_fit_cache = self._get_arima_fit_cache(user_inputs, batch_run=True)
+        scenario_policies = {"control": [], "policy": policy_list}
+        if user_inputs.concurrent_scenarios and self._can_fork_workers():
+            self.scenario_results = self._run_concurrent_scenarios(
+                {
+                    scenario: (
+                        user_inputs,
+                        data_inputs,
+                        scenario_policy_list,
+                        first_relevant_time_step,
+                        arima_fit_cache,
+                    )
+                    for scenario, scenario_policy_list in scenario_policies.items()
+                }
+            )
+        else:
+            self._simulate_policy_from_control_checkpoint(
+                user_inputs,
+                data_inputs,
+                first_relevant_time_step,
+                policy_list,
+                arima_fit_cache,
+            )
 
         self.super_sim_results = SuperSimulationResults()
 
-        results = {
-            scenario: simulation.get_population_projections()
-            for scenario, simulation in self.pop_simulations.items()
-        }
+        results = self._get_scenario_population_projections()
         results = {
             i: results[i][results[i]["time_step"] >= user_inputs.start_time_step]
             for i in results
@@ -110,6 +467,113 @@ class Simulator:
         # self.graph_outflow_results()
         return self._format_simulation_results(user_inputs, collapse_compartments=False)
 
+    def _simulate_policy_from_control_checkpoint(
+        self,
+        user_inputs: UserInputs,
+        data_inputs: SimulationInputData,
+        first_relevant_time_step: int,
+        policy_list: List[SparkPolicy],
+        arima_fit_cache: Optional[ArimaFitCache],
+    ) -> None:
+        """
+        Run the control scenario once and fork the policy scenario from a snapshot of the control state at the
+            earliest policy time step, so the time steps before the policies take effect are only simulated once.
+        """
+        policy_sweep = PolicySweep.run_control(
+            user_inputs,
+            data_inputs,
+            first_relevant_time_step,
+            arima_fit_cache,
+            {"policy": policy_list},
+        )
+        self.pop_simulations["control"] = policy_sweep.control_simulation
+        self.pop_simulations["policy"] = policy_sweep.run_scenario("policy")
+
+    def sweep_policies(
+        self,
+        user_inputs: UserInputs,
+        data_inputs: SimulationInputData,
+        first_relevant_time_step: int,
+        scenario_policies: Dict[str, List[SparkPolicy]],
+        num_workers: Optional[int] = None,
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Run the control scenario once and one policy scenario per entry of `scenario_policies`, each forked from
+            the control scenario at its earliest policy time step. Returns the control and policy populations of
+            every policy scenario, formatted like the output of `simulate_policy()`
+        `scenario_policies` the list of SparkPolicy objects of each policy scenario, keyed by scenario name
+        `num_workers` the number of worker processes to run the policy scenarios in, defaults to the number of
+            CPUs. The policy scenarios are run in this process if it is 1
+
+        Only the control PopulationSimulation is kept, the policy scenarios keep their population projections in
+            `scenario_results`.
+        """
+        self._check_policy_simulation_groups(
+            data_inputs,
+            [
+                policy
+                for policy_list in scenario_policies.values()
+                for policy in policy_list
+            ],
+        )
+        self._reset_pop_simulations()
+
+        policy_sweep = PolicySweep.run_control(
+            user_inputs,
+            data_inputs,
+            first_relevant_time_step,
+            self._get_arima_fit_cache(user_inputs, batch_run=True),
+            scenario_policies,
+        )
+        self.pop_simulations["control"] = policy_sweep.control_simulation
+
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = min(num_workers, len(scenario_policies))
+        if num_workers > 1 and self._can_fork_workers():
+            _FORKED_POLICY_SWEEPS.append(policy_sweep)
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=num_workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                ) as executor:
+                    self.scenario_results = dict(
+                        zip(
+                            scenario_policies,
+                            executor.map(
+                                _run_forked_policy_sweep_scenario, scenario_policies
+                            ),
+                        )
+                    )
+            finally:
+                _FORKED_POLICY_SWEEPS.clear()
+        else:
+            for scenario in scenario_policies:
+                pop_simulation = policy_sweep.run_scenario(scenario)
+                self.scenario_results[
+                    scenario
+                ] = ScenarioResults.from_population_simulation(
+                    pop_simulation,
+                    self.get_predicted_admissions_warnings({scenario: pop_simulation}),
+                )
+
+        # log warnings from ARIMA model
+        self._log_predicted_admissions_warnings()
+
+        control_projections = (
+            policy_sweep.control_simulation.get_population_projections()
+        )
+        return {
+            scenario: self._format_simulation_results(
+                user_inputs,
+                population_projections={
+                    "control": control_projections,
+                    "policy": scenario_results.get_population_projections(),
+                },
+            )
+            for scenario, scenario_results in self.scenario_results.items()
+        }
+
     def simulate_baseline(
         self,
         user_inputs: UserInputs,
@@ -117,12 +581,19 @@ class Simulator:
         display_compartments: List[str],
         first_relevant_time_step: int,
         reset: bool = True,
+        num_replicates: Optional[int] = None,
+        transition_uncertainty: float = DEFAULT_TRANSITION_UNCERTAINTY,
+        replicate_seed: Optional[int] = None,
     ) -> None:
         """
         Calculates a baseline projection, returns transition error for a specific transition
         `display_compartments` are the compartment whose populations you wish to display
         `validation_pairs` should be a dict with key/value pairs corresponding to compartment/outflow_to transitions
             to calculate error for
+        `num_replicates` if provided, the number of Monte Carlo replicates projected from the start time step to
+            add the `compartment_population_min` and `compartment_population_max` intervals to the projection
+        `transition_uncertainty` log-scale standard deviation of the replicate transition perturbations
+        `replicate_seed` seed of the replicate draws, for reproducible intervals
         """
         if reset:
             self._reset_pop_simulations()
@@ -137,10 +608,31 @@ class Simulator:
         self.pop_simulations[
             "baseline_projections"
         ] = self._build_population_simulation(
-            user_inputs, data_inputs, [], first_relevant_time_step
+            user_inputs,
+            data_inputs,
+            [],
+            first_relevant_time_step,
+            self._get_arima_fit_cache(user_inputs, batch_run=False),
         )
 
-        self.pop_simulations["baseline_projections"].simulate_policies()
+        baseline_simulation = self.pop_simulations["baseline_projections"]
+        monte_carlo_projection = None
+        if num_replicates is not None:
+            monte_carlo_projection = MonteCarloProjection(
+                baseline_simulation,
+                num_replicates,
+                transition_uncertainty,
+                seed=replicate_seed,
+            )
+
+        baseline_simulation.simulate_policies()
+
+        if monte_carlo_projection is not None:
+            baseline_simulation.add_population_intervals(
+                monte_carlo_projection.project(
+                    baseline_simulation.projection_time_steps
+                )
+            )
 
         # log warnings from ARIMA model
         self._log_predicted_admissions_warnings()
@@ -178,29 +670,188 @@ class Simulator:
         run_date_data_inputs: Dict[datetime, SimulationInputData],
         run_date_first_relevant_time_step: Dict[datetime, int],
         projection_time_steps_override: Optional[int],
+        num_workers: Optional[int] = None,
+        max_memory_bytes: Optional[int] = None,
+        result_sink: Optional[ResultSink] = None,
     ) -> None:
+        """
+        Run a microsim baseline at every run date
+        `num_workers` if set, the run dates are run in up to that many forked worker processes and only their
+            population projections and outflows are kept, in `simulation_results` or in `result_sink`
+        `max_memory_bytes` optional cap on the combined peak memory of the worker processes. Fewer run dates are
+            run at once once the peak memory of a finished run is known, and one at a time until then. Without
+            worker processes, only the population projections and outflows of each run date are kept, like with
+            worker processes, so the PopulationSimulation of one run date at a time is held in memory
+        `result_sink` optional destination the population projections and outflows of each run date are written to
+            as soon as it finishes instead of being kept in `simulation_results`. The sink is closed once every run
+            date is written
+        """
         self._reset_pop_simulations()
 
         # Change some user_inputs for the validation loop
         if projection_time_steps_override is not None:
             user_inputs.projection_time_steps = projection_time_steps_override
 
-        for start_date, data_inputs in run_date_data_inputs.items():
-            print(start_date)
-            user_inputs.start_time_step = run_date_first_relevant_time_step[start_date]
-            simulation_name = f"baseline_{start_date.date()}"
-            self.pop_simulations[simulation_name] = self._build_population_simulation(
-                user_inputs,
-                data_inputs,
-                [],
-                run_date_first_relevant_time_step[start_date],
+        arima_fit_cache = self._get_arima_fit_cache(user_inputs, batch_run=True)
+        if num_workers is not None and self._can_fork_workers():
+            self._run_concurrent_microsim_baselines(
+                {
+                    f"baseline_{start_date.date()}": (
+                        dataclasses.replace(
+                            user_inputs,
+                            start_time_step=run_date_first_relevant_time_step[
+                                start_date
+                            ],
+                        ),
+                        data_inputs,
+                        run_date_first_relevant_time_step[start_date],
+                        arima_fit_cache,
+                    )
+                    for start_date, data_inputs in run_date_data_inputs.items()
+                },
+                num_workers,
+                max_memory_bytes,
+                result_sink,
             )
+            return
 
-            self.pop_simulations[simulation_name].simulate_policies()
+        keep_simulations = result_sink is None and max_memory_bytes is None
+        warnings: List[str] = []
+        try:
+            for start_date, data_inputs in run_date_data_inputs.items():
+                print(start_date)
+                user_inputs.start_time_step = run_date_first_relevant_time_step[
+                    start_date
+                ]
+                simulation_name = f"baseline_{start_date.date()}"
+                pop_simulation = self._build_population_simulation(
+                    user_inputs,
+                    data_inputs,
+                    [],
+                    run_date_first_relevant_time_step[start_date],
+                    arima_fit_cache,
+                )
+                pop_simulation.simulate_policies()
+
+                if keep_simulations:
+                    self.pop_simulations[simulation_name] = pop_simulation
+                    continue
+                warnings.extend(
+                    w
+                    for w in self.get_predicted_admissions_warnings(
+                        {simulation_name: pop_simulation}
+                    )
+                    if w not in warnings
+                )
+                self._keep_microsim_baseline_results(
+                    simulation_name, pop_simulation.get_results(), result_sink
+                )
+        finally:
+            if result_sink is not None:
+                result_sink.close()
 
         # log warnings from ARIMA model
+        for w in warnings:
+            logging.warning(w)
         self._log_predicted_admissions_warnings()
 
+    def _keep_microsim_baseline_results(
+        self,
+        simulation_name: str,
+        results: PopulationSimulationResults,
+        result_sink: Optional[ResultSink],
+    ) -> None:
+        """
+        Write the population projections and outflows of one microsim run date to `result_sink`, or keep them in
+            `simulation_results` without a sink
+        """
+        if result_sink is not None:
+            result_sink.write_tables(
+                simulation_name,
+                {
+                    POPULATION_PROJECTIONS_TABLE: results.population_projections,
+                    OUTFLOWS_TABLE: results.outflows,
+                },
+            )
+        else:
+            self.simulation_results[simulation_name] = results
+
+    def _run_concurrent_microsim_baselines(
+        self,
+        run_inputs: Dict[
+            str, Tuple[UserInputs, SimulationInputData, int, Optional[ArimaFitCache]]
+        ],
+        num_workers: int,
+        max_memory_bytes: Optional[int],
+        result_sink: Optional[ResultSink],
+    ) -> None:
+        """
+        Run the baseline of each run date in forked worker processes, keeping the results of each run as soon as
+            it finishes
+        """
+        warnings: List[str] = []
+        pending_runs = list(run_inputs)
+        run_memory_bytes = 0
+        _FORKED_MICROSIM_BASELINE_INPUTS.update(run_inputs)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=max(num_workers, 1),
+                mp_context=multiprocessing.get_context("fork"),
+            ) as executor:
+                running: Dict[Future, str] = {}
+                while pending_runs or running:
+                    max_running = self._get_max_concurrent_runs(
+                        num_workers, max_memory_bytes, run_memory_bytes
+                    )
+                    while pending_runs and len(running) < max_running:
+                        simulation_name = pending_runs.pop(0)
+                        running[
+                            executor.submit(
+                                _run_forked_microsim_baseline, simulation_name
+                            )
+                        ] = simulation_name
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        simulation_name = running.pop(future)
+                        results, run_warnings, peak_memory_bytes = future.result()
+                        logging.info("Finished microsim baseline %s", simulation_name)
+                        run_memory_bytes = max(run_memory_bytes, peak_memory_bytes)
+                        warnings.extend(w for w in run_warnings if w not in warnings)
+
+                        self._keep_microsim_baseline_results(
+                            simulation_name,
+                            dataclasses.replace(
+                                results,
+                                population_data=run_inputs[simulation_name][
+                                    1
+                                ].population_data,
+                            ),
+                            result_sink,
+                        )
+        finally:
+            _FORKED_MICROSIM_BASELINE_INPUTS.clear()
+            if result_sink is not None:
+                result_sink.close()
+
+        # log warnings from ARIMA model
+        for w in warnings:
+            logging.warning(w)
+
+    @staticmethod
+    def _get_max_concurrent_runs(
+        num_workers: int, max_memory_bytes: Optional[int], run_memory_bytes: int
+    ) -> int:
+        """
+        Number of runs that can be run at once, given the peak memory of the largest finished run or 0 if no run
+            has finished yet
+        """
+        if max_memory_bytes is None:
+            return max(num_workers, 1)
+        if run_memory_bytes == 0:
+            return 1
+        return max(min(num_workers, max_memory_bytes // run_memory_bytes), 1)
+
     def get_cohort_hydration_simulations(
         self,
         user_inputs: UserInputs,
@@ -214,6 +865,7 @@ class Simulator:
         """
         self._reset_pop_simulations()
 
+        arima_fit_cache = self._get_arima_fit_cache(user_inputs, batch_run=True)
         for time_step in np.arange(range_start, range_end, step_size):
             self.pop_simulations[
                 f"backfill_period_{time_step}_time_steps"
@@ -222,6 +874,7 @@ class Simulator:
                 data_inputs,
                 [],
                 first_relevant_time_step=user_inputs.start_time_step - time_step,
+                arima_fit_cache=arima_fit_cache,
             )
             self.pop_simulations[
                 f"backfill_period_{time_step}_time_steps"
@@ -232,6 +885,95 @@ class Simulator:
 
         return self.pop_simulations
 
+    def get_cohort_hydration_errors(
+        self,
+        user_inputs: UserInputs,
+        data_inputs: SimulationInputData,
+        range_start: int,
+        range_end: int,
+        step_size: float,
+        output_compartment: str,
+        outflow_to: str,
+        unit: str,
+        num_workers: Optional[int] = None,
+    ) -> Dict[str, pd.Series]:
+        """
+        Run the baselines fed to Validator.calculate_cohort_hydration_error and only keep the `output_compartment`
+            to `outflow_to` error per sub group of each run, keyed like the simulations of
+            `get_cohort_hydration_simulations()`
+        `num_workers` the number of worker processes to run the baselines in, defaults to the number of CPUs. The
+            baselines are run in this process if it is 1
+        """
+        self._reset_pop_simulations()
+
+        backfill_periods = {
+            f"backfill_period_{time_step}_time_steps": user_inputs.start_time_step
+            - int(time_step)
+            for time_step in np.arange(range_start, range_end, step_size)
+        }
+        first_relevant_time_steps = sorted(set(backfill_periods.values()))
+        if not first_relevant_time_steps:
+            return {}
+
+        arima_fit_cache = self._get_arima_fit_cache(user_inputs, batch_run=True)
+        cohort_hydration_runs = CohortHydrationRuns(
+            user_inputs,
+            data_inputs,
+            arima_fit_cache,
+            self._build_population_simulation(
+                user_inputs,
+                data_inputs,
+                [],
+                first_relevant_time_steps[0],
+                arima_fit_cache,
+                warm_up=False,
+            ),
+            first_relevant_time_steps[0],
+            output_compartment,
+            outflow_to,
+            unit,
+        )
+
+        # the admissions predictors are shared, so their warnings are all raised while building the first run
+        for warning in self.get_predicted_admissions_warnings(
+            {"cohort_hydration": cohort_hydration_runs.shared_simulation}
+        ):
+            logging.warning(warning)
+
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = min(num_workers, len(first_relevant_time_steps))
+        if num_workers > 1 and self._can_fork_workers():
+            _FORKED_COHORT_HYDRATION_RUNS.append(cohort_hydration_runs)
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=num_workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                ) as executor:
+                    error_summaries = dict(
+                        zip(
+                            first_relevant_time_steps,
+                            executor.map(
+                                _get_forked_cohort_hydration_error,
+                                first_relevant_time_steps,
+                            ),
+                        )
+                    )
+            finally:
+                _FORKED_COHORT_HYDRATION_RUNS.clear()
+        else:
+            error_summaries = {
+                first_relevant_time_step: cohort_hydration_runs.get_error_summary(
+                    first_relevant_time_step
+                )
+                for first_relevant_time_step in first_relevant_time_steps
+            }
+
+        return {
+            backfill_period: error_summaries[first_relevant_time_step]
+            for backfill_period, first_relevant_time_step in backfill_periods.items()
+        }
+
     def get_simulation_groups(self) -> List[str]:
         return list(list(self.pop_simulations.values())[0].sub_simulations.keys())
 
@@ -288,11 +1030,16 @@ class Simulator:
         self,
         user_inputs: UserInputs,
         collapse_compartments: bool = False,
+        population_projections: Optional[Dict[str, pd.DataFrame]] = None,
     ) -> pd.DataFrame:
-        """Re-format PopulationSimulation results so each simulation is a column"""
+        """
+        Re-format PopulationSimulation results so each simulation is a column
+        `population_projections` the population projections to format keyed by scenario, defaults to every scenario
+        """
+        if population_projections is None:
+            population_projections = self._get_scenario_population_projections()
         simulation_results = pd.DataFrame()
-        for scenario, simulation in self.pop_simulations.items():
-            results = simulation.get_population_projections()
+        for scenario, results in population_projections.items():
             results = results[results.time_step >= user_inputs.start_time_step]
             results = results.rename(
                 {
@@ -324,18 +1071,101 @@ class Simulator:
 
         return simulation_results
 
+    @staticmethod
+    def _check_policy_simulation_groups(
+        data_inputs: SimulationInputData, policy_list: List[SparkPolicy]
+    ) -> None:
+        simulation_groups = list(data_inputs.transitions_data.simulation_group.unique())
+        for policy in policy_list:
+            if policy.simulation_group not in simulation_groups:
+                raise ValueError(
+                    f"Subgroup '{policy.simulation_group}' in policy function not found in simulation groups \
+                    {simulation_groups}"
+                )
+
     def _reset_pop_simulations(self) -> None:
         self.pop_simulations = {}
+        self.scenario_results = {}
+        self.simulation_results = {}
+
+    def _get_scenario_population_projections(self) -> Dict[str, pd.DataFrame]:
+        """Population projections of every scenario, whether run in this process or in a worker process"""
+        population_projections = {
+            scenario: simulation.get_population_projections()
+            for scenario, simulation in self.pop_simulations.items()
+        }
+        for scenario, scenario_results in self.scenario_results.items():
+            population_projections[
+                scenario
+            ] = scenario_results.get_population_projections()
+        return population_projections
+
+    @staticmethod
+    def _can_fork_workers() -> bool:
+        if "fork" in multiprocessing.get_all_start_methods():
+            return True
+        logging.warning(
+            "Worker processes cannot be forked on this platform, running the scenarios one after the other"
+        )
+        return False
+
+    @staticmethod
+    def _run_concurrent_scenarios(
+        scenario_inputs: Dict[
+            str,
+            Tuple[
+                UserInputs,
+                SimulationInputData,
+                List[SparkPolicy],
+                int,
+                Optional[ArimaFitCache],
+            ],
+        ]
+    ) -> Dict[str, ScenarioResults]:
+        """Build and run each scenario in its own forked worker process and collect the compact results"""
+        _FORKED_SCENARIO_INPUTS.update(scenario_inputs)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=len(scenario_inputs),
+                mp_context=multiprocessing.get_context("fork"),
+            ) as executor:
+                scenario_futures = {
+                    scenario: executor.submit(_run_forked_scenario, scenario)
+                    for scenario in scenario_inputs
+                }
+                return {
+                    scenario: future.result()
+                    for scenario, future in scenario_futures.items()
+                }
+        finally:
+            _FORKED_SCENARIO_INPUTS.clear()
 
     def _log_predicted_admissions_warnings(self) -> None:
         """
         Checks if PredictedAdmissions objects have any warnings. If so, log them.
         """
-        warnings = []
+        warnings = self.get_predicted_admissions_warnings(self.pop_simulations)
+        for scenario_results in self.scenario_results.values():
+            while scenario_results.warnings:
+                w = scenario_results.warnings.pop()
+                if w not in warnings:
+                    warnings.append(w)
+
+        # now log unique warnings
+        while warnings:
+            w = warnings.pop()
+            logging.warning(w)
+
+    @staticmethod
+    def get_predicted_admissions_warnings(
+        pop_simulations: Dict[str, PopulationSimulation]
+    ) -> List[str]:
+        """Collect the unique warnings of every PredictedAdmissions object, clearing them from the objects"""
+        warnings: List[str] = []
 
         # collect all compartments
         compartments = []
-        for pop_simulation in self.pop_simulations.values():
+        for pop_simulation in pop_simulations.values():
             for sub_simulation in pop_simulation.sub_simulations.values():
                 for compartment in sub_simulation.simulation_compartments.values():
                     compartments.append(compartment)
@@ -348,10 +1178,23 @@ class Simulator:
                         compartment_warning = f"{compartment.tag} {w}"
                         if compartment_warning not in warnings:
                             warnings.append(compartment_warning)
-        # now log unique warnings
-        while warnings:
-            w = warnings.pop()
-            logging.warning(w)
+        return warnings
+
+    @staticmethod
+    def _get_arima_fit_cache(
+        user_inputs: UserInputs, batch_run: bool
+    ) -> Optional[ArimaFitCache]:
+        """Return the on-disk ARIMA fit cache, used by default when `batch_run` builds several simulations"""
+        use_arima_fit_cache = (
+            user_inputs.use_arima_fit_cache
+            if user_inputs.use_arima_fit_cache is not None
+            else batch_run
+        )
+        if not use_arima_fit_cache:
+            return None
+        return ArimaFitCache(
+            user_inputs.arima_fit_cache_directory or DEFAULT_ARIMA_FIT_CACHE_DIRECTORY
+        )
 
     @staticmethod
     def _build_population_simulation(
@@ -359,10 +1202,14 @@ class Simulator:
         data_inputs: SimulationInputData,
         policy_list: List[SparkPolicy],
         first_relevant_time_step: int,
+        arima_fit_cache: Optional[ArimaFitCache] = None,
+        warm_up: bool = True,
     ) -> PopulationSimulation:
         return PopulationSimulationFactory.build_population_simulation(
             user_inputs=user_inputs,
             policy_list=policy_list,
             first_relevant_time_step=first_relevant_time_step,
             data_inputs=data_inputs,
+            arima_fit_cache=arima_fit_cache,
+            warm_up=warm_up,
         )
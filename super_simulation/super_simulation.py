@@ -16,14 +16,16 @@
 # =============================================================================
 """Highest level simulation object -- runs various comparative scenarios"""
 
+import itertools
 from copy import deepcopy
 from datetime import datetime
-from typing import Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import matplotlib.axes
 import pandas as pd
 
 from full_compartment import FullCompartment
+from population_simulation.monte_carlo_projection import DEFAULT_TRANSITION_UNCERTAINTY
 from population_simulation.population_simulation import PopulationSimulation
 from spark_compartment import SparkCompartment
 from spark_policy import SparkPolicy
@@ -31,6 +33,7 @@ from super_simulation.exporter import Exporter
 from super_simulation.initializer import Initializer
 from super_simulation.simulator import Simulator
 from super_simulation.validator import Validator
+from utils.result_sink import ResultSink
 
 
 class SuperSimulation:
@@ -54,11 +57,18 @@ class SuperSimulation:
         display_compartments: List[str],
         first_relevant_time_step: Optional[int] = None,
         reset: bool = True,
+        num_replicates: Optional[int] = None,
+        transition_uncertainty: float = DEFAULT_TRANSITION_UNCERTAINTY,
+        replicate_seed: Optional[int] = None,
     ) -> None:
         """
         Calculates a baseline projection.
         `simulation_title` is the desired simulation tag for this baseline
         `first_relevant_time_step` is the time_step at which to start initialization
+        `num_replicates` if provided, the number of Monte Carlo replicates used to add the
+            `compartment_population_min` and `compartment_population_max` intervals to the projection
+        `transition_uncertainty` log-scale standard deviation of the replicate transition perturbations
+        `replicate_seed` seed of the replicate draws, for reproducible intervals
         """
         first_relevant_time_step = self.initializer.get_first_relevant_time_step(
             first_relevant_time_step
@@ -71,6 +81,9 @@ class SuperSimulation:
             display_compartments,
             first_relevant_time_step,
             reset,
+            num_replicates,
+            transition_uncertainty,
+            replicate_seed,
         )
         self.validator.reset(self.simulator.get_population_simulations())
 
@@ -88,21 +101,75 @@ class SuperSimulation:
             policy_list,
             output_compartment,
         )
+        # the population simulations are empty if the scenarios ran in worker processes
         self.validator.reset(
-            self.simulator.get_population_simulations(),
+            self.simulator.pop_simulations,
             {"policy_simulation": simulation_output},
         )
 
         return simulation_output.copy()
 
+    def sweep_policies(
+        self,
+        policy_factory: Callable[..., List[SparkPolicy]],
+        parameter_grid: Dict[str, List[Any]],
+        cost_multipliers: Optional[pd.DataFrame] = None,
+        num_workers: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Run one policy scenario per combination of policy parameter values against one control scenario.
+        Returns the spending, life-years and population diffs of every scenario, with one column per parameter.
+        `policy_factory` should return the list of SparkPolicy objects for one combination of parameter values,
+            passed as keyword arguments
+        `parameter_grid` should be a dict of parameter name to the values to sweep over
+        `cost_multipliers` should be a df of how to scale the per_year_cost for each subgroup
+        `num_workers` the number of worker processes to run the policy scenarios in, defaults to the number of CPUs
+        """
+        first_relevant_time_step = self.initializer.get_first_relevant_time_step()
+        data_inputs = self.initializer.get_data_inputs()
+        user_inputs = self.initializer.get_user_inputs()
+
+        scenario_parameters = {
+            f"policy_{scenario_index}": dict(zip(parameter_grid, parameter_values))
+            for scenario_index, parameter_values in enumerate(
+                itertools.product(*parameter_grid.values())
+            )
+        }
+        scenario_output_data = self.simulator.sweep_policies(
+            user_inputs,
+            data_inputs,
+            first_relevant_time_step,
+            {
+                scenario: policy_factory(**parameters)
+                for scenario, parameters in scenario_parameters.items()
+            },
+            num_workers,
+        )
+        self.validator.reset(self.simulator.pop_simulations)
+
+        return self.exporter.get_policy_sweep_results(
+            scenario_parameters,
+            scenario_output_data,
+            cost_multipliers if cost_multipliers is not None else pd.DataFrame(),
+        )
+
     def microsim_baseline_over_time(
         self,
         start_run_dates: List[datetime],
         projection_time_steps_override: Optional[int] = None,
+        num_workers: Optional[int] = None,
+        max_memory_bytes: Optional[int] = None,
+        result_sink: Optional[ResultSink] = None,
     ) -> None:
         """
         Run a microsim at many different run_dates.
         `start_run_dates` should be a list of datetime at which to run the simulation
+        `num_workers` if set, the run dates are run in up to that many worker processes and only the population
+            projections and outflows of each run date are kept
+        `max_memory_bytes` optional cap on the combined peak memory of the worker processes. Without worker
+            processes, only the population projections and outflows of each run date are kept if it is set
+        `result_sink` optional destination the outputs of each run date are written to as soon as it finishes,
+            instead of being kept for the validation methods
         """
         user_inputs = deepcopy(self.initializer.get_user_inputs())
         (
@@ -115,19 +182,27 @@ class SuperSimulation:
             data_inputs_dict,
             first_relevant_time_step_dict,
             projection_time_steps_override,
+            num_workers,
+            max_memory_bytes,
+            result_sink,
+        )
+        self.validator.reset(
+            self.simulator.pop_simulations,
+            simulation_results=self.simulator.simulation_results,
         )
-        self.validator.reset(self.simulator.get_population_simulations())
 
     def upload_baseline_simulation_results_to_bq(
         self,
         simulation_tag: Optional[str] = None,
         override_population_data: Optional[pd.DataFrame] = None,
+        result_sink: Optional[ResultSink] = None,
     ) -> Dict[str, pd.DataFrame]:
         """Upload the baseline (no-policy) simulation results to BigQuery.
 
         If `override_population_data` data is provided (in the case when there are
         projection intervals created separately), use that instead of the output data
         from the Validator object.
+        If `result_sink` is provided the results are written there instead of BigQuery.
         """
 
         if override_population_data is None:
@@ -183,12 +258,14 @@ class SuperSimulation:
             output_outflows_data=output_outflows_per_pop_sim,
             excluded_pop=excluded_pop_data,
             total_pop=population_data,
+            result_sink=result_sink,
         )
 
     def upload_policy_simulation_results_to_bq(
         self,
         simulation_tag: Optional[str] = None,
         cost_multipliers: Optional[pd.DataFrame] = None,
+        result_sink: Optional[ResultSink] = None,
     ) -> Optional[Dict[str, pd.DataFrame]]:
         output_data = self.validator.get_output_data_for_upload(macrosim_override=True)
 
@@ -197,17 +274,20 @@ class SuperSimulation:
             simulation_tag,
             output_data,
             cost_multipliers if cost_multipliers is not None else pd.DataFrame(),
+            result_sink,
         )
 
     def upload_validation_projection_results_to_bq(
         self,
         validation_projections_data: pd.DataFrame,
         simulation_tag: Optional[str] = None,
+        result_sink: Optional[ResultSink] = None,
     ) -> None:
         return self.exporter.upload_validation_projection_results_to_bq(
             project_id="recidiviz-staging",
             simulation_tag=simulation_tag,
             validation_projections_data=validation_projections_data,
+            result_sink=result_sink,
         )
 
     def get_population_simulations(self) -> Dict[str, PopulationSimulation]:
@@ -251,24 +331,31 @@ class SuperSimulation:
         upper_bound: float = 2,
         step_size: float = 0.1,
         unit: str = "abs",
+        num_workers: Optional[int] = None,
     ) -> pd.DataFrame:
         """
         `back_fill_range` is a three item tuple giving the lower and upper bounds to test in units of
             subgroup max_sentence and the step size
+        `num_workers` the number of worker processes to run the back-filling runs in, defaults to the number of
+            CPUs. Only the error of each run is kept, so no population simulations are available afterwards
         """
         data_inputs = self.initializer.get_data_inputs()
         user_inputs = self.initializer.get_user_inputs()
         max_sentence = self.initializer.get_max_sentence()
 
-        self.simulator.get_cohort_hydration_simulations(
+        cohort_hydration_errors = self.simulator.get_cohort_hydration_errors(
             user_inputs,
             data_inputs,
             int(lower_bound * max_sentence),
             int(upper_bound * max_sentence),
             step_size * max_sentence,
+            output_compartment,
+            outflow_to,
+            unit,
+            num_workers,
         )
 
-        self.validator.reset(self.simulator.get_population_simulations())
+        self.validator.reset(self.simulator.pop_simulations)
         return self.validator.calculate_cohort_hydration_error(
             output_compartment,
             outflow_to,
@@ -276,6 +363,7 @@ class SuperSimulation:
             int(upper_bound * max_sentence),
             step_size * max_sentence,
             unit,
+            cohort_hydration_errors,
         )
 
     def override_cross_flow_function(
@@ -133,6 +133,24 @@ class SuperSimulationFactory:
                     "big_query_simulation_tag", str
                 )
             )
+        if "local_parquet_inputs" in given_data_inputs.keys():
+            local_inputs_yaml_dict = given_data_inputs.pop_dict("local_parquet_inputs")
+            local_inputs_keys = local_inputs_yaml_dict.keys()
+
+            local_inputs_dict: Dict[str, str] = {}
+            for k in local_inputs_keys:
+                local_inputs_dict[k] = local_inputs_yaml_dict.pop(k, str)
+
+            if "input_directory" not in local_inputs_dict:
+                raise ValueError(
+                    "local_parquet_inputs must include the `input_directory` of the Parquet tables"
+                )
+            local_inputs_dict["local_input_directory"] = local_inputs_dict.pop(
+                "input_directory"
+            )
+            if "big_query_simulation_tag" in local_inputs_dict:
+                return MacroSimulationDataInputs(**local_inputs_dict)
+            return MicroSimulationDataInputs(**local_inputs_dict)
         raise ValueError(
             f"Received unexpected key in data_inputs: {given_data_inputs.keys()[0]}"
         )
@@ -170,6 +188,39 @@ class SuperSimulationFactory:
         cross_flow_function = user_inputs_yaml_dict.pop_optional(
             "cross_flow_function", str
         )
+        use_matrix_engine = user_inputs_yaml_dict.pop_optional(
+            "use_matrix_engine", bool
+        )
+        arima_fit_workers = user_inputs_yaml_dict.pop_optional("arima_fit_workers", int)
+        use_arima_fit_cache = user_inputs_yaml_dict.pop_optional(
+            "use_arima_fit_cache", bool
+        )
+        arima_fit_cache_directory = user_inputs_yaml_dict.pop_optional(
+            "arima_fit_cache_directory", str
+        )
+        arima_fit_backend = user_inputs_yaml_dict.pop_optional("arima_fit_backend", str)
+        arima_fit_check_sample_size = user_inputs_yaml_dict.pop_optional(
+            "arima_fit_check_sample_size", int
+        )
+        concurrent_scenarios = user_inputs_yaml_dict.pop_optional(
+            "concurrent_scenarios", bool
+        )
+        use_warm_start_cache = user_inputs_yaml_dict.pop_optional(
+            "use_warm_start_cache", bool
+        )
+        warm_start_cache_directory = user_inputs_yaml_dict.pop_optional(
+            "warm_start_cache_directory", str
+        )
+        steady_state_tolerance = user_inputs_yaml_dict.pop_optional(
+            "steady_state_tolerance", float
+        )
+        use_equilibrium_initialization = user_inputs_yaml_dict.pop_optional(
+            "use_equilibrium_initialization", bool
+        )
+        use_query_cache = user_inputs_yaml_dict.pop_optional("use_query_cache", bool)
+        query_cache_directory = user_inputs_yaml_dict.pop_optional(
+            "query_cache_directory", str
+        )
 
         # Check for any remaining unused arguments
         if user_inputs_yaml_dict:
@@ -184,6 +235,19 @@ class SuperSimulationFactory:
             run_date=run_date,
             speed_run=speed_run,
             cross_flow_function=cross_flow_function,
+            use_matrix_engine=use_matrix_engine,
+            arima_fit_workers=arima_fit_workers,
+            use_arima_fit_cache=use_arima_fit_cache,
+            arima_fit_cache_directory=arima_fit_cache_directory,
+            arima_fit_backend=arima_fit_backend,
+            arima_fit_check_sample_size=arima_fit_check_sample_size,
+            concurrent_scenarios=concurrent_scenarios,
+            use_warm_start_cache=use_warm_start_cache,
+            warm_start_cache_directory=warm_start_cache_directory,
+            steady_state_tolerance=steady_state_tolerance,
+            use_equilibrium_initialization=use_equilibrium_initialization,
+            use_query_cache=use_query_cache,
+            query_cache_directory=query_cache_directory,
         )
 
     @staticmethod
@@ -23,6 +23,9 @@ import numpy as np
 import pandas as pd
 
 from population_simulation.population_simulation import PopulationSimulation
+from population_simulation.population_simulation_results import (
+    PopulationSimulationResults,
+)
 from super_simulation.time_converter import TimeConverter
 
 
@@ -34,17 +37,30 @@ class Validator:
         self.time_converter = time_converter
         self.output_data: Dict[str, pd.DataFrame] = {}
         self.pop_simulations: Dict[str, PopulationSimulation] = {}
+        # outputs of simulations that were run without keeping their PopulationSimulation
+        self.simulation_results: Dict[str, PopulationSimulationResults] = {}
 
     def reset(
         self,
         pop_simulations: Dict[str, PopulationSimulation],
         output_data: Optional[Dict[str, pd.DataFrame]] = None,
+        simulation_results: Optional[Dict[str, PopulationSimulationResults]] = None,
     ) -> None:
         if output_data:
             self.output_data = output_data
         else:
             self.output_data = {}
         self.pop_simulations = pop_simulations
+        self.simulation_results = simulation_results or {}
+
+    def _get_simulation_results(
+        self, simulation_tag: str
+    ) -> Union[PopulationSimulation, PopulationSimulationResults]:
+        if simulation_tag in self.pop_simulations:
+            return self.pop_simulations[simulation_tag]
+        if simulation_tag in self.simulation_results:
+            return self.simulation_results[simulation_tag]
+        raise ValueError(f"No simulation results for '{simulation_tag}'")
 
     def calculate_baseline_admissions_error(
         self, validation_pairs: Dict[str, str]
@@ -142,14 +158,16 @@ class Validator:
 
     def gen_population_error(self, simulation_tag: str) -> pd.DataFrame:
         # Convert the index from relative time steps to floating point years
-        error_results = self.pop_simulations[simulation_tag].gen_population_error()
+        error_results = self._get_simulation_results(
+            simulation_tag
+        ).gen_population_error()
         error_results.index = self.time_converter.convert_time_steps_to_year(
             pd.Series(error_results.index)
         )
         return error_results
 
     def gen_full_error_output(self, simulation_tag: str) -> pd.DataFrame:
-        error_results = self.pop_simulations[simulation_tag].gen_full_error()
+        error_results = self._get_simulation_results(simulation_tag).gen_full_error()
         # Convert the index from relative time steps to floating point years
         error_results.index = error_results.index.set_levels(
             self.time_converter.convert_time_steps_to_year(
@@ -170,24 +188,24 @@ class Validator:
         range_end: int,
         step_size: float,
         unit: str,
+        cohort_hydration_errors: Optional[Dict[str, pd.Series]] = None,
     ) -> pd.DataFrame:
         """
         `output_compartment` is the compartment whose error you want to get, must be a shell compartment
         `outflow_to` is the outflow from that compartment you want to get the error on
         `unit is either mse or abs`
+        `cohort_hydration_errors` the error per sub group of each back-filling run, as returned by
+            Simulator.get_cohort_hydration_errors(). Computed from the population simulations if not given
         """
-        cohort_population_error = pd.DataFrame()
-        for test_sim in self.pop_simulations:
-            errors = pd.Series(dtype=float)
-            for sub_group in self.pop_simulations[test_sim].sub_simulations:
-                sub_group_sim = self.pop_simulations[test_sim].sub_simulations[
-                    sub_group
-                ]
-                errors[sub_group] = (
-                    sub_group_sim.get_error(output_compartment, unit=unit)[outflow_to]
-                    .abs()
-                    .mean()
+        if cohort_hydration_errors is None:
+            cohort_hydration_errors = {
+                test_sim: pop_simulation.get_outflow_error_summary(
+                    output_compartment, outflow_to, unit
                 )
+                for test_sim, pop_simulation in self.pop_simulations.items()
+            }
+        cohort_population_error = pd.DataFrame()
+        for test_sim, errors in cohort_hydration_errors.items():
             cohort_population_error[test_sim] = errors
 
         cohort_population_error = cohort_population_error.transpose()
@@ -221,9 +239,12 @@ class Validator:
         microsim projection should be output to the macrosim tables, likely for a microsim policy simulation."""
         if self.microsim and not macrosim_override:
             return {
-                simulation_title: self.pop_simulations[simulation_title]
+                simulation_title: self._get_simulation_results(simulation_title)
                 .get_population_projections()
                 .sort_values("time_step")
-                for simulation_title in self.pop_simulations
+                for simulation_title in [
+                    *self.pop_simulations,
+                    *self.simulation_results,
+                ]
             }
         return self.output_data
@@ -0,0 +1,36 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Content-addressed on-disk cache of fitted ARIMA models shared across simulation runs"""
+import os
+
+from utils.array_cache import ArrayCache
+from utils.file_cache import DEFAULT_MAX_CACHE_SIZE_BYTES
+
+DEFAULT_ARIMA_FIT_CACHE_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "spark_arima_fits"
+)
+
+
+class ArimaFitCache(ArrayCache):
+    """Store the arrays describing each fitted model under the content hash of its ArimaFitJob"""
+
+    def __init__(
+        self,
+        cache_directory: str = DEFAULT_ARIMA_FIT_CACHE_DIRECTORY,
+        max_size_bytes: int = DEFAULT_MAX_CACHE_SIZE_BYTES,
+    ) -> None:
+        super().__init__(cache_directory, max_size_bytes)
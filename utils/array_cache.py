@@ -0,0 +1,45 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Content-addressed on-disk cache of named NumPy arrays, shared across simulation runs"""
+from typing import Dict, Optional
+
+import numpy as np
+
+from utils.file_cache import FileCache
+
+
+class ArrayCache(FileCache):
+    """Store the arrays of each entry in one `.npz` file per content hash key"""
+
+    file_extension = ".npz"
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """Return the arrays stored under `key`, or None if they are not cached"""
+        path = self._get_entry_path(key)
+        if path is None:
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as cached_arrays:
+                arrays = {name: cached_arrays[name] for name in cached_arrays.files}
+        except (OSError, ValueError):
+            # evicted by another process, or partially written by an older version
+            return None
+        return arrays
+
+    def put(self, key: str, arrays: Dict[str, np.ndarray]) -> None:
+        """Store `arrays` under `key`"""
+        self._write_entry(key, lambda cache_file: np.savez(cache_file, **arrays))
@@ -16,11 +16,13 @@
 # =============================================================================
 """BigQuery Methods for both Spark and Ignite population projection simulations"""
 import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import pandas as pd
 from pytz import timezone
 
+from utils.result_sink import BigQueryResultSink, ResultSink
+
 # Constants for the Policy Simulation Output data
 SPARK_OUTPUT_DATASET = "spark_public_output_data"
 
@@ -91,6 +93,16 @@ VALIDATION_SCHEMA = [
     {"name": "run_date", "type": "DATE", "mode": "REQUIRED"},
 ]
 
+OUTPUT_TABLE_SCHEMAS = {
+    COST_AVOIDANCE_TABLE_NAME: COST_AVOIDANCE_SCHEMA,
+    COST_AVOIDANCE_NON_CUMULATIVE_TABLE_NAME: COST_AVOIDANCE_SCHEMA,
+    LIFE_YEARS_TABLE_NAME: LIFE_YEARS_SCHEMA,
+    POPULATION_TABLE_NAME: POPULATION_SCHEMA,
+    BASELINE_PROJECTED_POPULATION_TABLE_NAME: BASELINE_PROJECTED_POPULATION_SCHEMA,
+    BASELINE_PROJECTED_OUTFLOWS_TABLE_NAME: BASELINE_PROJECTED_OUTFLOWS_SCHEMA,
+    VALIDATIONS_DATA_TABLE_NAME: VALIDATION_SCHEMA,
+}
+
 
 def store_simulation_results(
     project_id: str,
@@ -115,6 +127,34 @@ def store_simulation_results(
     )
 
 
+def get_output_result_sink(project_id: str) -> ResultSink:
+    """Return the sink appending the simulation outputs to the spark output dataset in BigQuery"""
+    return BigQueryResultSink(project_id, SPARK_OUTPUT_DATASET, OUTPUT_TABLE_SCHEMAS)
+
+
+def write_output_tables(
+    project_id: str,
+    simulation_tag: str,
+    tables: Dict[str, pd.DataFrame],
+    result_sink: Optional[ResultSink],
+) -> Dict[str, float]:
+    """Write the output tables of one export concurrently, to BigQuery unless another `result_sink` is given.
+    The columns are ordered like the output table schemas for every sink. Returns the seconds spent writing each
+    table
+    """
+    if result_sink is None:
+        result_sink = get_output_result_sink(project_id)
+    return result_sink.write_tables(
+        simulation_tag,
+        {
+            table_name: table[
+                [column["name"] for column in OUTPUT_TABLE_SCHEMAS[table_name]]
+            ]
+            for table_name, table in tables.items()
+        },
+    )
+
+
 def add_simulation_date_column(df: pd.DataFrame) -> pd.DataFrame:
     # Convert the fractional year column into the integer year and month columns
     df["year"] = round(df["year"], 5)
@@ -135,67 +175,42 @@ def upload_policy_simulation_results(
     life_years_df: pd.DataFrame,
     population_change_df: pd.DataFrame,
     cost_avoidance_non_cumulative_df: pd.DataFrame,
-) -> None:
-    """Reformat the simulation results to match the table schema and upload them to BigQuery"""
+    result_sink: Optional[ResultSink] = None,
+) -> Dict[str, float]:
+    """Reformat the simulation results to match the table schema and upload them to BigQuery, or `result_sink`.
+    Returns the seconds spent writing each table
+    """
 
     # Set the upload timestamp for all tables
     upload_time = datetime.datetime.now()
 
-    cost_avoidance_table = _format_policy_simulation_results(
-        cost_avoidance_df,
-        "total_cost",
-        simulation_tag=simulation_tag,
-        upload_time=upload_time,
-    )
-    store_simulation_results(
-        project_id,
-        SPARK_OUTPUT_DATASET,
-        COST_AVOIDANCE_TABLE_NAME,
-        COST_AVOIDANCE_SCHEMA,
-        cost_avoidance_table,
-    )
-
-    cost_avoidance_non_cumulative_table = _format_policy_simulation_results(
-        cost_avoidance_non_cumulative_df,
-        "total_cost",
-        simulation_tag=simulation_tag,
-        upload_time=upload_time,
-    )
-    store_simulation_results(
-        project_id,
-        SPARK_OUTPUT_DATASET,
-        COST_AVOIDANCE_NON_CUMULATIVE_TABLE_NAME,
-        COST_AVOIDANCE_SCHEMA,
-        cost_avoidance_non_cumulative_table,
-    )
-
-    life_years_table = _format_policy_simulation_results(
-        life_years_df,
-        "life_years",
-        simulation_tag=simulation_tag,
-        upload_time=upload_time,
-    )
-    store_simulation_results(
-        project_id,
-        SPARK_OUTPUT_DATASET,
-        LIFE_YEARS_TABLE_NAME,
-        LIFE_YEARS_SCHEMA,
-        life_years_table,
-    )
-
-    population_table = _format_policy_simulation_results(
-        population_change_df,
-        "population",
-        simulation_tag=simulation_tag,
-        upload_time=upload_time,
-    )
-    store_simulation_results(
-        project_id,
-        SPARK_OUTPUT_DATASET,
-        POPULATION_TABLE_NAME,
-        POPULATION_SCHEMA,
-        population_table,
-    )
+    output_tables = {
+        COST_AVOIDANCE_TABLE_NAME: _format_policy_simulation_results(
+            cost_avoidance_df,
+            "total_cost",
+            simulation_tag=simulation_tag,
+            upload_time=upload_time,
+        ),
+        COST_AVOIDANCE_NON_CUMULATIVE_TABLE_NAME: _format_policy_simulation_results(
+            cost_avoidance_non_cumulative_df,
+            "total_cost",
+            simulation_tag=simulation_tag,
+            upload_time=upload_time,
+        ),
+        LIFE_YEARS_TABLE_NAME: _format_policy_simulation_results(
+            life_years_df,
+            "life_years",
+            simulation_tag=simulation_tag,
+            upload_time=upload_time,
+        ),
+        POPULATION_TABLE_NAME: _format_policy_simulation_results(
+            population_change_df,
+            "population",
+            simulation_tag=simulation_tag,
+            upload_time=upload_time,
+        ),
+    }
+    return write_output_tables(project_id, simulation_tag, output_tables, result_sink)
 
 
 def _format_policy_simulation_results(
@@ -236,8 +251,11 @@ def upload_baseline_simulation_results(
     microsim_population_df: pd.DataFrame,
     microsim_outflows_df: pd.DataFrame,
     state_code: str,
-) -> None:
-    """Reformat the simulation results to match the table schema and upload them to BigQuery"""
+    result_sink: Optional[ResultSink] = None,
+) -> Dict[str, float]:
+    """Reformat the simulation results to match the table schema and upload them to BigQuery, or `result_sink`.
+    Returns the seconds spent writing each table
+    """
 
     # Set the upload timestamp for the population output to the current time in PST
     upload_time = datetime.datetime.now(tz=timezone("US/Pacific"))
@@ -252,20 +270,14 @@ def upload_baseline_simulation_results(
     microsim_outflows_df["state_code"] = state_code
     microsim_outflows_df["date_created"] = upload_time
 
-    store_simulation_results(
+    return write_output_tables(
         project_id,
-        SPARK_OUTPUT_DATASET,
-        BASELINE_PROJECTED_POPULATION_TABLE_NAME,
-        BASELINE_PROJECTED_POPULATION_SCHEMA,
-        microsim_population_df,
-    )
-
-    store_simulation_results(
-        project_id,
-        SPARK_OUTPUT_DATASET,
-        BASELINE_PROJECTED_OUTFLOWS_TABLE_NAME,
-        BASELINE_PROJECTED_OUTFLOWS_SCHEMA,
-        microsim_outflows_df,
+        state_code,
+        {
+            BASELINE_PROJECTED_POPULATION_TABLE_NAME: microsim_population_df,
+            BASELINE_PROJECTED_OUTFLOWS_TABLE_NAME: microsim_outflows_df,
+        },
+        result_sink,
     )
 
 
@@ -273,7 +285,8 @@ def upload_validation_projection_results(
     project_id: str,
     validation_projections_df: pd.DataFrame,
     state_code: str,
-) -> None:
+    result_sink: Optional[ResultSink] = None,
+) -> Dict[str, float]:
 
     # Set the upload timestamp for the population output to the current time in PST
     upload_time = datetime.datetime.now(tz=timezone("US/Pacific"))
@@ -282,10 +295,9 @@ def upload_validation_projection_results(
     validation_projections_df["state_code"] = state_code
     validation_projections_df["date_created"] = upload_time
 
-    store_simulation_results(
+    return write_output_tables(
         project_id,
-        SPARK_OUTPUT_DATASET,
-        VALIDATIONS_DATA_TABLE_NAME,
-        VALIDATION_SCHEMA,
-        validation_projections_df,
+        state_code,
+        {VALIDATIONS_DATA_TABLE_NAME: validation_projections_df},
+        result_sink,
     )
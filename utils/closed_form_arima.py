@@ -0,0 +1,104 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Batched closed-form estimation of ARIMA(1,1,0) models with a linear trend"""
+from typing import Tuple
+
+import numpy as np
+
+# ARIMA(1,1,0) with a linear trend is an AR(1) with drift on the first differences of the series:
+#     (x_t - drift) = ar * (x_{t-1} - drift) + e_t,    e_t ~ N(0, sigma2)
+# For a given `ar` the exact likelihood has closed-form maximizers for `drift` and `sigma2`, so the fit reduces to a
+# one-dimensional search over the stationary range of `ar`, done for every series at once.
+MAX_AR_COEFFICIENT = 0.9999
+AR_COEFFICIENT_GRID_SIZE = 199
+GOLDEN_SECTION_ITERATIONS = 60
+
+
+def _get_profile_log_likelihood(
+    differences: np.ndarray, ar: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the log likelihood, drift, and sum of squared innovations maximized over drift and sigma2
+    `differences` (series x observations) first differences of each series
+    `ar` (series x candidates) AR coefficients to evaluate for each series
+    """
+    num_observations = differences.shape[1]
+    # the first observation is scaled by its stationary standard deviation, the rest are AR(1) innovations
+    first_weight = np.sqrt(1 - ar**2)
+    first_innovation = first_weight * differences[:, None, 0]
+    innovations = differences[:, None, 1:] - ar[..., None] * differences[:, None, :-1]
+    innovation_weight = 1 - ar
+
+    drift = (
+        first_innovation * first_weight + innovations.sum(axis=-1) * innovation_weight
+    ) / (first_weight**2 + (num_observations - 1) * innovation_weight**2)
+    sum_of_squares = (first_innovation - drift * first_weight) ** 2 + (
+        (innovations - (drift * innovation_weight)[..., None]) ** 2
+    ).sum(axis=-1)
+
+    log_likelihood = -num_observations / 2 * np.log(
+        np.maximum(sum_of_squares, np.finfo(float).tiny) / num_observations
+    ) + 0.5 * np.log(first_weight**2)
+    return log_likelihood, drift, sum_of_squares
+
+
+def fit_ar1_with_drift(
+    differences: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the exact maximum likelihood (drift, ar, sigma2) for each row of `differences`
+    `differences` (series x observations) first differences of series that all have the same length
+    """
+    num_series = differences.shape[0]
+    ar_grid = np.linspace(
+        -MAX_AR_COEFFICIENT, MAX_AR_COEFFICIENT, AR_COEFFICIENT_GRID_SIZE
+    )
+    grid_log_likelihood, _, _ = _get_profile_log_likelihood(
+        differences, np.broadcast_to(ar_grid, (num_series, len(ar_grid)))
+    )
+
+    # refine the best grid point with a golden section search between its neighbours
+    best_grid_index = grid_log_likelihood.argmax(axis=1)
+    lower = ar_grid[np.maximum(best_grid_index - 1, 0)]
+    upper = ar_grid[np.minimum(best_grid_index + 1, len(ar_grid) - 1)]
+    golden_ratio = (np.sqrt(5) - 1) / 2
+    for _ in range(GOLDEN_SECTION_ITERATIONS):
+        lower_candidate = upper - golden_ratio * (upper - lower)
+        upper_candidate = lower + golden_ratio * (upper - lower)
+        candidate_log_likelihood, _, _ = _get_profile_log_likelihood(
+            differences, np.column_stack([lower_candidate, upper_candidate])
+        )
+        keep_lower = candidate_log_likelihood[:, 0] > candidate_log_likelihood[:, 1]
+        upper = np.where(keep_lower, upper_candidate, upper)
+        lower = np.where(keep_lower, lower, lower_candidate)
+
+    ar = (lower + upper) / 2
+    _, drift, sum_of_squares = _get_profile_log_likelihood(differences, ar[:, None])
+    return drift[:, 0], ar, sum_of_squares[:, 0] / differences.shape[1]
+
+
+def forecast_ar1_with_drift(
+    last_values: np.ndarray,
+    last_differences: np.ndarray,
+    drift: np.ndarray,
+    ar: np.ndarray,
+    steps: int,
+) -> np.ndarray:
+    """Return the (series x steps) forecasts of the integrated series after its last observed value"""
+    decay = ar[:, None] ** np.arange(1, steps + 1)
+    forecast_differences = drift[:, None] + decay * (last_differences - drift)[:, None]
+    return last_values[:, None] + np.cumsum(forecast_differences, axis=1)
@@ -0,0 +1,93 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Size-bounded on-disk cache of one file per key, shared across simulation runs"""
+import os
+import tempfile
+from typing import BinaryIO, Callable, Optional
+
+DEFAULT_MAX_CACHE_SIZE_BYTES = 256 * 1024**2
+
+
+class FileCache:
+    """
+    Store each entry in one file named by its key.
+    Reading an entry marks it as recently used, and the least recently used entries are evicted once the cache
+    directory grows past `max_size_bytes`.
+    """
+
+    # extension of the entry files, other files in the cache directory are left alone
+    file_extension = ".cache"
+
+    def __init__(
+        self,
+        cache_directory: str,
+        max_size_bytes: int = DEFAULT_MAX_CACHE_SIZE_BYTES,
+    ) -> None:
+        if max_size_bytes <= 0:
+            raise ValueError(f"Cache size bound must be positive: {max_size_bytes}")
+        self.cache_directory = cache_directory
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(self.cache_directory, exist_ok=True)
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_directory, key + self.file_extension)
+
+    def _get_entry_path(self, key: str) -> Optional[str]:
+        """Return the path of the entry under `key` and mark it as recently used, or None if it is not cached"""
+        path = self._get_path(key)
+        try:
+            # bump the modification time so eviction sees the entry as recently used
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def _write_entry(self, key: str, write: Callable[[BinaryIO], None]) -> None:
+        """Write the entry under `key` with `write`, atomically so concurrent runs never read a partial entry"""
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=self.cache_directory, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(file_descriptor, "wb") as temp_file:
+                write(temp_file)
+            os.replace(temp_path, self._get_path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def evict(self) -> None:
+        """Delete the least recently used entries until the cache is within its size bound"""
+        entries = []
+        with os.scandir(self.cache_directory) as directory_entries:
+            for entry in directory_entries:
+                if not entry.name.endswith(self.file_extension):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        cache_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if cache_size <= self.max_size_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            cache_size -= size
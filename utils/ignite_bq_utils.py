@@ -16,18 +16,68 @@
 # =============================================================================
 """BigQuery Methods for running the Ignite population projection simulation"""
 
+from typing import Optional
+
 import numpy as np
 import pandas as pd
 import pandas_gbq
 
+from utils.query_cache import QueryResultCache
+
 
 def load_ignite_table_from_big_query(
-    project_id: str, dataset: str, table_name: str, state_code: str
+    project_id: str,
+    dataset: str,
+    table_name: str,
+    state_code: str,
+    query_cache: Optional[QueryResultCache] = None,
+    run_date: Optional[str] = None,
 ) -> pd.DataFrame:
-    """Pull all data from a table for a specific state and run date"""
+    """Pull all data from a table for a specific state and run date. If `query_cache` is provided the table is
+    only downloaded when it was modified since it was cached. If `run_date` is provided only the rows for that
+    run date are pulled
+    """
 
     query = f"""SELECT * FROM {dataset}.{table_name} WHERE state_code = '{state_code}'
         """
+    if run_date is not None:
+        query += f"""AND run_date = '{run_date}'
+        """
+
+    return _read_ignite_query(query, project_id, dataset, table_name, query_cache)
+
+
+def load_ignite_run_dates_from_big_query(
+    project_id: str,
+    dataset: str,
+    table_name: str,
+    state_code: str,
+    query_cache: Optional[QueryResultCache] = None,
+) -> pd.Series:
+    """Pull the distinct run dates in a table for a specific state"""
+
+    query = f"""SELECT DISTINCT run_date FROM {dataset}.{table_name} WHERE state_code = '{state_code}'
+        """
+
+    return _read_ignite_query(query, project_id, dataset, table_name, query_cache)[
+        "run_date"
+    ]
+
+
+def _read_ignite_query(
+    query: str,
+    project_id: str,
+    dataset: str,
+    table_name: str,
+    query_cache: Optional[QueryResultCache],
+) -> pd.DataFrame:
+    if query_cache is not None:
+        # the table metadata is read without scanning the table itself
+        freshness_query = f"""
+            SELECT last_modified_time FROM {dataset}.__TABLES__
+            WHERE table_id = '{table_name}'
+            """
+        return query_cache.read_query(query, project_id, freshness_query)
 
     table_results = pandas_gbq.read_gbq(query, project_id=project_id)
     return table_results
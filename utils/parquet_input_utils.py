@@ -0,0 +1,152 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Local Parquet mirrors of the BigQuery input tables of the population projection simulation"""
+
+import functools
+import operator
+import os
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from utils import spark_bq_utils
+
+
+def get_table_directory(input_directory: str, dataset: str, table_name: str) -> str:
+    """Return the directory mirroring the BigQuery table `dataset`.`table_name`.
+    Each table is a hive partitioned Parquet dataset, for example
+    `{input_directory}/{dataset}/{table_name}/simulation_tag=.../part-0.parquet`
+    """
+    return os.path.join(input_directory, dataset, table_name)
+
+
+def load_table_from_parquet(
+    table_directory: str,
+    filters: Dict[str, Any],
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Read the rows of a mirrored table that match every `filters` value. The
+    filters are pushed down to the dataset scan so only the matching partitions and
+    row groups are read, and only `columns` are loaded when given.
+    """
+    dataset = _open_dataset(table_directory)
+
+    missing_columns = set(filters).difference(dataset.schema.names)
+    if missing_columns:
+        raise ValueError(
+            f"Table '{table_directory}' missing filter columns {missing_columns}"
+        )
+
+    if columns is not None:
+        columns = [column for column in columns if column in dataset.schema.names]
+
+    return dataset.to_table(
+        columns=columns, filter=_get_filter_expression(filters, dataset.schema)
+    ).to_pandas()
+
+
+def load_spark_table_from_parquet(
+    input_directory: str, table_name: str, simulation_tag: str
+) -> pd.DataFrame:
+    """Pull the latest run of a table for a simulation tag from the local mirror,
+    matching `spark_bq_utils.load_spark_table_from_big_query()`
+    """
+    table_directory = get_table_directory(
+        input_directory, spark_bq_utils.SPARK_INPUT_DATASET, table_name
+    )
+    dataset = _open_dataset(table_directory)
+    tag_filter = _get_filter_expression({"simulation_tag": simulation_tag})
+
+    latest_run = pc.max(
+        dataset.to_table(columns=["date_created"], filter=tag_filter).column(
+            "date_created"
+        )
+    )
+    if latest_run.is_valid:
+        tag_filter = tag_filter & (ds.field("date_created") == latest_run)
+
+    return dataset.to_table(
+        columns=[column["name"] for column in _get_spark_schema(table_name)],
+        filter=tag_filter,
+    ).to_pandas()
+
+
+def load_ignite_table_from_parquet(
+    input_directory: str,
+    dataset: str,
+    table_name: str,
+    state_code: str,
+    run_date: Optional[str] = None,
+) -> pd.DataFrame:
+    """Pull all data from a table for a specific state, and only `run_date` if provided, from the local mirror,
+    matching `ignite_bq_utils.load_ignite_table_from_big_query()`
+    """
+    filters = {"state_code": state_code}
+    if run_date is not None:
+        filters["run_date"] = run_date
+    return load_table_from_parquet(
+        get_table_directory(input_directory, dataset, table_name), filters
+    )
+
+
+def load_ignite_run_dates_from_parquet(
+    input_directory: str, dataset: str, table_name: str, state_code: str
+) -> pd.Series:
+    """Pull the distinct run dates in a table for a specific state from the local mirror"""
+    return (
+        load_table_from_parquet(
+            get_table_directory(input_directory, dataset, table_name),
+            {"state_code": state_code},
+            columns=["run_date"],
+        )["run_date"]
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+
+
+def _open_dataset(table_directory: str) -> ds.Dataset:
+    if not os.path.isdir(table_directory):
+        raise ValueError(f"No local Parquet table found at '{table_directory}'")
+    return ds.dataset(table_directory, format="parquet", partitioning="hive")
+
+
+def _get_filter_expression(
+    filters: Dict[str, Any], schema: Optional[pa.Schema] = None
+) -> Optional[ds.Expression]:
+    if not filters:
+        return None
+    expressions = []
+    for column, value in filters.items():
+        if schema is not None:
+            # cast the value to the column type so e.g. run dates can be given as strings for date columns
+            value = pa.scalar(value).cast(schema.field(column).type)
+        expressions.append(ds.field(column) == value)
+    return functools.reduce(operator.and_, expressions)
+
+
+def _get_spark_schema(table_name: str) -> List[Dict[str, str]]:
+    spark_schemas = {
+        spark_bq_utils.ADMISSIONS_DATA_TABLE_NAME: spark_bq_utils.ADMISSIONS_SCHEMA,
+        spark_bq_utils.TRANSITIONS_DATA_TABLE_NAME: spark_bq_utils.TRANSITIONS_SCHEMA,
+        spark_bq_utils.POPULATION_DATA_TABLE_NAME: spark_bq_utils.POPULATION_SCHEMA,
+    }
+    if table_name not in spark_schemas:
+        raise ValueError(f"Unknown Spark input table '{table_name}'")
+    return spark_schemas[table_name]
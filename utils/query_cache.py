@@ -0,0 +1,97 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Read-through on-disk cache of BigQuery query results, shared across simulation runs"""
+import hashlib
+import os
+from typing import Callable, Optional
+
+import pandas as pd
+import pandas_gbq
+
+from utils.file_cache import FileCache
+
+DEFAULT_QUERY_CACHE_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "spark_query_results"
+)
+DEFAULT_QUERY_CACHE_MAX_SIZE_BYTES = 1024**3
+
+
+class QueryResultCache(FileCache):
+    """
+    Store the result of each query in one zstd compressed Parquet file, keyed by the query text, the project, and
+    the result of a cheap freshness query over the source table (e.g. its latest date_created). The full query is
+    only sent to BigQuery when the freshness result changed since the entry was cached.
+    """
+
+    file_extension = ".parquet"
+
+    def __init__(
+        self,
+        cache_directory: str = DEFAULT_QUERY_CACHE_DIRECTORY,
+        max_size_bytes: int = DEFAULT_QUERY_CACHE_MAX_SIZE_BYTES,
+        read_gbq: Optional[Callable[..., pd.DataFrame]] = None,
+    ) -> None:
+        super().__init__(cache_directory, max_size_bytes)
+        # Function used to run the queries, with the `pandas_gbq.read_gbq` signature. Defaults to pandas_gbq
+        self.read_gbq = read_gbq
+
+    def read_query(
+        self, query: str, project_id: str, freshness_query: str
+    ) -> pd.DataFrame:
+        """Return the result of `query`, downloading it only if the result of `freshness_query` is not cached"""
+        freshness = self._read_gbq(freshness_query, project_id)
+        cache_key = self.get_cache_key(query, project_id, freshness)
+
+        query_result = self.get_data_frame(cache_key)
+        if query_result is None:
+            query_result = self._read_gbq(query, project_id)
+            self.put_data_frame(cache_key, query_result)
+            self.evict()
+        return query_result
+
+    @staticmethod
+    def get_cache_key(query: str, project_id: str, freshness: pd.DataFrame) -> str:
+        """Return the content hash of the query text, project, and freshness query result"""
+        hasher = hashlib.sha256()
+        for key_part in (query, project_id, freshness.to_csv(index=False)):
+            hasher.update(key_part.encode())
+            hasher.update(b"\0")
+        return hasher.hexdigest()
+
+    def get_data_frame(self, key: str) -> Optional[pd.DataFrame]:
+        """Return the query result stored under `key`, or None if it is not cached"""
+        path = self._get_entry_path(key)
+        if path is None:
+            return None
+        try:
+            return pd.read_parquet(path)
+        except (OSError, ValueError):
+            # evicted by another process, or written by an incompatible version
+            return None
+
+    def put_data_frame(self, key: str, data_frame: pd.DataFrame) -> None:
+        """Store the query result `data_frame` under `key`"""
+        self._write_entry(
+            key,
+            lambda cache_file: data_frame.to_parquet(
+                cache_file, compression="zstd", index=False
+            ),
+        )
+
+    def _read_gbq(self, query: str, project_id: str) -> pd.DataFrame:
+        read_gbq = self.read_gbq if self.read_gbq is not None else pandas_gbq.read_gbq
+        return read_gbq(query, project_id=project_id)
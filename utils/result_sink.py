@@ -0,0 +1,164 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Destinations for the output tables of simulation runs, written as each run finishes"""
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# names of the tables written for every simulation run
+POPULATION_PROJECTIONS_TABLE = "population_projections"
+OUTFLOWS_TABLE = "outflows"
+
+# default bound on the number of tables of one export written at the same time
+DEFAULT_MAX_WRITE_WORKERS = 4
+# default number of rows sent to the destination in one batch
+DEFAULT_WRITE_CHUNK_SIZE = 100000
+
+
+class ResultSink(ABC):
+    """Receive the output tables of simulation runs"""
+
+    @abstractmethod
+    def write_table(
+        self, simulation_tag: str, table_name: str, table: pd.DataFrame
+    ) -> None:
+        """Store one output table of the simulation run `simulation_tag`"""
+
+    def write_tables(
+        self,
+        simulation_tag: str,
+        tables: Dict[str, pd.DataFrame],
+        max_workers: int = DEFAULT_MAX_WRITE_WORKERS,
+    ) -> Dict[str, float]:
+        """
+        Store the independent output tables of one export concurrently, with at most `max_workers` tables written
+        at the same time. Returns the seconds spent writing each table, keyed by table name
+        """
+        if max_workers <= 0:
+            raise ValueError(f"max_workers must be positive: {max_workers}")
+        if not tables:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(tables))) as executor:
+            futures = {
+                table_name: executor.submit(
+                    self._write_table_timed, simulation_tag, table_name, table
+                )
+                for table_name, table in tables.items()
+            }
+            return {
+                table_name: future.result() for table_name, future in futures.items()
+            }
+
+    def _write_table_timed(
+        self, simulation_tag: str, table_name: str, table: pd.DataFrame
+    ) -> float:
+        start = time.perf_counter()
+        self.write_table(simulation_tag, table_name, table)
+        return time.perf_counter() - start
+
+    def close(self) -> None:
+        """Flush anything still buffered once every simulation run has been written"""
+
+
+class InMemoryResultSink(ResultSink):
+    """Keep the output tables in memory, keyed by simulation tag and table name"""
+
+    def __init__(self) -> None:
+        self.tables: Dict[str, Dict[str, pd.DataFrame]] = {}
+
+    def write_table(
+        self, simulation_tag: str, table_name: str, table: pd.DataFrame
+    ) -> None:
+        self.tables.setdefault(simulation_tag, {})[table_name] = table
+
+    def get_table(self, simulation_tag: str, table_name: str) -> pd.DataFrame:
+        if (
+            simulation_tag not in self.tables
+            or table_name not in self.tables[simulation_tag]
+        ):
+            raise ValueError(
+                f"No table '{table_name}' written for simulation '{simulation_tag}'"
+            )
+        return self.tables[simulation_tag][table_name]
+
+
+class BigQueryResultSink(ResultSink):
+    """Append the output tables to the BigQuery tables of the same name in one dataset"""
+
+    def __init__(
+        self,
+        project_id: str,
+        dataset: str,
+        table_schemas: Optional[Dict[str, List[Dict[str, str]]]] = None,
+        chunk_size: int = DEFAULT_WRITE_CHUNK_SIZE,
+    ) -> None:
+        self.project_id = project_id
+        self.dataset = dataset
+        # BigQuery schema of each table, tables without a schema are appended with the inferred column types
+        self.table_schemas = table_schemas if table_schemas is not None else {}
+        self.chunk_size = chunk_size
+
+    def write_table(
+        self, simulation_tag: str, table_name: str, table: pd.DataFrame
+    ) -> None:
+        table_schema = self.table_schemas.get(table_name)
+        if table_schema is not None:
+            # Reorder the columns to match the schema ordering
+            table = table[[column["name"] for column in table_schema]]
+
+        table.to_gbq(
+            destination_table=f"{self.dataset}.{table_name}",
+            project_id=self.project_id,
+            if_exists="append",
+            chunksize=self.chunk_size,
+            table_schema=table_schema,
+        )
+
+
+class ParquetResultSink(ResultSink):
+    """
+    Write every output table as a new Parquet file in the `{output_directory}/{table_name}` directory, so each
+    directory reads back as one dataset with the rows of all of the simulation runs
+    """
+
+    def __init__(
+        self, output_directory: str, chunk_size: int = DEFAULT_WRITE_CHUNK_SIZE
+    ) -> None:
+        self.output_directory = output_directory
+        self.chunk_size = chunk_size
+
+    def write_table(
+        self, simulation_tag: str, table_name: str, table: pd.DataFrame
+    ) -> None:
+        table_directory = os.path.join(self.output_directory, table_name)
+        os.makedirs(table_directory, exist_ok=True)
+        pq.write_table(
+            pa.Table.from_pandas(table),
+            os.path.join(
+                table_directory, f"{simulation_tag}-{uuid.uuid4().hex}.parquet"
+            ),
+            row_group_size=self.chunk_size,
+            compression="zstd",
+        )
@@ -0,0 +1,195 @@
+# Recidiviz - a data platform for criminal justice reform
+# Copyright (C) 2020 Recidiviz, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# =============================================================================
+"""Columnar buffers that collect the per compartment results of a simulation into one table"""
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# rows preallocated when the number of result rows is not known up front
+DEFAULT_RESULTS_CAPACITY = 1024
+# rows buffered before they are written out as one Parquet row group
+DEFAULT_PARQUET_ROW_GROUP_SIZE = 1_000_000
+
+
+class ResultsBuilder:
+    """
+    Collect blocks of results into preallocated columnar buffers and materialize them as one DataFrame at the
+    end, instead of concatenating one DataFrame per simulation group and compartment.
+    Every row has one value per label column (simulation group, compartment, ...), stored as a categorical code,
+    a time step, and a float value. If `parquet_path` is set, the buffered rows are streamed to a Parquet file
+    every `row_group_size` rows instead of being kept in memory.
+    """
+
+    def __init__(
+        self,
+        label_columns: List[str],
+        value_column: str,
+        capacity: int = DEFAULT_RESULTS_CAPACITY,
+        parquet_path: Optional[str] = None,
+        row_group_size: int = DEFAULT_PARQUET_ROW_GROUP_SIZE,
+    ) -> None:
+        """
+        `label_columns` the names of the categorical columns, in the order they are output
+        `value_column` the name of the float column
+        `capacity` the number of rows to preallocate, the buffers are doubled whenever more rows are added
+        `parquet_path` optional Parquet file to stream the rows to instead of keeping them in memory
+        `row_group_size` the number of rows buffered before they are written to `parquet_path`
+        """
+        if row_group_size <= 0:
+            raise ValueError(
+                f"Parquet row group size must be positive: {row_group_size}"
+            )
+        self.label_columns = label_columns
+        self.value_column = value_column
+        self.parquet_path = parquet_path
+        self.row_group_size = row_group_size
+
+        self._categories: Dict[str, Dict[str, int]] = {
+            column: {} for column in label_columns
+        }
+        capacity = max(capacity, 1)
+        self._label_codes = {
+            column: np.empty(capacity, dtype=np.int32) for column in label_columns
+        }
+        self._time_steps = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty(capacity, dtype=np.float64)
+        self._num_rows = 0
+        self._parquet_writer: Optional[pq.ParquetWriter] = None
+        # True once the Parquet file is closed, so closing again does not overwrite it
+        self._closed = False
+
+    def add(
+        self,
+        time_steps: Sequence[int],
+        values: Sequence[float],
+        labels: Dict[str, Union[str, Sequence[str]]],
+    ) -> None:
+        """
+        Append one block of rows
+        `time_steps` the time step of each row
+        `values` the value of each row
+        `labels` the label of every row, or of each row, for each of the `label_columns`
+        """
+        time_steps = np.asarray(time_steps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if time_steps.shape != values.shape:
+            raise ValueError(
+                f"Results block has {len(time_steps)} time steps for {len(values)} values"
+            )
+        if set(labels) != set(self.label_columns):
+            raise ValueError(
+                f"Results block labels {list(labels)} do not match the label columns {self.label_columns}"
+            )
+
+        num_block_rows = len(values)
+        self._reserve(self._num_rows + num_block_rows)
+        block = slice(self._num_rows, self._num_rows + num_block_rows)
+        for column, label in labels.items():
+            self._label_codes[column][block] = self._get_codes(column, label)
+        self._time_steps[block] = time_steps
+        self._values[block] = values
+        self._num_rows += num_block_rows
+
+        if self.parquet_path is not None and self._num_rows >= self.row_group_size:
+            self._write_row_group()
+
+    def to_data_frame(self) -> pd.DataFrame:
+        """Return every row added, with the label columns, then the time_step and value columns"""
+        if self.parquet_path is not None:
+            raise ValueError(
+                f"Results are streamed to {self.parquet_path}, read them from there instead"
+            )
+        columns = {
+            column: self._get_labels(
+                column, self._label_codes[column][: self._num_rows]
+            )
+            for column in self.label_columns
+        }
+        columns["time_step"] = self._time_steps[: self._num_rows].copy()
+        columns[self.value_column] = self._values[: self._num_rows].copy()
+        return pd.DataFrame(columns)
+
+    def close(self) -> None:
+        """
+        Write the rows still buffered and close the Parquet file, if results are streamed to one. Closing again does
+            nothing
+        """
+        if self.parquet_path is None or self._closed:
+            return
+        if self._num_rows > 0 or self._parquet_writer is None:
+            self._write_row_group()
+        self._parquet_writer.close()
+        self._parquet_writer = None
+        self._closed = True
+
+    def _reserve(self, num_rows: int) -> None:
+        """Grow the buffers to hold at least `num_rows` rows"""
+        capacity = len(self._values)
+        if num_rows <= capacity:
+            return
+        while capacity < num_rows:
+            capacity *= 2
+        for column, codes in self._label_codes.items():
+            self._label_codes[column] = self._grow(codes, capacity)
+        self._time_steps = self._grow(self._time_steps, capacity)
+        self._values = self._grow(self._values, capacity)
+
+    def _grow(self, buffer: np.ndarray, capacity: int) -> np.ndarray:
+        grown_buffer = np.empty(capacity, dtype=buffer.dtype)
+        grown_buffer[: self._num_rows] = buffer[: self._num_rows]
+        return grown_buffer
+
+    def _get_codes(
+        self, column: str, label: Union[str, Sequence[str]]
+    ) -> Union[int, np.ndarray]:
+        """Return the categorical code of `label`, or of each label, adding any new category"""
+        categories = self._categories[column]
+        if isinstance(label, str):
+            return categories.setdefault(label, len(categories))
+        unique_labels, inverse = np.unique(np.asarray(label), return_inverse=True)
+        unique_codes = np.array(
+            [
+                categories.setdefault(unique_label, len(categories))
+                for unique_label in unique_labels
+            ],
+            dtype=np.int32,
+        )
+        return unique_codes[inverse]
+
+    def _get_labels(self, column: str, codes: np.ndarray) -> np.ndarray:
+        categories = np.array(list(self._categories[column]), dtype=object)
+        return categories[codes]
+
+    def _write_row_group(self) -> None:
+        """Write the buffered rows to the Parquet file as dictionary encoded columns and empty the buffers"""
+        columns = {
+            column: pa.DictionaryArray.from_arrays(
+                self._label_codes[column][: self._num_rows],
+                pa.array(list(self._categories[column]), type=pa.string()),
+            )
+            for column in self.label_columns
+        }
+        columns["time_step"] = pa.array(self._time_steps[: self._num_rows])
+        columns[self.value_column] = pa.array(self._values[: self._num_rows])
+        table = pa.table(columns)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.parquet_path, table.schema)
+        self._parquet_writer.write_table(table)
+        self._num_rows = 0
@@ -17,12 +17,13 @@
 """BigQuery Methods for the Spark population projection simulation"""
 
 import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
 import pandas_gbq
 
 from utils.bq_utils import store_simulation_results
+from utils.query_cache import QueryResultCache
 from utils.yaml_dict import YAMLDict
 
 # Constants for the Spark input data
@@ -242,9 +243,13 @@ def upload_spark_model_inputs(
 
 
 def load_spark_table_from_big_query(
-    table_name: str, simulation_tag: str
+    table_name: str,
+    simulation_tag: str,
+    query_cache: Optional[QueryResultCache] = None,
 ) -> pd.DataFrame:
-    """Pull all data from a table for a specific state and run date"""
+    """Pull all data from a table for a specific state and run date. If `query_cache` is provided the table is
+    only downloaded when a newer run was uploaded for the simulation tag since it was cached
+    """
 
     query = f"""
         WITH latest_runs AS
@@ -260,5 +265,13 @@ def load_spark_table_from_big_query(
             AND date_created = latest_runs.latest_run
         """
 
+    if query_cache is not None:
+        freshness_query = f"""
+            SELECT MAX(date_created) AS latest_run
+            FROM {SPARK_INPUT_DATASET}.{table_name}
+            WHERE simulation_tag = '{simulation_tag}'
+            """
+        return query_cache.read_query(query, SPARK_INPUT_PROJECT_ID, freshness_query)
+
     table_results = pandas_gbq.read_gbq(query, project_id=SPARK_INPUT_PROJECT_ID)
     return table_results